@@ -5,6 +5,8 @@ import os
 
 from app.db import Base
 import app.identity.models  # noqa: F401
+import app.ledger.models  # noqa: F401
+import app.subscription.models  # noqa: F401
 
 config = context.config
 fileConfig(config.config_file_name)
@@ -0,0 +1,47 @@
+"""create trade ledger"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'trade_ledger',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), primary_key=True, autoincrement=True),
+        sa.Column('kind', sa.String(20), nullable=False),
+        sa.Column('correlation_id', sa.String(64), nullable=False),
+        sa.Column('order_ref', sa.String(32)),
+        sa.Column('source', sa.String(20), nullable=False),
+        sa.Column('master_id', sa.String(100)),
+        sa.Column('exchange', sa.String(50)),
+        sa.Column('account', sa.String(80)),
+        sa.Column('symbol', sa.String(50)),
+        sa.Column('side', sa.String(4)),
+        sa.Column('amount', sa.Float()),
+        sa.Column('price', sa.Float()),
+        sa.Column('filled', sa.Float()),
+        sa.Column('average', sa.Float()),
+        sa.Column('cost', sa.Float()),
+        sa.Column('fee', sa.Float()),
+        sa.Column('fee_currency', sa.String(20)),
+        sa.Column('order_id', sa.String(100)),
+        sa.Column('status', sa.String(20)),
+        sa.Column('detail', sa.JSON()),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('idx_ledger_account_time', 'trade_ledger', ['account', 'created_at', 'id'])
+    op.create_index('idx_ledger_symbol_time', 'trade_ledger', ['symbol', 'created_at', 'id'])
+    op.create_index('idx_ledger_time', 'trade_ledger', ['created_at', 'id'])
+    op.create_index('idx_ledger_correlation', 'trade_ledger', ['correlation_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_ledger_correlation', table_name='trade_ledger')
+    op.drop_index('idx_ledger_time', table_name='trade_ledger')
+    op.drop_index('idx_ledger_symbol_time', table_name='trade_ledger')
+    op.drop_index('idx_ledger_account_time', table_name='trade_ledger')
+    op.drop_table('trade_ledger')
@@ -0,0 +1,28 @@
+"""create follower subscriptions"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'follower_subscriptions',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('master_id', sa.String(100), nullable=False),
+        sa.Column('follower_id', sa.String(100), nullable=False),
+        sa.Column('exchange', sa.String(50), nullable=False),
+        sa.Column('credentials', sa.Text(), nullable=False),
+        sa.Column('multiplier', sa.Float(), nullable=False),
+        sa.Column('max_amount', sa.Float()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.UniqueConstraint('master_id', 'follower_id', name='uq_follower_subscription'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('follower_subscriptions')
@@ -1,11 +1,19 @@
 """HTTP route handlers exposing the trading webhook endpoint."""
 
+import asyncio
 from fastapi import APIRouter, HTTPException, Request, status, Depends
-from app.identity.auth import verify_signature, verify_token, require_api_key
+from app.identity.auth import verify_signature, verify_token_async, require_api_key, token_owner_async
+from app.identity.permissions import permission_cache
 from app.execution.exchange_factory import get_exchange, release_exchange
-from app.execution.tasks import place_order_task
+from app.execution.market_cache import market_cache
+from app.execution.scheduler import order_scheduler
+from app.execution.tasks import place_order_task, replicate_signal_task
+from app.execution.fanout import fanout_engine
+from app.subscription.registry import subscription_registry
+from app.dashboard.metrics import WebhookStages, request_trace_id
+from app.ledger.writer import LedgerOrder, ledger_writer
 from typing import Optional, Literal
-from pydantic import BaseModel, constr, confloat
+from pydantic import BaseModel, constr, confloat, conlist
 import logging
 from ccxt.base.errors import ExchangeError, NetworkError
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
@@ -42,16 +50,18 @@ async def place_market_order(exchange, symbol: str, side: str, amount: float):
         The order information returned by CCXT.
     """
 
-    return await exchange.create_market_order(
+    return await order_scheduler.submit(
+        exchange,
+        "create_market_order",
         symbol=symbol,
         side=side,
         amount=amount,
     )
 
 
-class WebhookPayload(BaseModel):
+class OrderPayload(BaseModel):
     """
-    Defines the expected structure of incoming webhook payloads.
+    Defines the order fields shared by single and batch webhook payloads.
 
     Fields:
         exchange (str): The exchange ID (e.g., 'binance').
@@ -61,8 +71,6 @@ class WebhookPayload(BaseModel):
         side (Literal["buy", "sell"]): Order side.
         amount (float): Amount of asset to buy/sell (> 0).
         price (float): Limit price for the order (> 0).
-        token (Optional[str]): Fallback auth token (for unsigned clients like TradingView).
-        nonce (Optional[str]): One-time nonce for replay protection when using tokens.
     """
     exchange: str
     apiKey: str
@@ -71,12 +79,179 @@ class WebhookPayload(BaseModel):
     side: Literal["buy", "sell"]
     amount: confloat(gt=0)
     price: confloat(gt=0)
+
+
+class WebhookPayload(OrderPayload):
+    """
+    Defines the expected structure of incoming webhook payloads.
+
+    Fields:
+        token (Optional[str]): Fallback auth token (for unsigned clients like TradingView).
+        nonce (Optional[str]): One-time nonce for replay protection when using tokens.
+
+    Order fields are inherited from ``OrderPayload``.
+    """
+    token: Optional[str] = None
+    nonce: Optional[str] = None
+
+
+class BatchWebhookPayload(BaseModel):
+    """
+    Defines a webhook payload carrying several orders.
+
+    Fields:
+        orders (list[OrderPayload]): Orders to execute, at most
+            ``settings.BATCH_MAX_ORDERS``.
+        token (Optional[str]): Fallback auth token, checked once per batch.
+        nonce (Optional[str]): One-time nonce for the whole batch.
+    """
+    orders: conlist(OrderPayload, min_length=1, max_length=settings.BATCH_MAX_ORDERS)
+    token: Optional[str] = None
+    nonce: Optional[str] = None
+
+
+class CopySignalPayload(BaseModel):
+    """
+    Defines a master signal replicated on every follower account.
+
+    Fields:
+        symbol (str): Trading pair symbol matching ``^[A-Z0-9]+/[A-Z0-9]+$``.
+        side (Literal["buy", "sell"]): Order side.
+        amount (float): Master order amount, scaled per follower (> 0).
+        price (float): Reference price of the signal (> 0).
+        token (Optional[str]): API token of the master's user; required
+            even when the request is HMAC signed.
+        nonce (Optional[str]): One-time nonce for replay protection.
+    """
+    symbol: constr(pattern="^[A-Z0-9]+/[A-Z0-9]+$")
+    side: Literal["buy", "sell"]
+    amount: confloat(gt=0)
+    price: confloat(gt=0)
     token: Optional[str] = None
     nonce: Optional[str] = None
 
 
+async def authenticate_request(
+    request: Request, token: Optional[str], nonce: Optional[str]
+) -> None:
+    """Verify the HMAC signature, or the token and nonce when unsigned.
+
+    Raises:
+        HTTPException: If HTTPS is required but missing or authentication
+            fails.
+    """
+    if settings.REQUIRE_HTTPS and request.url.scheme != "https":
+        logger.warning("Plain HTTP request rejected")
+        raise HTTPException(status_code=400, detail="HTTPS required")
+    if "X-Signature" in request.headers:
+        if not await verify_signature(request):
+            logger.warning("Invalid HMAC signature")
+            raise HTTPException(status_code=403, detail="Invalid signature")
+    else:
+        if not await verify_token_async(token, nonce, request):
+            logger.warning("Missing or invalid token in fallback mode")
+            raise HTTPException(status_code=403, detail="Unauthorized")
+
+
+async def authorize_master(master_id: str, token: Optional[str]) -> None:
+    """Allow copy signals only from the master's own API token or a subscription admin.
+
+    The master id is the id of the user owning the master strategy. The
+    shared HMAC secret and static tokens identify no user, so they cannot
+    trade with follower credentials.
+
+    Raises:
+        HTTPException: 403 unless ``token`` belongs to ``master_id`` or to a
+            user with permission ``subscription:write``.
+    """
+    user_id = await token_owner_async(token) if token else None
+    if user_id is None:
+        logger.warning(f"Copy signal for {master_id} without a user API token")
+        raise HTTPException(status_code=403, detail="Copy signals require the master's API token")
+    if user_id == master_id:
+        return
+    access = await asyncio.to_thread(permission_cache.get, user_id)
+    if access is None or not access.allows("subscription", "write"):
+        logger.warning(f"User {user_id} may not copy signals of {master_id}")
+        raise HTTPException(status_code=403, detail=f"Not allowed to copy signals of {master_id}")
+
+
+def _order_error(exc: Exception) -> dict:
+    """Describe a failed batch order the way ``webhook`` reports errors."""
+    if isinstance(exc, HTTPException):
+        return {"status": "error", "status_code": exc.status_code, "detail": exc.detail}
+    if isinstance(exc, ExchangeError):
+        logger.warning(f"CCXT exchange error: {exc}")
+        return {"status": "error", "status_code": 400, "detail": f"Exchange error: {str(exc)}"}
+    if isinstance(exc, NetworkError):
+        logger.warning(f"CCXT network error: {exc}")
+        return {"status": "error", "status_code": 502, "detail": f"Network error: {str(exc)}"}
+    if isinstance(exc, ValueError):
+        logger.warning(f"Validation error: {exc}")
+        return {"status": "error", "status_code": 422, "detail": str(exc)}
+    logger.exception("Unhandled server error", exc_info=exc)
+    return {"status": "error", "status_code": 500, "detail": "Internal server error"}
+
+
+async def _execute_batch_group(
+    orders: list[tuple[int, OrderPayload]], semaphore: asyncio.Semaphore, correlation_id: str
+) -> list[tuple[int, dict]]:
+    """Place orders sharing one exchange and credential set on one client.
+
+    Parameters
+    ----------
+    orders: list[tuple[int, OrderPayload]]
+        Orders paired with their position in the batch.
+    semaphore: asyncio.Semaphore
+        Limits how many orders of the batch are in flight at once.
+    correlation_id: str
+        Ledger correlation id shared by every order of the batch.
+
+    Returns
+    -------
+    list[tuple[int, dict]]
+        Result for each order, keyed by its batch position.
+    """
+    first = orders[0][1]
+    exchange = None
+    try:
+        exchange = await get_exchange(first.exchange, first.apiKey, first.secret)
+        await market_cache.load(exchange)
+    except Exception as e:
+        if exchange:
+            await release_exchange(exchange)
+        result = _order_error(e)
+        return [(index, result) for index, _ in orders]
+
+    async def place(index: int, order: OrderPayload) -> tuple[int, dict]:
+        async with semaphore:
+            try:
+                placed = await ledger_writer.track(
+                    LedgerOrder.create(
+                        correlation_id, "batch", order.exchange, order.apiKey,
+                        order.symbol, order.side, order.amount, order.price,
+                    ),
+                    order_scheduler.submit(
+                        exchange,
+                        "create_market_order",
+                        symbol=order.symbol,
+                        side=order.side,
+                        amount=order.amount,
+                    ),
+                )
+            except Exception as e:
+                return index, _order_error(e)
+        logger.info(f"Order placed: {placed}")
+        return index, {"status": "success", "order": placed}
+
+    try:
+        return await asyncio.gather(*(place(index, order) for index, order in orders))
+    finally:
+        await release_exchange(exchange)
+
+
 @router.post("/webhook")
-@limiter.limit(settings.RATE_LIMIT)
+@limiter.limit("ip", "account")
 async def webhook(request: Request, payload: WebhookPayload, _: None = Depends(require_api_key)):
     """Process an authenticated webhook request.
 
@@ -94,57 +269,197 @@ async def webhook(request: Request, payload: WebhookPayload, _: None = Depends(r
     dict
         JSON response describing the execution status.
     """
-    if settings.REQUIRE_HTTPS and request.url.scheme != "https":
-        logger.warning("Plain HTTP request rejected")
-        raise HTTPException(status_code=400, detail="HTTPS required")
-    if "X-Signature" in request.headers:
-        if not await verify_signature(request):
-            logger.warning("Invalid HMAC signature")
-            raise HTTPException(status_code=403, detail="Invalid signature")
-    else:
-        if not verify_token(payload.token, payload.nonce):
-            logger.warning("Missing or invalid token in fallback mode")
-            raise HTTPException(status_code=403, detail="Unauthorized")
+    stages = WebhookStages(request, payload.exchange)
+    outcome = "error"
+    try:
+        with stages.stage("auth"):
+            await authenticate_request(request, payload.token, payload.nonce)
+        ledger_writer.record_signal(stages.trace_id, "webhook", payload.model_dump())
 
-    if settings.QUEUE_ORDERS:
-        place_order_task.delay(payload.model_dump())
-        logger.info("Order enqueued for async execution")
-        return {"status": "queued"}
+        if settings.QUEUE_ORDERS:
+            with stages.stage("enqueue"):
+                place_order_task.delay(payload.model_dump(), stages.trace_id)
+            logger.info("Order enqueued for async execution")
+            outcome = "queued"
+            return {"status": "queued"}
 
+        order = await _execute_webhook_order(payload, stages)
+        outcome = "success"
+        return {"status": "success", "order": order}
+    finally:
+        stages.log(outcome)
+
+
+async def _execute_webhook_order(payload: WebhookPayload, stages: WebhookStages) -> dict:
+    """Place the webhook's market order, timing each stage in ``stages``.
+
+    Raises
+    ------
+    HTTPException
+        With the status the webhook reports for the failure.
+    """
     exchange = None
     try:
-        exchange = await get_exchange(payload.exchange, payload.apiKey, payload.secret)
-        markets = await exchange.load_markets()
+        with stages.stage("pool_acquire"):
+            exchange = await get_exchange(payload.exchange, payload.apiKey, payload.secret)
+        with stages.stage("load_markets"):
+            markets = await market_cache.load(exchange)
         logger.debug(markets.get(payload.symbol))
 
-        order = await exchange.create_market_order(
-            symbol=payload.symbol,
-            side=payload.side,
-            amount=payload.amount,
+        ledger_order = LedgerOrder.create(
+            stages.trace_id, "webhook", payload.exchange, payload.apiKey,
+            payload.symbol, payload.side, payload.amount, payload.price,
         )
+        with stages.stage("create_market_order"):
+            order = await ledger_writer.track(
+                ledger_order,
+                order_scheduler.submit(
+                    exchange,
+                    "create_market_order",
+                    symbol=payload.symbol,
+                    side=payload.side,
+                    amount=payload.amount,
+                ),
+            )
 
-        logger.info(f"Order placed: {order}")
-        return {"status": "success", "order": order}
+        logger.info(f"Order placed: {order}", extra={"trace_id": stages.trace_id})
+        return order
 
     except ExchangeError as ccxt_err:
-        logger.warning(f"CCXT exchange error: {ccxt_err}")
+        logger.warning(f"CCXT exchange error: {ccxt_err}", extra={"trace_id": stages.trace_id})
         raise HTTPException(status_code=400, detail=f"Exchange error: {str(ccxt_err)}")
 
     except NetworkError as net_err:
-        logger.warning(f"CCXT network error: {net_err}")
+        logger.warning(f"CCXT network error: {net_err}", extra={"trace_id": stages.trace_id})
         raise HTTPException(status_code=502, detail=f"Network error: {str(net_err)}")
 
     except ValueError as ve:
-        logger.warning(f"Validation error: {ve}")
+        logger.warning(f"Validation error: {ve}", extra={"trace_id": stages.trace_id})
         raise HTTPException(status_code=422, detail=str(ve))
 
     except HTTPException as http_exc:
         raise http_exc
 
     except Exception as e:
-        logger.exception("Unhandled server error")
+        logger.exception("Unhandled server error", extra={"trace_id": stages.trace_id})
         raise HTTPException(status_code=500, detail="Internal server error")
 
     finally:
         if exchange:
-            await release_exchange(exchange)
+            with stages.stage("release"):
+                await release_exchange(exchange)
+
+
+@router.post("/webhook/batch")
+@limiter.limit("ip", "account")
+async def webhook_batch(
+    request: Request, payload: BatchWebhookPayload, _: None = Depends(require_api_key)
+):
+    """Process an authenticated webhook carrying several orders.
+
+    The request is authenticated once. Orders are grouped by exchange and
+    credentials, each group shares one pooled client, and at most
+    ``settings.BATCH_CONCURRENCY`` orders are in flight at a time.
+
+    Parameters
+    ----------
+    request: Request
+        Incoming FastAPI request used for header inspection.
+    payload: BatchWebhookPayload
+        Parsed payload containing the orders and optional token.
+    _ : None
+        API key dependency placeholder.
+
+    Returns
+    -------
+    dict
+        Overall status (``success``, ``partial`` or ``failed``) and one
+        result per order in request order.
+    """
+    await authenticate_request(request, payload.token, payload.nonce)
+    correlation_id = request_trace_id(request)
+    for order in payload.orders:
+        ledger_writer.record_signal(correlation_id, "batch", order.model_dump())
+
+    if settings.QUEUE_ORDERS:
+        for order in payload.orders:
+            place_order_task.delay(order.model_dump(), correlation_id)
+        logger.info(f"{len(payload.orders)} orders enqueued for async execution")
+        return {"status": "queued", "count": len(payload.orders)}
+
+    groups: dict[tuple[str, str, str], list[tuple[int, OrderPayload]]] = {}
+    for index, order in enumerate(payload.orders):
+        key = (order.exchange.lower(), order.apiKey, order.secret)
+        groups.setdefault(key, []).append((index, order))
+
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    grouped = await asyncio.gather(
+        *(
+            _execute_batch_group(orders, semaphore, correlation_id)
+            for orders in groups.values()
+        )
+    )
+
+    results: list[dict] = [{} for _ in payload.orders]
+    for group in grouped:
+        for index, result in group:
+            results[index] = {"index": index, **result}
+
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    if succeeded == len(results):
+        overall = "success"
+    elif succeeded:
+        overall = "partial"
+    else:
+        overall = "failed"
+    return {"status": overall, "results": results}
+
+
+@router.post("/webhook/copy/{master_id}")
+@limiter.limit("ip")
+async def webhook_copy(
+    request: Request,
+    master_id: str,
+    payload: CopySignalPayload,
+    _: None = Depends(require_api_key),
+):
+    """Replicate an authenticated master signal on all of its followers.
+
+    Parameters
+    ----------
+    request: Request
+        Incoming FastAPI request used for header inspection.
+    master_id: str
+        Identifier of the master strategy whose followers copy the trade.
+    payload: CopySignalPayload
+        Master order details and optional token.
+    _ : None
+        API key dependency placeholder.
+
+    Returns
+    -------
+    dict
+        Fan-out summary with one result per follower.
+
+    Raises
+    ------
+    HTTPException
+        403 unless the API token belongs to ``master_id`` or to a
+        subscription admin, 404 if no follower is subscribed to
+        ``master_id``.
+    """
+    await authenticate_request(request, payload.token, payload.nonce)
+    await authorize_master(master_id, payload.token)
+    signal = payload.model_dump(include={"symbol", "side", "amount", "price"})
+
+    if settings.QUEUE_ORDERS:
+        if not await subscription_registry.has_followers_async(master_id):
+            raise HTTPException(status_code=404, detail=f"No followers subscribed to {master_id}")
+        replicate_signal_task.delay(master_id, signal, request_trace_id(request))
+        logger.info(f"Signal from {master_id} enqueued for replication")
+        return {"status": "queued"}
+
+    summary = await fanout_engine.replicate(master_id, signal, request_trace_id(request))
+    if summary["status"] == "no_followers":
+        raise HTTPException(status_code=404, detail=f"No followers subscribed to {master_id}")
+    return summary
@@ -30,3 +30,25 @@ def decrypt_file(path: str, key_id: str) -> bytes:
     with open(path, "rb") as infile:
         data = infile.read()
     return f.decrypt(data)
+
+
+def _credential_fernet() -> Fernet:
+    key = settings.DOCUMENT_ENCRYPTION_KEY
+    if not key:
+        # A generated key would only be known to this process
+        raise RuntimeError("DOCUMENT_ENCRYPTION_KEY must be set to store credentials")
+    return Fernet(key.encode())
+
+
+def encrypt_value(value: str) -> str:
+    """Encrypt ``value`` with ``DOCUMENT_ENCRYPTION_KEY``.
+
+    Raises:
+        RuntimeError: If no key is configured.
+    """
+    return _credential_fernet().encrypt(value.encode()).decode()
+
+
+def decrypt_value(token: str) -> str:
+    """Decrypt a value produced by ``encrypt_value``."""
+    return _credential_fernet().decrypt(token.encode()).decode()
@@ -1,9 +1,43 @@
-"""Prometheus metrics collection middleware and endpoint."""
+"""Prometheus metrics collection middleware and endpoint.
 
+When ``PROMETHEUS_MULTIPROC_DIR`` is set before start-up, every process
+(uvicorn workers and Celery pool children) writes its samples to files in
+that directory and a scrape aggregates all of them. The directory must be
+shared by the processes and emptied before they start.
+"""
+
+import logging
+import os
+import re
 import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import ccxt
 from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from prometheus_client import Histogram, generate_latest, CONTENT_TYPE_LATEST
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.openmetrics import exposition as openmetrics
+
+logger = logging.getLogger("webhook_logger")
+
+# ``path`` labels are route templates such as ``/api/v1/identity/tokens/{token_id}``;
+# requests that match no route share ``UNMATCHED_PATH`` so scanners cannot
+# add series
+UNMATCHED_PATH = "<unmatched>"
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
 
 REQUEST_LATENCY = Histogram(
     "request_latency_seconds",
@@ -11,28 +45,277 @@ REQUEST_LATENCY = Histogram(
     ["method", "path"],
 )
 
+REQUESTS_TOTAL = Counter(
+    "http_requests_total",
+    "HTTP requests handled, by route template and status code",
+    ["method", "path", "status"],
+)
 
-class MetricsMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        """Record request latency and continue processing.
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+WEBHOOK_STAGE_LATENCY = Histogram(
+    "webhook_stage_latency_seconds",
+    "Latency of each webhook pipeline stage in seconds",
+    ["stage", "exchange"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+CELERY_TASK_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time Celery tasks waited between publish and execution start",
+    ["task", "exchange"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Execution time of Celery tasks",
+    ["task", "exchange"],
+)
+
+CELERY_TASKS_TOTAL = Counter(
+    "celery_tasks_total",
+    "Finished Celery tasks by outcome",
+    ["task", "exchange", "outcome"],
+)
+
+# Updated by ``ExchangeSessionPool`` as clients move, so every process adds
+# its share in multiprocess mode
+EXCHANGE_POOL_IN_USE = Gauge(
+    "exchange_pool_in_use",
+    "Exchange clients currently checked out",
+    ["exchange"],
+    multiprocess_mode="livesum",
+)
+
+EXCHANGE_POOL_IDLE = Gauge(
+    "exchange_pool_idle",
+    "Exchange clients waiting in the pool",
+    ["exchange"],
+    multiprocess_mode="livesum",
+)
+
+EXCHANGE_POOL_WAITERS = Gauge(
+    "exchange_pool_waiters",
+    "Callers waiting for an exchange client",
+    ["exchange"],
+    multiprocess_mode="livesum",
+)
+
+EXCHANGE_POOL_CREATED = Counter(
+    "exchange_pool_clients_created",
+    "Exchange clients created",
+    ["exchange"],
+)
+
+EXCHANGE_POOL_DESTROYED = Counter(
+    "exchange_pool_clients_destroyed",
+    "Exchange clients closed",
+    ["exchange"],
+)
+
+# Response header carrying the trace id of the request
+TRACE_HEADER = "X-Trace-Id"
+
+_TRACE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_KNOWN_EXCHANGES = frozenset(ccxt.exchanges)
+
+
+def _trace_id(scope: Scope) -> str:
+    """Reuse the caller's W3C ``traceparent`` or ``X-Trace-Id``, else mint one."""
+    for name, value in scope["headers"]:
+        if name == b"traceparent":
+            parts = value.decode("latin-1").split("-")
+            if len(parts) == 4 and len(parts[1]) == 32 and _TRACE_ID.match(parts[1]):
+                return parts[1]
+        elif name == b"x-trace-id":
+            candidate = value.decode("latin-1")
+            if _TRACE_ID.match(candidate):
+                return candidate
+    return uuid.uuid4().hex
+
+
+def method_label(method: str) -> str:
+    """Return ``method``, or ``OTHER`` for non-standard HTTP methods."""
+    return method if method in HTTP_METHODS else "OTHER"
+
+
+def route_label(scope: Scope) -> str:
+    """Return the template of the route that handled ``scope``.
+
+    Must be called after the router ran. FastAPI routes record themselves in
+    ``scope["route"]``; plain Starlette routes, such as the docs pages, are
+    looked up again.
+    """
+    route = scope.get("route")
+    if route is None and "endpoint" in scope and scope.get("app") is not None:
+        for candidate in scope["app"].router.routes:
+            if candidate.matches(scope)[0] != Match.NONE:
+                route = candidate
+                break
+    return getattr(route, "path_format", None) or UNMATCHED_PATH
 
-        Args:
-            request: Incoming ``Request`` object.
-            call_next: Function that executes the next middleware/endpoint.
 
-        Returns:
-            Response: The response returned by ``call_next``.
+def request_trace_id(request: Request) -> str:
+    """Return the trace id ``MetricsMiddleware`` gave ``request``, or a new one."""
+    return (request.scope.get("state") or {}).get("trace_id") or uuid.uuid4().hex
+
+
+def exchange_label(exchange: Optional[str]) -> str:
+    """Return ``exchange`` if CCXT supports it, else ``other``.
+
+    Keeps client-supplied exchange names from creating new time series.
+    """
+    name = (exchange or "").lower()
+    return name if name in _KNOWN_EXCHANGES else "other"
+
+
+class WebhookStages:
+    """Time the stages of one webhook request.
+
+    Each stage is observed in ``WEBHOOK_STAGE_LATENCY`` with the request's
+    trace id as exemplar. The ``parse`` stage is the time between
+    ``MetricsMiddleware`` receiving the request and the endpoint starting,
+    which covers reading and validating the body.
+    """
+
+    def __init__(self, request: Request, exchange: Optional[str] = None):
+        state = request.scope.get("state") or {}
+        self.trace_id = request_trace_id(request)
+        self.exchange = exchange_label(exchange)
+        self.timings: Dict[str, float] = {}
+        received_at = state.get("received_at")
+        if received_at is not None:
+            self.record("parse", time.perf_counter() - received_at)
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Observe ``seconds`` for ``stage``."""
+        self.timings[stage] = seconds
+        WEBHOOK_STAGE_LATENCY.labels(stage, self.exchange).observe(
+            seconds, exemplar={"trace_id": self.trace_id}
+        )
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as stage ``name``, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def log(self, outcome: str) -> None:
+        """Log the stage timings under the request's trace id."""
+        logger.info(
+            f"Webhook {outcome} on {self.exchange}",
+            extra={
+                "trace_id": self.trace_id,
+                "exchange": self.exchange,
+                "outcome": outcome,
+                "stages_ms": {k: round(v * 1000, 3) for k, v in self.timings.items()},
+            },
+        )
+
+
+def multiprocess_enabled() -> bool:
+    """Return True when metrics are shared through ``PROMETHEUS_MULTIPROC_DIR``."""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def scrape_registry():
+    """Return the registry to expose: all processes, or just this one."""
+    if not multiprocess_enabled():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """Drop the live gauges of an exiting process in multiprocess mode."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def start_metrics_server(port: int) -> None:
+    """Serve ``scrape_registry`` over HTTP on ``port``.
+
+    Used by processes without a ``/metrics`` route, such as the Celery
+    worker.
+    """
+    from prometheus_client import start_http_server
+
+    start_http_server(port, registry=scrape_registry())
+    logger.info(f"Serving Prometheus metrics on port {port}")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording the latency of every HTTP request.
+
+    Requests are labelled by method and route template, counted by status
+    code, and tracked while in flight. Also assigns each request a trace id, stored in ``request.state`` and
+    returned in the ``X-Trace-Id`` response header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Record request metrics and continue processing.
+
+        Args:
+            scope: ASGI connection scope.
+            receive: ASGI receive channel.
+            send: ASGI send channel.
         """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         start_time = time.perf_counter()
-        response = await call_next(request)
-        latency = time.perf_counter() - start_time
-        REQUEST_LATENCY.labels(request.method, request.url.path).observe(latency)
-        return response
+        trace_id = _trace_id(scope)
+        state = scope.setdefault("state", {})
+        state["trace_id"] = trace_id
+        state["received_at"] = start_time
+
+        status_code = 500
 
-def metrics():
+        async def send_with_trace(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append(TRACE_HEADER, trace_id)
+            await send(message)
+
+        method = method_label(scope["method"])
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            in_progress.dec()
+            latency = time.perf_counter() - start_time
+            path = route_label(scope)
+            REQUEST_LATENCY.labels(method, path).observe(latency)
+            REQUESTS_TOTAL.labels(method, path, str(status_code)).inc()
+
+
+def metrics(accept: Optional[str] = None):
     """Expose collected Prometheus metrics as an HTTP response.
 
+    Args:
+        accept: The scraper's ``Accept`` header. OpenMetrics is returned
+            when requested, since only that format carries exemplars.
+            Exemplars are not kept in multiprocess mode.
+
     Returns:
-        Response: Metrics in Prometheus text format.
+        Response: Metrics in Prometheus or OpenMetrics text format.
     """
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    registry = scrape_registry()
+    if accept and "application/openmetrics-text" in accept:
+        return Response(openmetrics.generate_latest(registry), media_type=openmetrics.CONTENT_TYPE_LATEST)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
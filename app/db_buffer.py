@@ -0,0 +1,268 @@
+"""Buffered, spill-backed bulk writer shared by the append-only logs.
+
+Request paths append rows to an in-memory buffer and return. A background
+task bulk inserts the buffer every ``flush_interval`` seconds, or as soon as
+``batch_size`` rows are waiting. When the buffer is full or the database
+cannot be written, rows are appended to a local JSON-lines spill file and
+replayed after the next successful flush. Spilled rows the database refuses
+on their own are moved to a ``.rejected`` file next to it so they do not
+block the rest.
+
+Subclasses map rows to their table by implementing ``_insert``.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, List, Optional, Tuple
+
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
+
+logger = logging.getLogger("webhook_logger")
+
+OVERFLOW_POLICIES = ("spill", "drop_oldest", "drop_newest")
+
+
+def _rejectable(error: Exception) -> bool:
+    """Whether ``error`` was caused by the row itself rather than the database."""
+    if isinstance(error, (IntegrityError, DataError)):
+        return True
+    return isinstance(error, StatementError) and not isinstance(error, DBAPIError)
+
+
+class SpillingBatchWriter:
+    """Buffer rows in memory and write them to the database in bulk.
+
+    Attributes:
+        label: Plural name of the rows, used in log messages.
+        timestamp_fields: Row fields restored to ``datetime`` on replay.
+    """
+
+    label = "rows"
+    timestamp_fields: Tuple[str, ...] = ()
+
+    def __init__(
+        self,
+        max_buffer: int,
+        batch_size: int,
+        flush_interval: float,
+        spill_path: str,
+        overflow_policy: str = "spill",
+    ):
+        """Create a new writer.
+
+        Args:
+            max_buffer: Maximum buffered rows.
+            batch_size: Buffered rows that wake the flusher early.
+            flush_interval: Seconds between periodic flushes.
+            spill_path: Append-only file for rows that could not be buffered
+                or written to the database.
+            overflow_policy: What to do with a row when the buffer is full:
+                ``spill`` it to the file, ``drop_oldest`` or ``drop_newest``.
+
+        Raises:
+            ValueError: If ``overflow_policy`` is not supported.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}'")
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.spill_path = Path(spill_path)
+        self.dropped = 0
+        self._rows: Deque[dict] = deque()
+        self._overflow: List[dict] = []
+        self._draining = False
+        # Rows are appended from the event loop and from worker threads
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def _append(self, rows: List[dict]) -> None:
+        """Buffer ``rows``, applying the overflow policy to those that do not fit."""
+        drain = False
+        with self._lock:
+            room = max(self.max_buffer - len(self._rows), 0)
+            overflow = rows[room:]
+            if overflow and self.overflow_policy == "drop_newest":
+                self.dropped += len(overflow)
+                rows = rows[:room]
+            elif overflow and self.overflow_policy == "drop_oldest":
+                for _ in range(min(len(overflow), len(self._rows))):
+                    self._rows.popleft()
+                self.dropped += len(overflow)
+                rows = rows[-self.max_buffer :] if self.max_buffer else []
+            elif overflow:
+                rows = rows[:room]
+                # One pending drain writes every row overflowing meanwhile
+                self._overflow.extend(overflow)
+                drain, self._draining = not self._draining, True
+            self._rows.extend(rows)
+            ready = len(self._rows) >= self.batch_size
+        if drain:
+            self._schedule_drain()
+        if ready:
+            self._wake()
+
+    def _wake(self) -> None:
+        loop, wakeup = self._loop, self._wakeup
+        if wakeup is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # The loop closed between the check and the call
+            pass
+
+    def _schedule_drain(self) -> None:
+        """Spill overflowing rows on an executor thread, off the event loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._drain_overflow()
+            return
+        loop.run_in_executor(None, self._drain_overflow)
+
+    def _drain_overflow(self) -> None:
+        with self._lock:
+            rows, self._overflow = self._overflow, []
+            self._draining = False
+        if not rows:
+            return
+        logger.warning(f"Buffer full; spilling {len(rows)} {self.label} to disk")
+        try:
+            self._spill(rows)
+        except Exception:
+            logger.exception(f"Failed to spill {len(rows)} {self.label}; they are lost")
+
+    def pending(self) -> int:
+        """Return the number of buffered rows."""
+        with self._lock:
+            return len(self._rows)
+
+    def _spill(self, rows: List[dict]) -> None:
+        lines = "".join(json.dumps(row, default=str) + "\n" for row in rows)
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _insert(self, rows: List[dict]) -> None:
+        """Write ``rows`` to the database in one transaction."""
+        raise NotImplementedError
+
+    def _decode(self, row: dict) -> dict:
+        """Restore a row read back from the spill file."""
+        for field in self.timestamp_fields:
+            row[field] = datetime.fromisoformat(row[field])
+        return row
+
+    @property
+    def rejected_path(self) -> Path:
+        """File collecting spilled rows the database refused on their own."""
+        return self.spill_path.with_name(self.spill_path.name + ".rejected")
+
+    def _reject(self, lines: List[str]) -> None:
+        logger.error(f"Moving {len(lines)} rejected {self.label} to {self.rejected_path}")
+        with open(self.rejected_path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay_spill(self) -> int:
+        """Move spilled rows into the database, keeping the file on failure.
+
+        If the batch is refused, rows are retried one by one and those the
+        database rejects for their content go to ``rejected_path``.
+        """
+        with self._spill_lock:
+            if not self.spill_path.exists():
+                return 0
+            rows, lines, rejected = [], [], []
+            with open(self.spill_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        rows.append(self._decode(json.loads(line)))
+                    except (ValueError, KeyError, TypeError):
+                        rejected.append(line)
+                        continue
+                    lines.append(line)
+            written = 0
+            try:
+                if rows:
+                    self._insert(rows)
+                    written = len(rows)
+            except Exception as e:
+                if not _rejectable(e):
+                    raise
+                for row, line in zip(rows, lines):
+                    try:
+                        self._insert([row])
+                        written += 1
+                    except Exception as row_error:
+                        if not _rejectable(row_error):
+                            raise
+                        rejected.append(line)
+            if rejected:
+                self._reject(rejected)
+            self.spill_path.unlink()
+            return written
+
+    def _take(self) -> List[dict]:
+        """Remove and return the buffered rows."""
+        with self._lock:
+            rows = list(self._rows)
+            self._rows.clear()
+        return rows
+
+    def flush(self) -> int:
+        """Write buffered rows, spilling them to disk if the DB fails.
+
+        Returns:
+            int: Number of rows written to the database.
+        """
+        # Serialize flushes so rows are committed in the order they were taken
+        with self._flush_lock:
+            self._drain_overflow()
+            rows = self._take()
+            written = 0
+            try:
+                if rows:
+                    self._insert(rows)
+                    written = len(rows)
+                written += self._replay_spill()
+            except Exception:
+                if rows and not written:
+                    logger.exception(f"Failed to write {len(rows)} {self.label}; spilling to disk")
+                    self._spill(rows)
+                else:
+                    logger.exception(f"Failed to replay spilled {self.label}")
+            return written
+
+    async def run(self) -> None:
+        """Flush periodically, or early once a batch is ready, until cancelled."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+    async def close(self) -> None:
+        """Flush whatever is left in the buffer."""
+        self._wakeup = None
+        await asyncio.to_thread(self.flush)
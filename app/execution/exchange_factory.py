@@ -2,11 +2,15 @@
 Factory for creating CCXT async exchange instances with error handling.
 """
 
+import logging
 import ccxt.async_support as ccxt
 from config.settings import settings
 from fastapi import HTTPException, status
 from typing import Optional
-from .session_pool import exchange_pool
+from .session_pool import exchange_pool, PoolTimeoutError
+from .http_session import shared_sessions
+
+logger = logging.getLogger("webhook_logger")
 
 async def get_exchange(
     exchange_id: str,
@@ -23,7 +27,8 @@ async def get_exchange(
         secret (Optional[str]): Secret to use (or default)
 
     Raises:
-        HTTPException: If exchange doesn't exist or credentials are missing.
+        HTTPException: If exchange doesn't exist, credentials are missing or
+            no pooled client becomes available in time.
 
     Returns:
         ccxt.Exchange: Configured async CCXT exchange client
@@ -54,6 +59,11 @@ async def get_exchange(
             secret,
         )
         return exchange
+    except PoolTimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -64,3 +74,30 @@ async def get_exchange(
 async def release_exchange(exchange) -> None:
     """Return an exchange client to the shared session pool."""
     await exchange_pool.release(exchange)
+
+
+async def warmup_exchanges() -> int:
+    """Open pooled clients for ``settings.EXCHANGE_POOL_WARMUP`` exchanges.
+
+    Clients use the default credentials and have their markets loaded so the
+    first order after startup skips client construction.
+
+    Returns:
+        int: Number of clients warmed.
+    """
+    targets = []
+    for exchange_id in settings.EXCHANGE_POOL_WARMUP:
+        exchange_id = exchange_id.lower()
+        if exchange_id not in ccxt.exchanges:
+            logger.warning(f"Skipping warmup for unsupported exchange '{exchange_id}'")
+            continue
+        targets.append((exchange_id, settings.DEFAULT_API_KEY, settings.DEFAULT_API_SECRET))
+    warmed = await exchange_pool.warmup(targets, size=settings.EXCHANGE_POOL_WARMUP_SIZE)
+    exchange_pool.start_reaper()
+    return warmed
+
+
+async def close_exchanges() -> None:
+    """Close pooled exchange clients and their shared HTTP sessions."""
+    await exchange_pool.close()
+    await shared_sessions.close()
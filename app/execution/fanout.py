@@ -0,0 +1,178 @@
+"""Copy-trading fan-out: replicate one master signal on every follower."""
+
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from config.settings import settings
+from app.ledger.writer import LedgerOrder, ledger_writer
+from app.rate_limiter import account_key, limiter
+from app.subscription.registry import FollowerAccount, subscription_registry
+
+from .exchange_factory import get_exchange, release_exchange
+from .market_cache import market_cache
+from .scheduler import order_scheduler
+
+logger = logging.getLogger("webhook_logger")
+
+FollowerResolver = Callable[[str], Awaitable[List[FollowerAccount]]]
+
+
+def scale_amount(amount: float, follower: FollowerAccount) -> float:
+    """Scale a master order amount for ``follower``.
+
+    Args:
+        amount: Amount of the master order.
+        follower: Follower whose multiplier and cap apply.
+
+    Returns:
+        float: Amount to trade on the follower account.
+    """
+    scaled = amount * follower.multiplier
+    if follower.max_amount is not None:
+        scaled = min(scaled, follower.max_amount)
+    return scaled
+
+
+def _describe_error(exc: Exception) -> str:
+    if isinstance(exc, HTTPException):
+        return str(exc.detail)
+    return f"{type(exc).__name__}: {exc}"
+
+
+class FanoutEngine:
+    """Replicate master signals across followers through the session pool.
+
+    Followers are processed concurrently, with at most
+    ``per_exchange_limit`` orders in flight on any one exchange.
+    """
+
+    def __init__(
+        self,
+        resolver: Optional[FollowerResolver] = None,
+        per_exchange_limit: Optional[int] = None,
+    ):
+        """Create a new fan-out engine.
+
+        Args:
+            resolver: Coroutine returning the followers of a master id.
+                Defaults to ``subscription_registry.resolve``.
+            per_exchange_limit: Maximum concurrent follower orders per
+                exchange. Defaults to ``settings.FANOUT_EXCHANGE_CONCURRENCY``.
+        """
+        self.resolver = resolver or subscription_registry.resolve
+        self.per_exchange_limit = (
+            settings.FANOUT_EXCHANGE_CONCURRENCY
+            if per_exchange_limit is None
+            else per_exchange_limit
+        )
+        # Semaphores bind to the loop they first block on; one set per loop
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _semaphore(self, exchange_id: str) -> asyncio.Semaphore:
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.get(exchange_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_exchange_limit)
+            semaphores[exchange_id] = semaphore
+        return semaphore
+
+    async def _replicate_one(
+        self, follower: FollowerAccount, signal: dict, master_id: str, correlation_id: str
+    ) -> dict:
+        """Place the scaled order for one follower and record the outcome."""
+        amount = scale_amount(signal["amount"], follower)
+        result = {
+            "follower_id": follower.follower_id,
+            "exchange": follower.exchange.lower(),
+            "amount": amount,
+        }
+        start = time.perf_counter()
+        # Each follower account is charged like an order sent to /webhook
+        allowed, _ = await limiter.hit_async("account", account_key(follower.exchange, follower.apiKey))
+        if not allowed:
+            result.update(status="error", detail="Rate limit exceeded for account")
+            logger.warning(f"Follower order rate limited for {follower.follower_id}")
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            return result
+        async with self._semaphore(result["exchange"]):
+            exchange = None
+            try:
+                exchange = await get_exchange(follower.exchange, follower.apiKey, follower.secret)
+                await market_cache.load(exchange)
+                order = await ledger_writer.track(
+                    LedgerOrder.create(
+                        correlation_id, "fanout", follower.exchange, follower.apiKey,
+                        signal["symbol"], signal["side"], amount, signal.get("price"), master_id,
+                    ),
+                    order_scheduler.submit(
+                        exchange,
+                        "create_market_order",
+                        symbol=signal["symbol"],
+                        side=signal["side"],
+                        amount=amount,
+                    ),
+                )
+                result.update(status="success", order=order)
+                logger.info(f"Follower order placed for {follower.follower_id}: {order}")
+            except Exception as e:
+                result.update(status="error", detail=_describe_error(e))
+                logger.warning(f"Follower order failed for {follower.follower_id}: {e}")
+            finally:
+                if exchange:
+                    await release_exchange(exchange)
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return result
+
+    async def replicate(
+        self, master_id: str, signal: dict, correlation_id: Optional[str] = None
+    ) -> dict:
+        """Replicate ``signal`` on every follower of ``master_id``.
+
+        Args:
+            master_id: Identifier of the master strategy.
+            signal: Master order with ``symbol``, ``side`` and ``amount``.
+            correlation_id: Ledger id shared by the signal and every
+                follower order. Generated when omitted.
+
+        Returns:
+            dict: Overall status, success and failure counts, and one result
+            per follower. The status is ``no_followers`` when nobody is
+            subscribed to ``master_id``.
+        """
+        correlation_id = correlation_id or uuid.uuid4().hex
+        ledger_writer.record_signal(correlation_id, "fanout", signal, master_id=master_id)
+        followers = await self.resolver(master_id)
+        results = await asyncio.gather(
+            *(
+                self._replicate_one(follower, signal, master_id, correlation_id)
+                for follower in followers
+            )
+        )
+        succeeded = sum(1 for result in results if result["status"] == "success")
+        if not results:
+            overall = "no_followers"
+        elif succeeded == len(results):
+            overall = "success"
+        elif succeeded:
+            overall = "partial"
+        else:
+            overall = "failed"
+        return {
+            "master_id": master_id,
+            "status": overall,
+            "followers": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": list(results),
+        }
+
+
+# Global engine instance
+fanout_engine = FanoutEngine()
@@ -0,0 +1,94 @@
+"""Shared aiohttp sessions reused by every CCXT client of an exchange."""
+
+import asyncio
+import logging
+import ssl
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+import certifi
+from config.settings import settings
+
+logger = logging.getLogger("webhook_logger")
+
+
+class SharedSessionRegistry:
+    """Hand out one ``aiohttp.ClientSession`` per exchange and event loop.
+
+    Clients built with ``{"session": ...}`` do not own the session, so
+    closing a client leaves the connector, its DNS cache and its keep-alive
+    connections available to the other accounts on the same exchange.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = None,
+        limit_per_host: Optional[int] = None,
+        dns_cache_ttl: Optional[int] = None,
+    ):
+        """Create a new registry.
+
+        Args:
+            limit: Maximum simultaneous connections per exchange. Defaults to
+                ``settings.EXCHANGE_HTTP_LIMIT``.
+            limit_per_host: Maximum simultaneous connections to a single
+                host. Defaults to ``settings.EXCHANGE_HTTP_LIMIT_PER_HOST``.
+            dns_cache_ttl: Seconds to cache DNS lookups. Defaults to
+                ``settings.EXCHANGE_DNS_CACHE_TTL``.
+        """
+        self.limit = settings.EXCHANGE_HTTP_LIMIT if limit is None else limit
+        self.limit_per_host = (
+            settings.EXCHANGE_HTTP_LIMIT_PER_HOST if limit_per_host is None else limit_per_host
+        )
+        self.dns_cache_ttl = (
+            settings.EXCHANGE_DNS_CACHE_TTL if dns_cache_ttl is None else dns_cache_ttl
+        )
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        self._sessions: Dict[str, Tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = {}
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context(cafile=certifi.where())
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            ssl=self._ssl_context,
+            enable_cleanup_closed=True,
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    def get(self, exchange_id: str) -> aiohttp.ClientSession:
+        """Return the shared session for ``exchange_id`` on the running loop.
+
+        Args:
+            exchange_id: Exchange identifier (e.g. ``"binance"``).
+
+        Returns:
+            aiohttp.ClientSession: Session to pass as CCXT's ``session``.
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._sessions.get(exchange_id)
+        if entry is not None:
+            session_loop, session = entry
+            if session_loop is loop and not session.closed:
+                return session
+        session = self._create_session()
+        self._sessions[exchange_id] = (loop, session)
+        return session
+
+    async def close(self) -> None:
+        """Close every session created on the running loop."""
+        loop = asyncio.get_running_loop()
+        for exchange_id, (session_loop, session) in list(self._sessions.items()):
+            if session_loop is not loop:
+                continue
+            del self._sessions[exchange_id]
+            try:
+                await session.close()
+            except Exception as e:
+                logger.warning(f"Failed to close HTTP session for {exchange_id}: {e}")
+
+
+# Global registry instance
+shared_sessions = SharedSessionRegistry()
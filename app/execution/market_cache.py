@@ -0,0 +1,153 @@
+"""Process-wide cache of CCXT market metadata shared by all exchange clients."""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+import ccxt.async_support as ccxt
+from config.settings import settings
+
+from .http_session import shared_sessions
+
+logger = logging.getLogger("webhook_logger")
+
+# Attributes populated by ``load_markets`` that describe the exchange rather
+# than an account, so every client of the same exchange can share them.
+SHARED_MARKET_ATTRS = (
+    "markets",
+    "markets_by_id",
+    "symbols",
+    "ids",
+    "currencies",
+    "currencies_by_id",
+    "codes",
+)
+
+
+def _create_public_client(exchange_id: str):
+    """Instantiate a credential-less client used only to refresh markets."""
+    exchange_class = getattr(ccxt, exchange_id)
+    return exchange_class({
+        "options": {"defaultType": "future"},
+        "session": shared_sessions.get(exchange_id),
+    })
+
+
+class MarketCache:
+    """Share ``load_markets`` results between clients keyed by exchange id.
+
+    The first request for an exchange loads markets once, no matter how many
+    callers are waiting. Entries older than ``ttl`` keep being served while a
+    single background task fetches a fresh copy.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[int] = None,
+        client_factory: Optional[Callable[[str], Any]] = None,
+    ):
+        """Create a new market cache.
+
+        Args:
+            ttl: Seconds before an entry is refreshed in the background.
+                Defaults to ``settings.MARKET_CACHE_TTL``.
+            client_factory: Callable returning a fresh client for an exchange
+                id, used for background refreshes.
+        """
+        self.ttl = settings.MARKET_CACHE_TTL if ttl is None else ttl
+        self._client_factory = client_factory or _create_public_client
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _is_stale(self, exchange_id: str) -> bool:
+        loaded_at = self._loaded_at.get(exchange_id, 0.0)
+        return time.monotonic() - loaded_at >= self.ttl
+
+    @staticmethod
+    def _snapshot(client, markets: dict) -> Dict[str, Any]:
+        entry = {
+            attr: getattr(client, attr)
+            for attr in SHARED_MARKET_ATTRS
+            if getattr(client, attr, None) is not None
+        }
+        entry["markets"] = markets
+        return entry
+
+    @staticmethod
+    def _apply(exchange, entry: Dict[str, Any]) -> None:
+        for attr, value in entry.items():
+            setattr(exchange, attr, value)
+
+    async def _fetch(self, exchange_id: str, client, reload: bool = False) -> Dict[str, Any]:
+        if reload:
+            markets = await client.load_markets(reload=True)
+        else:
+            markets = await client.load_markets()
+        entry = self._snapshot(client, markets)
+        self._entries[exchange_id] = entry
+        self._loaded_at[exchange_id] = time.monotonic()
+        return entry
+
+    async def _refresh(self, exchange_id: str) -> Dict[str, Any]:
+        client = self._client_factory(exchange_id)
+        try:
+            return await self._fetch(exchange_id, client, reload=True)
+        finally:
+            await client.close()
+
+    def _start(self, exchange_id: str, coro) -> asyncio.Task:
+        """Run ``coro`` unless a load for ``exchange_id`` is already in flight."""
+        task = self._inflight.get(exchange_id)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            coro.close()
+            return task
+        task = asyncio.ensure_future(coro)
+        self._inflight[exchange_id] = task
+        task.add_done_callback(lambda t: self._finish(exchange_id, t))
+        return task
+
+    def _finish(self, exchange_id: str, task: asyncio.Task) -> None:
+        if self._inflight.get(exchange_id) is task:
+            del self._inflight[exchange_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(
+                f"Market load failed for {exchange_id}: {task.exception()}"
+            )
+
+    async def load(self, exchange) -> dict:
+        """Attach cached markets to ``exchange`` and return them.
+
+        Args:
+            exchange: CCXT exchange client about to place an order.
+
+        Returns:
+            dict: Markets keyed by unified symbol.
+        """
+        exchange_id = getattr(exchange, "id", None)
+        if not exchange_id:
+            return await exchange.load_markets()
+
+        entry = self._entries.get(exchange_id)
+        if entry is None:
+            task = self._start(exchange_id, self._fetch(exchange_id, exchange))
+            entry = await asyncio.shield(task)
+        elif self._is_stale(exchange_id):
+            self._start(exchange_id, self._refresh(exchange_id))
+
+        self._apply(exchange, entry)
+        return entry["markets"]
+
+    def invalidate(self, exchange_id: Optional[str] = None) -> None:
+        """Drop cached markets for one exchange, or for all when ``None``."""
+        if exchange_id is None:
+            self._entries.clear()
+            self._loaded_at.clear()
+            return
+        self._entries.pop(exchange_id, None)
+        self._loaded_at.pop(exchange_id, None)
+
+
+# Global cache instance
+market_cache = MarketCache()
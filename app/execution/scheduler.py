@@ -0,0 +1,301 @@
+"""Pace exchange API calls to stay under each exchange's rate limits.
+
+Every call is charged against two budgets: one for the exchange as a whole
+(shared by all accounts) and one per API key. Budgets use the generic cell
+rate algorithm: a call may run ``burst`` requests ahead of a steady schedule,
+and further calls are queued and spread evenly across the window instead of
+being sent in a burst the exchange answers with 429 or 418. When an exchange
+does push back, the whole budget is paused so queued callers wait together
+instead of each retrying on its own backoff.
+
+The ``local`` backend keeps budgets in the process, so every uvicorn and
+Celery worker paces itself against the full limit. Set
+``EXCHANGE_RATE_BACKEND=redis`` to share budgets between all processes and
+hosts, or divide the configured limits by the number of processes.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+from cachetools import TLRUCache
+from ccxt.base.errors import DDoSProtection, RateLimitExceeded
+from fastapi import HTTPException, status
+from app.rate_limiter import Rate, parse_rate
+from config.settings import settings
+
+logger = logging.getLogger("webhook_logger")
+
+
+class Budget(NamedTuple):
+    """GCRA parameters of one budget: call spacing and allowed burst."""
+
+    key: str
+    interval: float
+    tolerance: float
+
+
+def _budget(key: str, rate: Rate, burst: int) -> Budget:
+    interval = rate.period / rate.count
+    return Budget(key, interval, interval * max(burst - 1, 0))
+
+
+class LocalBudgetBackend:
+    """Theoretical arrival time of the next call per budget, in this process.
+
+    A budget whose arrival time has passed behaves like a new one, so it is
+    evicted at that time; at most ``maxsize`` busy budgets are kept.
+    """
+
+    blocking = False
+
+    def __init__(self, maxsize: int):
+        self._tats = TLRUCache(maxsize, ttu=lambda _key, tat, _now: tat, timer=lambda: time.monotonic())
+        self._lock = threading.Lock()
+
+    def reserve(self, budgets: Sequence[Budget], weight: float, max_wait: float) -> Tuple[bool, float]:
+        """Reserve a call of ``weight`` unless it would wait over ``max_wait``.
+
+        Returns:
+            tuple[bool, float]: Whether the call was reserved and its delay.
+        """
+        with self._lock:
+            now = time.monotonic()
+            tats = [max(self._tats.get(b.key, 0.0), now) for b in budgets]
+            delay = max([0.0] + [tat - b.tolerance - now for b, tat in zip(budgets, tats)])
+            if delay > max_wait:
+                return False, delay
+            for budget, tat in zip(budgets, tats):
+                self._tats[budget.key] = tat + budget.interval * weight
+            return True, delay
+
+    def pause(self, budgets: Sequence[Budget], seconds: float) -> None:
+        """Hold every budget for ``seconds`` from now."""
+        with self._lock:
+            now = time.monotonic()
+            for budget in budgets:
+                tat = max(self._tats.get(budget.key, 0.0), now + seconds + budget.tolerance)
+                self._tats[budget.key] = tat
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+
+GCRA_RESERVE_LUA = """
+local max_wait = tonumber(ARGV[1])
+local weight = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tats = {}
+local delay = 0
+for i, key in ipairs(KEYS) do
+  local tat = math.max(tonumber(redis.call('GET', key)) or 0, now)
+  tats[i] = tat
+  delay = math.max(delay, tat - tonumber(ARGV[2 + 2 * i]) - now)
+end
+if delay > max_wait then
+  return {0, tostring(delay)}
+end
+for i, key in ipairs(KEYS) do
+  local tat = tats[i] + tonumber(ARGV[1 + 2 * i]) * weight
+  redis.call('SET', key, tostring(tat), 'PX', math.max(1, math.ceil((tat - now) * 1000)))
+end
+return {1, tostring(delay)}
+"""
+
+GCRA_PAUSE_LUA = """
+local seconds = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+for i, key in ipairs(KEYS) do
+  local tat = math.max(tonumber(redis.call('GET', key)) or 0, now + seconds + tonumber(ARGV[1 + i]))
+  redis.call('SET', key, tostring(tat), 'PX', math.max(1, math.ceil((tat - now) * 1000)))
+end
+return 1
+"""
+
+
+class RedisBudgetBackend:
+    """Budgets in Redis shared by every process, updated by Lua scripts.
+
+    Arrival times use the Redis server clock, so hosts need not agree on
+    theirs, and keys expire once their arrival time has passed.
+    """
+
+    blocking = True
+
+    def __init__(self, client, prefix: str = "webhook:xr:"):
+        """Create a Redis backend.
+
+        Args:
+            client: Synchronous ``redis.Redis`` compatible client.
+            prefix: Namespace prepended to every budget key.
+        """
+        self.client = client
+        self.prefix = prefix
+        self._reserve = client.register_script(GCRA_RESERVE_LUA)
+        self._pause = client.register_script(GCRA_PAUSE_LUA)
+
+    def reserve(self, budgets: Sequence[Budget], weight: float, max_wait: float) -> Tuple[bool, float]:
+        args = [max_wait, weight]
+        for budget in budgets:
+            args += [budget.interval, budget.tolerance]
+        allowed, delay = self._reserve(keys=[f"{self.prefix}{b.key}" for b in budgets], args=args)
+        return bool(int(allowed)), float(delay)
+
+    def pause(self, budgets: Sequence[Budget], seconds: float) -> None:
+        self._pause(
+            keys=[f"{self.prefix}{b.key}" for b in budgets],
+            args=[seconds] + [b.tolerance for b in budgets],
+        )
+
+
+def create_budget_backend(name: str):
+    """Build the scheduler budget backend called ``name``.
+
+    Raises:
+        ValueError: If ``name`` is not a known backend.
+        RuntimeError: If the Redis backend is requested without ``redis``.
+    """
+    if name == "local":
+        return LocalBudgetBackend(settings.EXCHANGE_RATE_CACHE_SIZE)
+    if name == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("The redis exchange rate backend requires the 'redis' package") from e
+        return RedisBudgetBackend(redis.Redis.from_url(settings.REDIS_URL))
+    raise ValueError(f"Unknown exchange rate backend '{name}'")
+
+
+def _text(value) -> Optional[str]:
+    return value if isinstance(value, str) and value else None
+
+
+class ExchangeRateScheduler:
+    """Queue and pace calls per exchange and per exchange account."""
+
+    def __init__(
+        self,
+        exchange_limits: Optional[Dict[str, str]] = None,
+        account_limits: Optional[Dict[str, str]] = None,
+        burst: Optional[int] = None,
+        max_wait: Optional[float] = None,
+        backend=None,
+    ):
+        """Create a new scheduler.
+
+        Args:
+            exchange_limits: Rate per exchange id for all accounts together,
+                e.g. ``{"binance": "1200/minute"}``. Defaults to
+                ``settings.EXCHANGE_RATE_LIMITS``.
+            account_limits: Rate per exchange id for each API key. Exchanges
+                not listed use the client's CCXT ``rateLimit``. Defaults to
+                ``settings.EXCHANGE_ACCOUNT_RATE_LIMITS``.
+            burst: Calls allowed back to back before pacing starts. Defaults
+                to ``settings.EXCHANGE_RATE_BURST``.
+            max_wait: Longest a call may be queued before it is rejected.
+                Defaults to ``settings.EXCHANGE_RATE_MAX_WAIT``.
+            backend: Budget storage. Defaults to the backend named by
+                ``settings.EXCHANGE_RATE_BACKEND``.
+        """
+        self.exchange_limits = {
+            k.lower(): parse_rate(v)
+            for k, v in (
+                settings.EXCHANGE_RATE_LIMITS if exchange_limits is None else exchange_limits
+            ).items()
+        }
+        self.account_limits = {
+            k.lower(): parse_rate(v)
+            for k, v in (
+                settings.EXCHANGE_ACCOUNT_RATE_LIMITS if account_limits is None else account_limits
+            ).items()
+        }
+        self.burst = settings.EXCHANGE_RATE_BURST if burst is None else burst
+        self.max_wait = settings.EXCHANGE_RATE_MAX_WAIT if max_wait is None else max_wait
+        self._backend = backend
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_budget_backend(settings.EXCHANGE_RATE_BACKEND)
+        return self._backend
+
+    async def _offload(self, func, *args):
+        if not getattr(self.backend, "blocking", True):
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    def _budgets_for(self, exchange) -> Tuple[str, Tuple[Budget, ...]]:
+        exchange_id = (_text(getattr(exchange, "id", None)) or "unknown").lower()
+        api_key = _text(getattr(exchange, "apiKey", None)) or ""
+        account = f"{exchange_id}:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+        account_rate = self.account_limits.get(exchange_id)
+        rate_limit_ms = getattr(exchange, "rateLimit", None)
+        if account_rate is None and isinstance(rate_limit_ms, (int, float)) and rate_limit_ms > 0:
+            account_rate = Rate(1, rate_limit_ms / 1000)
+        rates = ((exchange_id, self.exchange_limits.get(exchange_id)), (account, account_rate))
+        return exchange_id, tuple(_budget(key, rate, self.burst) for key, rate in rates if rate)
+
+    async def acquire(self, exchange, weight: float = 1) -> float:
+        """Wait until ``exchange`` may send a call of ``weight``.
+
+        Args:
+            exchange: CCXT client whose ``id`` and ``apiKey`` select budgets.
+            weight: Cost of the call in requests.
+
+        Returns:
+            float: Seconds the call was delayed.
+
+        Raises:
+            HTTPException: If the call would wait longer than ``max_wait``.
+        """
+        exchange_id, budgets = self._budgets_for(exchange)
+        if not budgets:
+            return 0.0
+        allowed, delay = await self._offload(self.backend.reserve, budgets, weight, self.max_wait)
+        if not allowed:
+            logger.warning(f"Rate limit queue for {exchange_id} is {delay:.1f}s deep")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Exchange '{exchange_id}' rate limit queue is full",
+                headers={"Retry-After": str(int(delay) + 1)},
+            )
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+    async def pause(self, exchange, seconds: Optional[float] = None) -> None:
+        """Hold every queued call for ``exchange`` after it rejected a call."""
+        seconds = settings.EXCHANGE_RATE_PENALTY if seconds is None else seconds
+        _, budgets = self._budgets_for(exchange)
+        if budgets:
+            await self._offload(self.backend.pause, budgets, seconds)
+
+    async def submit(self, exchange, method: str, *args, weight: float = 1, **kwargs):
+        """Call ``exchange.<method>`` once its budgets allow it.
+
+        Args:
+            exchange: CCXT client to call.
+            method: Name of the client coroutine, e.g. ``"create_market_order"``.
+            weight: Cost of the call in requests.
+
+        Returns:
+            Any: Result of the exchange call.
+        """
+        await self.acquire(exchange, weight)
+        try:
+            return await getattr(exchange, method)(*args, **kwargs)
+        except (DDoSProtection, RateLimitExceeded) as e:
+            # Stop everyone sharing the budget, not just this caller
+            logger.warning(f"Exchange pushed back on {method}: {e}")
+            await self.pause(exchange)
+            raise
+
+
+# Global scheduler instance
+order_scheduler = ExchangeRateScheduler()
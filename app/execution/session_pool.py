@@ -1,22 +1,97 @@
 """Utilities for reusing CCXT exchange clients across asynchronous tasks."""
 
 import asyncio
-from typing import Dict, Tuple, Optional
+import logging
+import time
+import weakref
+from collections import Counter, deque
+from typing import Deque, Dict, Iterable, List, Tuple, Optional
 import ccxt.async_support as ccxt
+from app.dashboard.metrics import (
+    EXCHANGE_POOL_CREATED,
+    EXCHANGE_POOL_DESTROYED,
+    EXCHANGE_POOL_IDLE,
+    EXCHANGE_POOL_IN_USE,
+    EXCHANGE_POOL_WAITERS,
+    exchange_label,
+)
+from config.settings import settings
+
+from .http_session import shared_sessions
+from .market_cache import market_cache
+
+logger = logging.getLogger("webhook_logger")
+
+PoolKey = Tuple[str, str, str]
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no exchange client becomes available in time."""
 
 
 class ExchangeSessionPool:
     """Asynchronous pool for reusing CCXT client sessions."""
 
-    def __init__(self, maxsize: int = 5):
+    def __init__(
+        self,
+        maxsize: int = 5,
+        max_total: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        max_lifetime: Optional[float] = None,
+        max_per_key: Optional[int] = None,
+        acquire_timeout: Optional[float] = None,
+    ):
         """Create a new session pool.
 
         Args:
-            maxsize: Maximum clients to keep for each credential set.
+            maxsize: Maximum idle clients to keep for each credential set.
+            max_total: Maximum open clients across all credential sets.
+                ``None`` disables the global cap.
+            idle_timeout: Seconds an idle client may stay pooled before it is
+                closed. ``None`` keeps idle clients indefinitely.
+            max_lifetime: Seconds after which a client is recycled regardless
+                of activity. ``None`` disables recycling.
+            max_per_key: Maximum open clients for one credential set; further
+                callers wait for a release. ``None`` disables the limit.
+            acquire_timeout: Seconds ``acquire`` may wait before raising
+                ``PoolTimeoutError``. ``None`` waits indefinitely.
         """
         self.maxsize = maxsize
-        self._pools: Dict[Tuple[str, str, str], asyncio.Queue] = {}
-        self._lock = asyncio.Lock()
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.max_per_key = max_per_key
+        self.acquire_timeout = acquire_timeout
+        self._pools: Dict[PoolKey, Deque] = {}
+        # asyncio primitives bind to the loop they first block on, so every
+        # event loop using the pool (e.g. one per Celery task) gets its own
+        self._sync: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[asyncio.Lock, asyncio.Condition]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._total = 0
+        self._open: Counter = Counter()
+        self._waiting: Counter = Counter()
+        self._created: Counter = Counter()
+        self._destroyed: Counter = Counter()
+        self._reaper: Optional[asyncio.Task] = None
+
+    def _loop_sync(self) -> Tuple[asyncio.Lock, asyncio.Condition]:
+        loop = asyncio.get_running_loop()
+        sync = self._sync.get(loop)
+        if sync is None:
+            lock = asyncio.Lock()
+            sync = self._sync[loop] = (lock, asyncio.Condition(lock))
+        return sync
+
+    @property
+    def _lock(self) -> asyncio.Lock:
+        """Lock guarding the pool state on the running loop."""
+        return self._loop_sync()[0]
+
+    @property
+    def _released(self) -> asyncio.Condition:
+        """Condition notified when a client is released on the running loop."""
+        return self._loop_sync()[1]
 
     async def _create_exchange(self, exchange_id: str, api_key: str, secret: str):
         """Instantiate a new CCXT exchange client.
@@ -28,20 +103,124 @@ class ExchangeSessionPool:
 
         Returns:
             ccxt.Exchange: Configured async exchange instance bound to the
-            provided credentials.
+            provided credentials and the exchange's shared HTTP session.
         """
         exchange_class = getattr(ccxt, exchange_id)
         exchange = exchange_class({
             "apiKey": api_key,
             "secret": secret,
             "options": {"defaultType": "future"},
+            "session": shared_sessions.get(exchange_id),
         })
         exchange._pool_key = (exchange_id, api_key, secret)
         return exchange
 
+    def _is_expired(self, exchange, now: float, idle: bool = True) -> bool:
+        """Return True if ``exchange`` exceeded its lifetime or idle time.
+
+        Args:
+            exchange: Pooled exchange client.
+            now: Current ``time.monotonic()`` value.
+            idle: Also apply ``idle_timeout``; disabled for clients that
+                were just in use.
+        """
+        created_at = getattr(exchange, "_pool_created_at", now)
+        if self.max_lifetime is not None and now - created_at >= self.max_lifetime:
+            return True
+        if not idle or self.idle_timeout is None:
+            return False
+        last_used = getattr(exchange, "_pool_last_used", now)
+        return now - last_used >= self.idle_timeout
+
+    def _discard(self, exchange, doomed: List) -> None:
+        """Stop tracking ``exchange`` and schedule it for closing.
+
+        Must be called with ``self._lock`` held.
+        """
+        key = exchange._pool_key
+        self._total = max(self._total - 1, 0)
+        self._open[key] -= 1
+        if self._open[key] <= 0:
+            del self._open[key]
+        self._destroyed[key[0]] += 1
+        EXCHANGE_POOL_DESTROYED.labels(exchange_label(key[0])).inc()
+        doomed.append(exchange)
+        self._released.notify_all()
+
+    def _pop_idle(self, key: PoolKey, now: float, doomed: List):
+        """Return a reusable idle client for ``key``, discarding expired ones."""
+        pool = self._pools.get(key)
+        while pool:
+            exchange = pool.pop()
+            EXCHANGE_POOL_IDLE.labels(exchange_label(key[0])).dec()
+            if not self._is_expired(exchange, now):
+                return exchange
+            self._discard(exchange, doomed)
+        return None
+
+    def _evict_least_recent(self, doomed: List) -> bool:
+        """Evict the least recently used idle client of any credential set."""
+        oldest_key = None
+        oldest_used = None
+        for key, pool in self._pools.items():
+            if pool:
+                last_used = getattr(pool[0], "_pool_last_used", 0.0)
+                if oldest_used is None or last_used < oldest_used:
+                    oldest_key, oldest_used = key, last_used
+        if oldest_key is None:
+            return False
+        EXCHANGE_POOL_IDLE.labels(exchange_label(oldest_key[0])).dec()
+        self._discard(self._pools[oldest_key].popleft(), doomed)
+        return True
+
+    def _can_create(self, key: PoolKey, doomed: List) -> bool:
+        """Return True if a new client for ``key`` fits within the limits."""
+        if self.max_per_key is not None and self._open[key] >= self.max_per_key:
+            return False
+        while self.max_total is not None and self._total >= self.max_total:
+            if not self._evict_least_recent(doomed):
+                return False
+        return True
+
+    async def _wait(self, exchange_id: str, deadline: Optional[float]) -> None:
+        """Wait for a release, raising ``PoolTimeoutError`` past ``deadline``."""
+        self._waiting[exchange_id] += 1
+        waiters = EXCHANGE_POOL_WAITERS.labels(exchange_label(exchange_id))
+        waiters.inc()
+        try:
+            if deadline is None:
+                await self._released.wait()
+                return
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            await asyncio.wait_for(self._released.wait(), remaining)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError(
+                f"Timed out waiting for an exchange client for '{exchange_id}'"
+            ) from None
+        finally:
+            waiters.dec()
+            self._waiting[exchange_id] -= 1
+            if self._waiting[exchange_id] <= 0:
+                del self._waiting[exchange_id]
+
+    @staticmethod
+    async def _close_all(exchanges: Iterable) -> None:
+        for exchange in exchanges:
+            try:
+                await exchange.close()
+            except Exception as e:
+                logger.warning(f"Failed to close exchange client: {e}")
+
     async def acquire(self, exchange_id: str, api_key: str, secret: str):
         """Retrieve an exchange client from the pool or create one.
 
+        When ``max_total`` clients are open, the least recently used idle
+        client is closed to make room. If every client is in use, or the
+        credential set already holds ``max_per_key`` clients, the call waits
+        until one is released.
+
         Args:
             exchange_id: Exchange identifier.
             api_key: API key for the client.
@@ -49,17 +228,48 @@ class ExchangeSessionPool:
 
         Returns:
             ccxt.Exchange: An initialized CCXT exchange client.
+
+        Raises:
+            PoolTimeoutError: If no client is available within
+                ``acquire_timeout`` seconds.
         """
         key = (exchange_id, api_key, secret)
-        async with self._lock:
-            pool = self._pools.get(key)
-            if pool is None:
-                pool = asyncio.Queue(maxsize=self.maxsize)
-                self._pools[key] = pool
-            if not pool.empty():
-                exchange = await pool.get()
-                return exchange
-        return await self._create_exchange(exchange_id, api_key, secret)
+        in_use = EXCHANGE_POOL_IN_USE.labels(exchange_label(exchange_id))
+        deadline = None
+        if self.acquire_timeout is not None:
+            deadline = asyncio.get_running_loop().time() + self.acquire_timeout
+        doomed: List = []
+        try:
+            async with self._lock:
+                while True:
+                    exchange = self._pop_idle(key, time.monotonic(), doomed)
+                    if exchange is not None:
+                        in_use.inc()
+                        return exchange
+                    if self._can_create(key, doomed):
+                        break
+                    await self._wait(exchange_id, deadline)
+                self._total += 1
+                self._open[key] += 1
+                in_use.inc()
+        finally:
+            await self._close_all(doomed)
+
+        try:
+            exchange = await self._create_exchange(exchange_id, api_key, secret)
+        except BaseException:
+            in_use.dec()
+            async with self._lock:
+                self._total = max(self._total - 1, 0)
+                self._open[key] -= 1
+                if self._open[key] <= 0:
+                    del self._open[key]
+                self._released.notify_all()
+            raise
+        self._created[exchange_id] += 1
+        EXCHANGE_POOL_CREATED.labels(exchange_label(exchange_id)).inc()
+        exchange._pool_created_at = time.monotonic()
+        return exchange
 
     async def release(self, exchange) -> None:
         """Return an exchange client to the pool or close it.
@@ -70,17 +280,141 @@ class ExchangeSessionPool:
         Returns:
             None
         """
-        key: Optional[Tuple[str, str, str]] = getattr(exchange, "_pool_key", None)
+        key: Optional[PoolKey] = getattr(exchange, "_pool_key", None)
         if key is None:
             await exchange.close()
             return
+        now = time.monotonic()
+        doomed: List = []
+        label = exchange_label(key[0])
         async with self._lock:
-            pool = self._pools.setdefault(key, asyncio.Queue(maxsize=self.maxsize))
-        if pool.qsize() < self.maxsize:
-            await pool.put(exchange)
-        else:
-            await exchange.close()
+            EXCHANGE_POOL_IN_USE.labels(label).dec()
+            pool = self._pools.setdefault(key, deque())
+            if len(pool) < self.maxsize and not self._is_expired(exchange, now, idle=False):
+                exchange._pool_last_used = now
+                pool.append(exchange)
+                EXCHANGE_POOL_IDLE.labels(label).inc()
+                self._released.notify_all()
+            else:
+                self._discard(exchange, doomed)
+        await self._close_all(doomed)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return pool usage counters grouped by exchange id.
+
+        Returns:
+            dict: ``{exchange_id: {"in_use", "idle", "waiters", "created",
+            "destroyed"}}``.
+        """
+        idle: Counter = Counter()
+        open_: Counter = Counter()
+        for key, pool in self._pools.items():
+            idle[key[0]] += len(pool)
+        for key, count in self._open.items():
+            open_[key[0]] += count
+        exchange_ids = set(open_) | set(self._waiting) | set(self._created) | set(self._destroyed)
+        return {
+            exchange_id: {
+                "in_use": max(open_[exchange_id] - idle[exchange_id], 0),
+                "idle": idle[exchange_id],
+                "waiters": self._waiting[exchange_id],
+                "created": self._created[exchange_id],
+                "destroyed": self._destroyed[exchange_id],
+            }
+            for exchange_id in sorted(exchange_ids)
+        }
+
+    async def evict_idle(self) -> int:
+        """Close idle clients that exceeded ``idle_timeout`` or ``max_lifetime``.
+
+        Returns:
+            int: Number of clients closed.
+        """
+        now = time.monotonic()
+        doomed: List = []
+        async with self._lock:
+            for key, pool in list(self._pools.items()):
+                keep = deque()
+                while pool:
+                    exchange = pool.popleft()
+                    if self._is_expired(exchange, now):
+                        EXCHANGE_POOL_IDLE.labels(exchange_label(key[0])).dec()
+                        self._discard(exchange, doomed)
+                    else:
+                        keep.append(exchange)
+                if keep:
+                    pool.extend(keep)
+                else:
+                    del self._pools[key]
+        await self._close_all(doomed)
+        return len(doomed)
+
+    async def _reap(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                evicted = await self.evict_idle()
+                if evicted:
+                    logger.debug(f"Evicted {evicted} idle exchange clients")
+            except Exception:
+                logger.exception("Exchange pool eviction failed")
+
+    def start_reaper(self, interval: float = 30.0) -> None:
+        """Start a background task that periodically calls ``evict_idle``."""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.ensure_future(self._reap(interval))
+
+    async def warmup(self, targets: Iterable[PoolKey], size: int = 1) -> int:
+        """Pre-create clients and load their markets before traffic arrives.
+
+        Args:
+            targets: ``(exchange_id, api_key, secret)`` tuples to warm.
+            size: Number of clients to open for each target, capped by
+                ``maxsize``, ``max_per_key`` and ``max_total``.
+
+        Returns:
+            int: Number of clients added to the pool.
+        """
+        # Holding more clients than one key may open would wait on ourselves
+        limits = [size, self.maxsize, self.max_per_key, self.max_total]
+        count = min(limit for limit in limits if limit is not None)
+        warmed = 0
+        for exchange_id, api_key, secret in targets:
+            clients = []
+            try:
+                for _ in range(count):
+                    clients.append(await self.acquire(exchange_id, api_key, secret))
+                for exchange in clients:
+                    await market_cache.load(exchange)
+                warmed += len(clients)
+            except Exception as e:
+                logger.warning(f"Exchange warmup failed for {exchange_id}: {e}")
+            finally:
+                for exchange in clients:
+                    await self.release(exchange)
+        return warmed
+
+    async def close(self) -> None:
+        """Stop the reaper and close every idle client in the pool."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        doomed: List = []
+        async with self._lock:
+            for key, pool in self._pools.items():
+                while pool:
+                    EXCHANGE_POOL_IDLE.labels(exchange_label(key[0])).dec()
+                    self._discard(pool.popleft(), doomed)
+            self._pools.clear()
+        await self._close_all(doomed)
 
 
 # Global pool instance
-exchange_pool = ExchangeSessionPool()
+exchange_pool = ExchangeSessionPool(
+    maxsize=settings.EXCHANGE_POOL_SIZE,
+    max_total=settings.EXCHANGE_POOL_MAX_TOTAL,
+    idle_timeout=settings.EXCHANGE_POOL_IDLE_TIMEOUT,
+    max_lifetime=settings.EXCHANGE_POOL_MAX_LIFETIME,
+    max_per_key=settings.EXCHANGE_POOL_MAX_PER_KEY,
+    acquire_timeout=settings.EXCHANGE_POOL_ACQUIRE_TIMEOUT,
+)
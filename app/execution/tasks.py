@@ -3,25 +3,183 @@
 import asyncio
 import logging
 import os
+import threading
+import time
+import uuid
+from typing import Dict, Optional
 from celery import Celery
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+)
 from ccxt.base.errors import ExchangeError, NetworkError
+from app.dashboard.metrics import (
+    CELERY_TASK_DURATION,
+    CELERY_TASK_QUEUE_WAIT,
+    CELERY_TASKS_TOTAL,
+    exchange_label,
+    mark_process_dead,
+    multiprocess_enabled,
+    start_metrics_server,
+)
+from app.ledger.export import export_day, recent_days
+from app.ledger.writer import LedgerOrder, ledger_writer
+from config.settings import settings
 
-from .exchange_factory import get_exchange, release_exchange
+from .exchange_factory import get_exchange, release_exchange, warmup_exchanges, close_exchanges
+from .market_cache import market_cache
+from .scheduler import order_scheduler
+from .fanout import fanout_engine
 
 celery_app = Celery(__name__)
 celery_app.conf.broker_url = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 celery_app.conf.result_backend = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+if settings.LEDGER_EXPORT_INTERVAL > 0:
+    # Run by `celery beat`, so one worker exports however many processes run
+    celery_app.conf.beat_schedule = {
+        "export-ledger": {"task": "export_ledger", "schedule": settings.LEDGER_EXPORT_INTERVAL},
+    }
 
 logger = logging.getLogger("webhook_logger")
 
+# Event loop owned by the current worker process, run by a dedicated
+# thread. Pooled exchange clients are bound to the loop they were created on,
+# so reusing one loop keeps the session pool warm between tasks; tasks from
+# every pool thread submit their coroutines to it.
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+_worker_thread: Optional[threading.Thread] = None
+_worker_loop_lock = threading.Lock()
 
-async def _execute_order(payload: dict) -> dict:
+# Message header holding the wall-clock time a task was published
+ENQUEUED_AT_HEADER = "enqueued_at"
+
+# perf_counter at which each running task started, by task id
+_task_started: Dict[str, float] = {}
+
+
+@worker_process_init.connect
+def start_worker_loop(**kwargs) -> None:
+    """Start the worker's long-lived event loop thread and warm the exchange pool.
+
+    Runs in every prefork child when ``CELERY_PERSISTENT_LOOP`` is enabled,
+    and on the first task of pools that never fire ``worker_process_init``.
+    """
+    global _worker_loop, _worker_thread
+    if not settings.CELERY_PERSISTENT_LOOP:
+        return
+    with _worker_loop_lock:
+        if _worker_loop is not None:
+            return
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="celery-loop", daemon=True)
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(warmup_exchanges(), loop).result()
+        except Exception:
+            logger.exception("Exchange warmup failed in Celery worker")
+        _worker_loop, _worker_thread = loop, thread
+
+
+async def _shutdown_loop() -> None:
+    """Close pooled clients and cancel whatever still runs on the loop."""
+    await close_exchanges()
+    pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+@worker_process_shutdown.connect
+def stop_worker_loop(**kwargs) -> None:
+    """Close pooled exchange clients and stop the worker's event loop thread."""
+    global _worker_loop, _worker_thread
+    with _worker_loop_lock:
+        loop, _worker_loop = _worker_loop, None
+        thread, _worker_thread = _worker_thread, None
+    if loop is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_shutdown_loop(), loop).result()
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+@worker_init.connect
+def serve_worker_metrics(**kwargs) -> None:
+    """Expose task metrics on ``CELERY_METRICS_PORT`` from the main worker process."""
+    if not settings.CELERY_METRICS_PORT:
+        return
+    if not multiprocess_enabled():
+        logger.warning("PROMETHEUS_MULTIPROC_DIR is unset; prefork children's task metrics will be missing")
+    start_metrics_server(settings.CELERY_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def release_process_metrics(pid: Optional[int] = None, **kwargs) -> None:
+    """Remove the exiting pool process from live multiprocess gauges."""
+    mark_process_dead(pid)
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers: Optional[dict] = None, **kwargs) -> None:
+    """Record when a task is published so workers can measure queue wait."""
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+def _task_exchange(args, kwargs) -> str:
+    """Exchange label of an order task, ``other`` for tasks without one."""
+    payload = args[0] if args else (kwargs or {}).get("payload")
+    if isinstance(payload, dict):
+        return exchange_label(payload.get("exchange"))
+    return "other"
+
+
+def _enqueued_at(task) -> Optional[float]:
+    request = task.request
+    value = getattr(request, ENQUEUED_AT_HEADER, None)
+    if value is None:
+        value = (getattr(request, "headers", None) or {}).get(ENQUEUED_AT_HEADER)
+    return float(value) if value is not None else None
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, task=None, args=None, kwargs=None, **extra) -> None:
+    """Observe how long the task waited in the broker and start its timer."""
+    enqueued_at = _enqueued_at(task)
+    if enqueued_at is not None:
+        CELERY_TASK_QUEUE_WAIT.labels(task.name, _task_exchange(args, kwargs)).observe(
+            max(0.0, time.time() - enqueued_at)
+        )
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_finish(task_id=None, task=None, args=None, kwargs=None, state=None, **extra) -> None:
+    """Observe the task's execution time and count its outcome."""
+    exchange = _task_exchange(args, kwargs)
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_DURATION.labels(task.name, exchange).observe(time.perf_counter() - started)
+    outcome = "success" if state == "SUCCESS" else (state or "unknown").lower()
+    CELERY_TASKS_TOTAL.labels(task.name, exchange, outcome).inc()
+
+
+async def _execute_order(payload: dict, correlation_id: Optional[str] = None) -> dict:
     """Execute a market order asynchronously via CCXT.
 
     Args:
         payload: Dictionary containing order parameters. Expected keys are
             ``exchange``, ``apiKey``, ``secret``, ``symbol``, ``side`` and
             ``amount``.
+        correlation_id: Ledger id of the signal that produced the order.
+            Generated when omitted.
 
     Returns:
         dict: Raw order data returned by CCXT.
@@ -31,11 +189,19 @@ async def _execute_order(payload: dict) -> dict:
         exchange = await get_exchange(
             payload["exchange"], payload.get("apiKey"), payload.get("secret")
         )
-        await exchange.load_markets()
-        order = await exchange.create_market_order(
-            symbol=payload["symbol"],
-            side=payload["side"],
-            amount=payload["amount"],
+        await market_cache.load(exchange)
+        order = await ledger_writer.track(
+            LedgerOrder.create(
+                correlation_id or uuid.uuid4().hex, "task", payload["exchange"], payload.get("apiKey"),
+                payload["symbol"], payload["side"], payload["amount"], payload.get("price"),
+            ),
+            order_scheduler.submit(
+                exchange,
+                "create_market_order",
+                symbol=payload["symbol"],
+                side=payload["side"],
+                amount=payload["amount"],
+            ),
         )
         logger.info(f"Async order placed: {order}")
         return order
@@ -48,13 +214,76 @@ async def _execute_order(payload: dict) -> dict:
 
 
 @celery_app.task(name="place_order")
-def place_order_task(payload: dict) -> dict:
+def place_order_task(payload: dict, correlation_id: Optional[str] = None) -> dict:
     """Synchronously execute ``_execute_order`` inside a Celery worker.
 
+    Uses the worker's persistent event loop when one was started, otherwise
+    runs the order on a fresh loop.
+
     Args:
         payload: Same structure as expected by ``_execute_order``.
+        correlation_id: Ledger id of the webhook signal, so the ledger links
+            the queued order to it.
 
     Returns:
         dict: Order information returned from the exchange.
     """
-    return asyncio.run(_execute_order(payload))
+    return _run(_execute_order(payload, correlation_id))
+
+
+@celery_app.task(name="replicate_signal")
+def replicate_signal_task(master_id: str, signal: dict, correlation_id: Optional[str] = None) -> dict:
+    """Replicate a master signal on every follower inside a Celery worker.
+
+    Args:
+        master_id: Identifier of the master strategy.
+        signal: Master order with ``symbol``, ``side`` and ``amount``.
+        correlation_id: Ledger id of the copy request.
+
+    Returns:
+        dict: Fan-out summary returned by ``FanoutEngine.replicate``.
+    """
+    summary = _run(fanout_engine.replicate(master_id, signal, correlation_id))
+    if summary["status"] == "no_followers":
+        logger.warning(f"No followers subscribed to {master_id}; signal not replicated")
+    return summary
+
+
+@celery_app.task(name="export_ledger")
+def export_ledger_task() -> Dict[str, int]:
+    """Re-export yesterday and today to the columnar ledger dataset.
+
+    Returns:
+        dict: Rows exported, by ISO day.
+    """
+    return {day.isoformat(): export_day(day) for day in recent_days()}
+
+
+async def _run_once(coro):
+    """Await ``coro``, then close the clients it pooled on this loop."""
+    try:
+        return await coro
+    finally:
+        await close_exchanges()
+
+
+def _run(coro):
+    """Run ``coro`` on the worker's persistent loop, or on a fresh one.
+
+    The persistent loop runs in its own thread, so tasks of a ``threads``
+    pool can submit to it concurrently; it is started on first use when
+    ``worker_process_init`` did not fire (solo and thread pools). With
+    ``CELERY_PERSISTENT_LOOP`` disabled each task gets its own loop, and
+    pooled clients and shared sessions are closed before it ends so no later
+    task reuses one bound to a dead loop. Ledger events of the task are
+    written once it finishes, since workers have no background flusher.
+    """
+    if _worker_loop is None:
+        start_worker_loop()
+    loop = _worker_loop
+    try:
+        if loop is not None:
+            return asyncio.run_coroutine_threadsafe(coro, loop).result()
+        return asyncio.run(_run_once(coro))
+    finally:
+        ledger_writer.flush()
@@ -1,13 +1,25 @@
-from fastapi import Request
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 from config.settings import settings
 
 
-class HttpsMiddleware(BaseHTTPMiddleware):
-    """Reject non-HTTPS requests when ``REQUIRE_HTTPS`` is enabled."""
+class HttpsMiddleware:
+    """Reject non-HTTPS requests when ``REQUIRE_HTTPS`` is enabled.
 
-    async def dispatch(self, request: Request, call_next):
-        if settings.REQUIRE_HTTPS and request.url.scheme != "https":
-            return JSONResponse({"detail": "HTTPS required"}, status_code=400)
-        return await call_next(request)
+    Implemented as plain ASGI so requests pass through without the task and
+    stream wrapping of ``BaseHTTPMiddleware``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] == "http"
+            and settings.REQUIRE_HTTPS
+            and scope.get("scheme", "http") != "https"
+        ):
+            response = JSONResponse({"detail": "HTTPS required"}, status_code=400)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,73 @@
+"""Asynchronous, batched writer for ``PermissionAuditLog`` events.
+
+``PermissionMiddleware`` submits events to an in-memory buffer and continues
+with the request; a background task bulk inserts them. Overflow and spill
+handling is inherited from ``SpillingBatchWriter``.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import insert
+from app.db import SessionLocal
+from app.db_buffer import SpillingBatchWriter
+from config.settings import settings
+
+from .models import PermissionAuditLog
+
+
+class PermissionAuditWriter(SpillingBatchWriter):
+    """Buffer permission audit events and write them in bulk."""
+
+    label = "audit events"
+    timestamp_fields = ("created_at",)
+
+    def __init__(
+        self,
+        max_buffer: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        overflow_policy: Optional[str] = None,
+        spill_path: Optional[str] = None,
+    ):
+        """Create a new writer.
+
+        Args:
+            max_buffer: Maximum buffered events. Defaults to
+                ``settings.AUDIT_BUFFER_SIZE``.
+            batch_size: Buffered events that wake the flusher early.
+                Defaults to ``settings.AUDIT_BATCH_SIZE``.
+            flush_interval: Seconds between periodic flushes. Defaults to
+                ``settings.AUDIT_FLUSH_INTERVAL``.
+            overflow_policy: What to do with an event when the buffer is
+                full: ``spill`` it to the file, ``drop_oldest`` or
+                ``drop_newest``. Defaults to ``settings.AUDIT_OVERFLOW_POLICY``.
+            spill_path: Append-only file for events that could not reach the
+                database. Defaults to ``settings.AUDIT_SPILL_PATH``.
+
+        Raises:
+            ValueError: If ``overflow_policy`` is not supported.
+        """
+        super().__init__(
+            max_buffer=settings.AUDIT_BUFFER_SIZE if max_buffer is None else max_buffer,
+            batch_size=settings.AUDIT_BATCH_SIZE if batch_size is None else batch_size,
+            flush_interval=(
+                settings.AUDIT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+            ),
+            spill_path=spill_path or settings.AUDIT_SPILL_PATH,
+            overflow_policy=overflow_policy or settings.AUDIT_OVERFLOW_POLICY,
+        )
+
+    def submit(self, **event) -> None:
+        """Queue one audit event with ``PermissionAuditLog`` column values."""
+        event.setdefault("created_at", datetime.utcnow())
+        self._append([event])
+
+    def _insert(self, events: List[dict]) -> None:
+        with SessionLocal() as db:
+            db.execute(insert(PermissionAuditLog), events)
+            db.commit()
+
+
+# Global writer instance
+audit_writer = PermissionAuditWriter()
@@ -7,16 +7,21 @@ Supports:
 - Fallback token verification (for systems like TradingView)
 """
 
+import asyncio
 import hmac
 import hashlib
 import time
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Request, HTTPException, status, Depends
-from cachetools import TTLCache
 from config.settings import settings
+from app.rate_limiter import limiter
 from .token_store import is_token_valid, register_nonce
+from .replay_store import claim_signature
 from datetime import datetime
 from app.db import SessionLocal
-from .models import ApiToken, UserRole, TokenUsageLog, hash_token
+from .models import ApiToken, UserRole, hash_token
+from .token_cache import TokenRecord, token_cache
+from .usage_log import usage_writer
 from sqlalchemy.exc import OperationalError
 import logging
 from typing import Optional
@@ -26,40 +31,10 @@ logger = logging.getLogger("webhook_logger")
 # Acceptable clock drift range in seconds
 MAX_TIMESTAMP_AGE = 300  # 5 minutes
 
-def _parse_rate(rate: str) -> tuple[int, float]:
-    count, per = rate.split("/")
-    count = int(count)
-    seconds = {
-        "second": 1,
-        "minute": 60,
-        "hour": 3600,
-    }.get(per, 60)
-    return count, seconds
-
-
-TOKEN_RATE_LIMIT = _parse_rate(settings.RATE_LIMIT)
-
-# Simple in-memory cache to track recently seen request signatures
-signature_cache: TTLCache = TTLCache(
-    maxsize=settings.SIGNATURE_CACHE_SIZE,
-    ttl=settings.SIGNATURE_CACHE_TTL,
-)
-
-# In-memory token rate tracking using TTLCache {token_hash: usage_count}
-token_rate_cache: TTLCache = TTLCache(
-    maxsize=settings.TOKEN_RATE_CACHE_SIZE,
-    ttl=TOKEN_RATE_LIMIT[1],
-)
-
-
 def _enforce_token_limit(token_hash: str) -> bool:
     """Return False if token exceeded its allowed rate."""
-    limit, _ = TOKEN_RATE_LIMIT
-    count = token_rate_cache.get(token_hash, 0)
-    if count >= limit:
-        return False
-    token_rate_cache[token_hash] = count + 1  # resets TTL each write
-    return True
+    allowed, _ = limiter.hit("token", token_hash)
+    return allowed
 
 
 async def require_api_key(request: Request) -> None:
@@ -106,14 +81,11 @@ async def verify_signature(request: Request) -> bool:
             logger.warning("Signature mismatch")
             return False
 
-        # Reject if we've already seen this signature recently
-        if signature_header in signature_cache:
+        # Atomically record the signature; reject if any worker has seen it
+        if not await claim_signature(signature_header):
             logger.warning("Replay attack detected: signature reuse")
             return False
 
-        # Store signature for replay protection; TTLCache handles expiry
-        signature_cache[signature_header] = time.time()
-
         return True
     except ValueError:
         logger.warning("Invalid timestamp format")
@@ -148,54 +120,143 @@ def verify_token(
 
     token_hash = hash_token(token)
     try:
-        with SessionLocal() as db:
-            api_token: ApiToken | None = (
-                db.query(ApiToken)
-                .filter(ApiToken.token_hash == token_hash, ApiToken.is_revoked == False)
-                .first()
-            )
-            if not api_token:
+        generation = token_cache.generation()
+        record = token_cache.get(token_hash)
+        if record is None:
+            record = _load_token_record(token_hash)
+            if record is None:
                 logger.warning("Invalid or expired token in fallback mode")
                 return False
-            if api_token.expires_at and api_token.expires_at < datetime.utcnow():
-                logger.warning("Expired API token")
-                return False
-            if not _enforce_token_limit(token_hash):
-                logger.warning("Token rate limit exceeded")
-                return False
-            if not register_nonce(nonce):
-                logger.warning("Replay attack detected: nonce reuse")
-                return False
-            if api_token.role_restrictions:
-                roles = api_token.role_restrictions.get("roles", [])
-                if roles:
-                    count = (
-                        db.query(UserRole)
-                        .filter(
-                            UserRole.user_id == api_token.user_id,
-                            UserRole.role_id.in_(roles),
-                            UserRole.is_active == True,
-                        )
-                        .count()
-                    )
-                    if count == 0:
-                        logger.warning("Token role restriction failed")
-                        return False
-            api_token.last_used_at = datetime.utcnow()
-            log = TokenUsageLog(
-                token_id=api_token.id,
-                user_id=api_token.user_id,
-                ip_address=request.client.host if request and request.client else None,
-                user_agent=request.headers.get("User-Agent") if request else None,
-            )
-            db.add(log)
-            db.commit()
-            return True
+            token_cache.put(token_hash, record, generation)
+        if record.expires_at and record.expires_at < datetime.utcnow():
+            logger.warning("Expired API token")
+            return False
+        if not _enforce_token_limit(token_hash):
+            logger.warning("Token rate limit exceeded")
+            return False
+        if not register_nonce(nonce):
+            logger.warning("Replay attack detected: nonce reuse")
+            return False
+        if not record.roles_allowed:
+            logger.warning("Token role restriction failed")
+            return False
+        if not limiter.hit("user", record.user_id)[0]:
+            logger.warning("User rate limit exceeded")
+            return False
+        usage_writer.record(
+            record.token_id,
+            record.user_id,
+            ip_address=request.client.host if request and request.client else None,
+            user_agent=request.headers.get("User-Agent") if request else None,
+        )
+        return True
     except OperationalError:
         logger.error("Token database not initialized")
         return False
 
 
+def _load_token_record(token_hash: str) -> Optional[TokenRecord]:
+    """Resolve an unrevoked ``ApiToken`` and its role restriction result."""
+    with SessionLocal() as db:
+        api_token: ApiToken | None = (
+            db.query(ApiToken)
+            .filter(ApiToken.token_hash == token_hash, ApiToken.is_revoked == False)
+            .first()
+        )
+        if not api_token:
+            return None
+        roles_allowed = True
+        roles = (api_token.role_restrictions or {}).get("roles", [])
+        if roles:
+            count = (
+                db.query(UserRole)
+                .filter(
+                    UserRole.user_id == api_token.user_id,
+                    UserRole.role_id.in_(roles),
+                    UserRole.is_active == True,
+                )
+                .count()
+            )
+            roles_allowed = count > 0
+        return TokenRecord(
+            token_id=api_token.id,
+            user_id=api_token.user_id,
+            expires_at=api_token.expires_at,
+            roles_allowed=roles_allowed,
+            permissions=dict(api_token.permissions or {}),
+        )
+
+
+# Dedicated pool so slow token lookups cannot exhaust the default executor
+_auth_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_auth_executor() -> ThreadPoolExecutor:
+    global _auth_executor
+    if _auth_executor is None:
+        _auth_executor = ThreadPoolExecutor(
+            max_workers=settings.AUTH_EXECUTOR_WORKERS,
+            thread_name_prefix="auth",
+        )
+    return _auth_executor
+
+
+async def verify_token_async(
+    token: Optional[str], nonce: Optional[str], request: Optional[Request] = None
+) -> bool:
+    """
+    Run :func:`verify_token` on the auth thread pool.
+
+    The token store and database queries block, so running them off the
+    event loop keeps one slow lookup from stalling other requests.
+
+    Args:
+        token (Optional[str]): Token provided in JSON body.
+        nonce (Optional[str]): One-time nonce.
+        request (Optional[Request]): Request used for the usage log.
+
+    Returns:
+        bool: True if valid, else False.
+    """
+    if token is None or nonce is None:
+        logger.warning("Missing token or nonce in fallback mode")
+        return False
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_auth_executor(), verify_token, token, nonce, request
+    )
+
+
+def token_owner(token: str) -> Optional[str]:
+    """Return the id of the user owning API ``token``.
+
+    Static tokens from the token store have no owner.
+
+    Returns:
+        Optional[str]: User id, or None for unknown, revoked, expired or
+        static tokens.
+    """
+    token_hash = hash_token(token)
+    record = token_cache.get(token_hash) or _load_token_record(token_hash)
+    if record is None or (record.expires_at and record.expires_at < datetime.utcnow()):
+        return None
+    return record.user_id
+
+
+async def token_owner_async(token: str) -> Optional[str]:
+    """Run :func:`token_owner` on the auth thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_auth_executor(), token_owner, token)
+
+
+def shutdown_auth_executor() -> None:
+    """Stop the auth thread pool, waiting for running lookups to finish."""
+    global _auth_executor
+    if _auth_executor is not None:
+        _auth_executor.shutdown(wait=True)
+        _auth_executor = None
+
+
 # JWT utilities for login sessions and email verification
 import jwt
 from datetime import datetime, timedelta
@@ -1,12 +1,19 @@
 from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette._utils import get_route_path
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 from sqlalchemy.orm import Session
-from typing import Callable, Tuple
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+import re
+import threading
 
+from cachetools import TTLCache
 from app.db import SessionLocal
-from .models import User, UserRole, RolePermission, Permission, PermissionAuditLog
+from config.settings import settings
+from .models import User, Role, UserRole, RolePermission, Permission
 from .auth import decode_jwt, http_bearer
+from .audit_log import audit_writer
+from .token_cache import TokenCache, token_cache
 
 
 def permission_required(resource: str, action: str) -> Callable:
@@ -19,10 +26,204 @@ def permission_required(resource: str, action: str) -> Callable:
     return decorator
 
 
-class PermissionMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
+class UserPermissions(NamedTuple):
+    """Precomputed access of one user."""
+
+    role_ids: Tuple[str, ...]
+    permissions: FrozenSet[Tuple[str, str]]
+
+    def allows(self, resource: str, action: str) -> bool:
+        return (resource, action) in self.permissions
+
+
+def _load_user_permissions(db: Session, user_id: str) -> Optional[UserPermissions]:
+    """Resolve a user's roles, their ancestors and the granted permissions."""
+    if db.query(User.id).filter(User.id == user_id).first() is None:
+        return None
+    role_ids = tuple(
+        role_id
+        for (role_id,) in db.query(UserRole.role_id).filter(
+            UserRole.user_id == user_id, UserRole.is_active == True
+        )
+    )
+    if not role_ids:
+        return UserPermissions(role_ids, frozenset())
+
+    # Roles inherit the permissions of every ancestor via parent_role_id
+    parents = dict(db.query(Role.id, Role.parent_role_id))
+    effective = set()
+    for role_id in role_ids:
+        while role_id and role_id not in effective:
+            effective.add(role_id)
+            role_id = parents.get(role_id)
+
+    permissions = frozenset(
+        db.query(Permission.resource, Permission.action)
+        .join(RolePermission, RolePermission.permission_id == Permission.id)
+        .filter(RolePermission.role_id.in_(effective))
+        .distinct()
+    )
+    return UserPermissions(role_ids, permissions)
+
+
+class PermissionCache:
+    """TTL-bounded cache of ``UserPermissions`` keyed by user id.
+
+    Identity routes that change roles or permissions call ``invalidate``.
+    With a ``bus`` the invalidation is sent over the token cache channel, so
+    with ``TOKEN_CACHE_PUBSUB`` enabled it reaches every worker. Without
+    pub/sub, other workers keep serving a stale entry for up to
+    ``PERMISSION_CACHE_TTL`` seconds.
+    """
+
+    # Message key that drops every entry; user ids are UUIDs
+    ALL = "*"
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        ttl: Optional[float] = None,
+        bus: Optional[TokenCache] = None,
+    ):
+        self._entries: TTLCache = TTLCache(
+            maxsize=settings.PERMISSION_CACHE_SIZE if maxsize is None else maxsize,
+            ttl=settings.PERMISSION_CACHE_TTL if ttl is None else ttl,
+        )
+        self._lock = threading.Lock()
+        self._bus = bus
+        if bus is not None:
+            bus.register("permissions", self._evict)
+
+    def get(self, user_id: str) -> Optional[UserPermissions]:
+        """Return the user's permissions, loading them on a miss.
+
+        Returns ``None`` if the user does not exist.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None:
+            return entry
+        with SessionLocal() as db:
+            entry = _load_user_permissions(db, user_id)
+        if entry is not None:
+            with self._lock:
+                self._entries[user_id] = entry
+        return entry
+
+    def _evict(self, key: str) -> None:
+        with self._lock:
+            if key == self.ALL:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Drop one user's entry, or every entry when ``user_id`` is None."""
+        key = self.ALL if user_id is None else user_id
+        if self._bus is None:
+            self._evict(key)
+        else:
+            self._bus.broadcast("permissions", key)
+
+
+# Global cache instance
+permission_cache = PermissionCache(bus=token_cache)
+
+
+# A path segment that is exactly one ``{param}`` with the default converter
+_PARAM_SEGMENT = re.compile(r"^\{[A-Za-z_][A-Za-z0-9_]*(:str)?\}$")
+
+
+class _TrieNode:
+    __slots__ = ("children", "param", "methods")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.param: Optional["_TrieNode"] = None
+        self.methods: Dict[str, Tuple[str, str]] = {}
+
+
+class RoutePermissionIndex:
+    """Map a request method and path to the permission it requires.
+
+    Static paths are looked up in a dict keyed by ``(method, path)``.
+    Templated paths whose parameters each span a whole segment live in a
+    segment trie. Any other route (custom converters, partial segments) is
+    matched with ``route.matches`` as a last resort.
+    """
+
+    def __init__(self, permission_routes: List[Tuple[object, Tuple[str, str]]]):
+        self._exact: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._root = _TrieNode()
+        self._fallback: List[Tuple[object, Tuple[str, str]]] = []
+        for route, required in permission_routes:
+            self._add(route, required)
+
+    def _add(self, route, required: Tuple[str, str]) -> None:
+        path = getattr(route, "path", None)
+        methods = getattr(route, "methods", None)
+        if not path or not methods:
+            self._fallback.append((route, required))
+            return
+        segments = path.strip("/").split("/")
+        if "{" not in path:
+            for method in methods:
+                self._exact.setdefault((method, path), required)
+            return
+        if any("{" in s and not _PARAM_SEGMENT.match(s) for s in segments):
+            self._fallback.append((route, required))
+            return
+        node = self._root
+        for segment in segments:
+            if _PARAM_SEGMENT.match(segment):
+                node.param = node.param or _TrieNode()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _TrieNode())
+        for method in methods:
+            node.methods.setdefault(method, required)
+
+    def _walk(self, node: _TrieNode, segments: List[str], i: int, method: str):
+        if i == len(segments):
+            return node.methods.get(method)
+        child = node.children.get(segments[i])
+        if child is not None:
+            found = self._walk(child, segments, i + 1, method)
+            if found:
+                return found
+        # Parameters match any non-empty segment, like Starlette's str converter
+        if node.param is not None and segments[i]:
+            return self._walk(node.param, segments, i + 1, method)
+        return None
+
+    def lookup(self, scope) -> Optional[Tuple[str, str]]:
+        """Return the ``(resource, action)`` required for ``scope``, if any."""
+        # Routes are registered without the ASGI root_path, so match the
+        # path the router sees rather than the raw request path
+        method, path = scope["method"], get_route_path(scope)
+        required = self._exact.get((method, path))
+        if required:
+            return required
+        if self._root.children or self._root.param:
+            required = self._walk(self._root, path.strip("/").split("/"), 0, method)
+            if required:
+                return required
+        if self._fallback:
+            from starlette.routing import Match
+
+            for route, required in self._fallback:
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    return required
+        return None
+
+
+class PermissionMiddleware:
+    """Pure ASGI middleware enforcing ``permission_required`` on routes."""
+
+    def __init__(self, app: ASGIApp):
         """Collect routes decorated with ``permission_required`` at startup."""
-        super().__init__(app)
+        self.app = app
         self.permission_routes: list[tuple[object, tuple[str, str]]] = []
         base_app = app
         while not hasattr(base_app, "routes") and hasattr(base_app, "app"):
@@ -31,62 +232,43 @@ class PermissionMiddleware(BaseHTTPMiddleware):
         for route in routes:
             if hasattr(route, "endpoint") and hasattr(route.endpoint, "required_permission"):
                 self.permission_routes.append((route, getattr(route.endpoint, "required_permission")))
+        self.index = RoutePermissionIndex(self.permission_routes)
 
-    async def dispatch(self, request: Request, call_next):
-        from starlette.routing import Match
-        perm: Tuple[str, str] | None = None
-        for route, required in self.permission_routes:
-            match, _ = route.matches(request.scope)
-            if match == Match.FULL:
-                perm = required
-                break
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        perm = self.index.lookup(scope) if scope["type"] == "http" else None
         if not perm:
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
+        response = await self._authorize(Request(scope, receive), perm)
+        if response is not None:
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
 
+    async def _authorize(self, request: Request, perm: Tuple[str, str]) -> Optional[JSONResponse]:
+        """Return an error response if the caller lacks ``perm``."""
         # Authenticate user via bearer token
         credentials = await http_bearer(request)
-        user_id = decode_jwt(credentials.credentials)
+        user_id = decode_jwt(credentials.credentials) if credentials else None
         if not user_id:
             return JSONResponse(status_code=401, content={"detail": "Invalid token"})
 
-        db: Session = SessionLocal()
-        try:
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user:
-                return JSONResponse(status_code=401, content={"detail": "User not found"})
-
-            resource, action = perm
-            role_ids = [ur.role_id for ur in db.query(UserRole)
-                        .filter(UserRole.user_id == user.id, UserRole.is_active == True)
-                        .all()]
-            allowed = False
-            if role_ids:
-                allowed = (
-                    db.query(RolePermission)
-                    .join(Permission, RolePermission.permission_id == Permission.id)
-                    .filter(
-                        RolePermission.role_id.in_(role_ids),
-                        Permission.resource == resource,
-                        Permission.action == action,
-                    )
-                    .count()
-                    > 0
-                )
-            log = PermissionAuditLog(
-                user_id=user.id,
-                action=action,
-                resource=resource,
-                permission_checked=f"{resource}:{action}",
-                access_granted=allowed,
-                role_context={"roles": role_ids},
-                ip_address=request.client.host if request.client else None,
-                user_agent=request.headers.get("User-Agent"),
-            )
-            db.add(log)
-            db.commit()
-            if not allowed:
-                return JSONResponse(status_code=403, content={"detail": "Insufficient permissions"})
-        finally:
-            db.close()
-
-        return await call_next(request)
+        access = permission_cache.get(user_id)
+        if access is None:
+            return JSONResponse(status_code=401, content={"detail": "User not found"})
+
+        resource, action = perm
+        allowed = access.allows(resource, action)
+        audit_writer.submit(
+            user_id=user_id,
+            action=action,
+            resource=resource,
+            permission_checked=f"{resource}:{action}",
+            access_granted=allowed,
+            role_context={"roles": list(access.role_ids)},
+            ip_address=request.client.host if request.client else None,
+            user_agent=request.headers.get("User-Agent"),
+        )
+        if not allowed:
+            return JSONResponse(status_code=403, content={"detail": "Insufficient permissions"})
+        return None
@@ -0,0 +1,257 @@
+"""Pluggable stores that reject replayed request signatures.
+
+Three backends are available, selected with ``settings.REPLAY_STORE_BACKEND``:
+
+- ``memory``: one process; an insertion-ordered dict of digests.
+- ``shared``: every worker on a host; a fixed-size hash table in a memory
+  mapped file (``REPLAY_SHM_PATH``) guarded by ``flock``.
+- ``redis``: every node; ``SET NX EX`` on the digest.
+
+Signatures are stored as 16-byte SHA-256 digests. ``claim`` is an atomic
+check-and-set, and an entry is never evicted before its TTL. Expired
+entries are reclaimed first, and only a store whose ``REPLAY_STORE_SIZE``
+entries are all live rejects the request (fails closed) rather than forget a
+live signature, so size it well above the signed request rate times
+``SIGNATURE_CACHE_TTL``.
+"""
+
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from config.settings import settings
+
+logger = logging.getLogger("webhook_logger")
+
+DIGEST_SIZE = 16
+
+
+def signature_digest(signature: str) -> bytes:
+    """Return the compact digest stored for ``signature``."""
+    return hashlib.sha256(signature.encode()).digest()[:DIGEST_SIZE]
+
+
+class ReplayStore(ABC):
+    """Interface shared by the signature replay stores."""
+
+    # Stores whose claim waits on the network are called from a thread
+    blocking = False
+
+    @abstractmethod
+    def claim(self, signature: str, ttl: int) -> bool:
+        """Record ``signature`` for ``ttl`` seconds.
+
+        Returns:
+            bool: False if the signature is already recorded or the store
+            has no room for it, True otherwise.
+        """
+
+    async def claim_async(self, signature: str, ttl: int) -> bool:
+        """``claim`` for coroutines, off the event loop if the store blocks."""
+        if not self.blocking:
+            return self.claim(signature, ttl)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.claim, signature, ttl)
+
+
+class MemoryReplayStore(ReplayStore):
+    """Per-process store; suitable for a single worker."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # With a fixed TTL, insertion order is also expiry order
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, signature: str, ttl: int) -> bool:
+        digest = signature_digest(signature)
+        now = time.time()
+        with self._lock:
+            while self._entries:
+                oldest, expires_at = next(iter(self._entries.items()))
+                if expires_at > now:
+                    break
+                del self._entries[oldest]
+            expires_at = self._entries.get(digest)
+            if expires_at is not None and expires_at > now:
+                return False
+            if len(self._entries) >= self.maxsize:
+                logger.warning("Signature replay store full; rejecting request")
+                return False
+            self._entries.pop(digest, None)
+            self._entries[digest] = now + ttl
+            return True
+
+
+class SharedMemoryReplayStore(ReplayStore):
+    """Open-addressing hash table in a memory-mapped file.
+
+    Each slot holds a digest and its expiry time. A header records the
+    probe length: every live entry sits within that many slots of its home
+    slot, so lookups and inserts scan exactly those slots. When they are all
+    live, the insert keeps probing for an expired slot and lengthens the
+    probe, so a claim only fails once the whole table is live. The probe
+    returns to ``max_probe`` once every entry placed beyond it has expired.
+    Every worker that maps the same path shares the table; ``flock`` makes
+    ``claim`` atomic across them.
+    """
+
+    # Magic, current probe, base probe, expiry of the farthest-placed entry
+    HEADER = struct.Struct("8sQQd")
+    MAGIC = b"WHRPLY02"
+    SLOT = struct.Struct(f"{DIGEST_SIZE}sd")
+
+    def __init__(self, path: str, slots: int, max_probe: int = 64):
+        """Open or create the shared table.
+
+        Args:
+            path: File backing the table, ideally on a tmpfs like ``/dev/shm``.
+            slots: Number of entries the table can hold.
+            max_probe: Initial number of slots scanned per claim.
+        """
+        import fcntl
+
+        self._fcntl = fcntl
+        self.path = path
+        self.slots = slots
+        size = self.HEADER.size + slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+            magic = self.HEADER.unpack_from(self._map, 0)[0]
+            if magic != self.MAGIC:
+                self._map[:] = bytes(size)
+                base = min(max_probe, slots)
+                self.HEADER.pack_into(self._map, 0, self.MAGIC, base, base, 0.0)
+        self._thread_lock = threading.Lock()
+
+    @property
+    def probe(self) -> int:
+        """Slots currently scanned per claim."""
+        return self.HEADER.unpack_from(self._map, 0)[1]
+
+    @contextmanager
+    def _locked(self):
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def _offset(self, slot: int) -> int:
+        return self.HEADER.size + slot * self.SLOT.size
+
+    def claim(self, signature: str, ttl: int) -> bool:
+        digest = signature_digest(signature)
+        home = int.from_bytes(digest[:8], "little") % self.slots
+        now = time.time()
+        with self._thread_lock, self._locked():
+            _, probe, base, wide_until = self.HEADER.unpack_from(self._map, 0)
+            if probe > base and wide_until <= now:
+                # Everything placed beyond the base probe has expired
+                probe, wide_until = base, 0.0
+            free = None
+            for i in range(probe):
+                stored, expires_at = self.SLOT.unpack_from(self._map, self._offset((home + i) % self.slots))
+                live = expires_at > now
+                if stored == digest and live:
+                    return False
+                if free is None and not live:
+                    free = i
+            if free is None:
+                # Every slot in reach is live; look further and widen the probe
+                free = next(
+                    (
+                        i
+                        for i in range(probe, self.slots)
+                        if self.SLOT.unpack_from(self._map, self._offset((home + i) % self.slots))[1] <= now
+                    ),
+                    None,
+                )
+            if free is None:
+                logger.warning("Shared signature replay store full; rejecting request")
+                return False
+            if free >= base:
+                probe, wide_until = max(probe, free + 1), max(wide_until, now + ttl)
+            self.HEADER.pack_into(self._map, 0, self.MAGIC, probe, base, wide_until)
+            self.SLOT.pack_into(self._map, self._offset((home + free) % self.slots), digest, now + ttl)
+            return True
+
+    def close(self) -> None:
+        """Unmap the table and close its file."""
+        self._map.close()
+        os.close(self._fd)
+
+
+class RedisReplayStore(ReplayStore):
+    """Store signature digests in Redis using native key expiry."""
+
+    blocking = True
+
+    def __init__(self, client, prefix: bytes = b"webhook:sig:"):
+        """Create a Redis replay store.
+
+        Args:
+            client: Synchronous ``redis.Redis`` compatible client.
+            prefix: Namespace prepended to every digest.
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def claim(self, signature: str, ttl: int) -> bool:
+        key = self.prefix + signature_digest(signature)
+        return bool(self.client.set(key, 1, nx=True, ex=max(ttl, 1)))
+
+
+def create_replay_store(name: str) -> ReplayStore:
+    """Build the replay store called ``name``.
+
+    Raises:
+        ValueError: If ``name`` is not a known backend.
+        RuntimeError: If the Redis backend is requested without ``redis``.
+    """
+    if name == "memory":
+        return MemoryReplayStore(settings.REPLAY_STORE_SIZE)
+    if name == "shared":
+        return SharedMemoryReplayStore(settings.REPLAY_SHM_PATH, settings.REPLAY_STORE_SIZE)
+    if name == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("The redis replay store requires the 'redis' package") from e
+        return RedisReplayStore(redis.Redis.from_url(settings.REDIS_URL))
+    raise ValueError(f"Unknown replay store backend '{name}'")
+
+
+_store: Optional[ReplayStore] = None
+
+
+def get_replay_store() -> ReplayStore:
+    """Return the configured replay store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = create_replay_store(settings.REPLAY_STORE_BACKEND)
+    return _store
+
+
+def set_replay_store(store: Optional[ReplayStore]) -> None:
+    """Replace the active store; ``None`` restores the configured one."""
+    global _store
+    _store = store
+
+
+async def claim_signature(signature: str) -> bool:
+    """Record ``signature``; False if it was seen within ``SIGNATURE_CACHE_TTL``."""
+    return await get_replay_store().claim_async(signature, settings.SIGNATURE_CACHE_TTL)
@@ -16,9 +16,12 @@ from .models import (
     KycVerification,
     KycDocument,
     PermissionAuditLog,
+    TokenUsageLog,
 )
 from .auth import create_jwt, decode_jwt, get_current_user
-from .permissions import permission_required
+from .permissions import permission_required, permission_cache
+from .token_cache import token_cache
+from .usage_log import usage_writer
 from app.compliance.storage import save_encrypted_data
 from app.compliance.ocr import perform_ocr
 from app.compliance.virus_scan import scan_for_viruses
@@ -296,8 +299,14 @@ def delete_account(
     db: Session = Depends(get_db), current: User = Depends(get_current_user)
 ):
     user = db.query(User).filter(User.id == current.id).first()
+    db.query(TokenUsageLog).filter(TokenUsageLog.user_id == user.id).delete()
+    db.query(ApiToken).filter(ApiToken.user_id == user.id).delete()
     db.delete(user)
     db.commit()
+    permission_cache.invalidate(current.id)
+    # Cached records would keep the deleted user's API tokens valid
+    token_cache.invalidate_user(current.id)
+    usage_writer.discard_user(current.id)
     return {"message": "account deleted"}
 
 
@@ -327,6 +336,7 @@ def create_role(payload: RolePayload, db: Session = Depends(get_db)):
     db.add(role)
     db.commit()
     db.refresh(role)
+    permission_cache.invalidate()
     return {"id": role.id}
 
 
@@ -355,6 +365,7 @@ def create_permission(payload: PermissionPayload, db: Session = Depends(get_db))
     db.add(perm)
     db.commit()
     db.refresh(perm)
+    permission_cache.invalidate()
     return {"id": perm.id}
 
 
@@ -382,6 +393,9 @@ def assign_role(
     db.add(assoc)
     db.commit()
     db.refresh(assoc)
+    permission_cache.invalidate(user_id)
+    # Role restrictions of this user's tokens may now resolve differently
+    token_cache.invalidate_user(user_id)
     return {"id": assoc.id}
 
 
@@ -455,6 +469,7 @@ def revoke_token_route(
         raise HTTPException(status_code=404, detail="Token not found")
     token.is_revoked = True
     db.commit()
+    token_cache.invalidate_token(token.id)
     return {"revoked": True}
 
 
@@ -482,6 +497,7 @@ def update_token_route(
         setattr(token, field, value)
     db.commit()
     db.refresh(token)
+    token_cache.invalidate_token(token.id)
     return {"updated": True}
 
 
@@ -0,0 +1,197 @@
+"""In-process cache of resolved API token records.
+
+``verify_token`` resolves an ``ApiToken`` and its role restrictions once and
+then serves repeat requests from memory. Identity routes that revoke or edit
+tokens, or change a user's roles, call :meth:`TokenCache.invalidate_token`
+or :meth:`TokenCache.invalidate_user`. When ``TOKEN_CACHE_PUBSUB`` is enabled
+the invalidation is also published on Redis so every worker drops its copy.
+Other per-worker caches reuse the channel through :meth:`TokenCache.register`
+and :meth:`TokenCache.broadcast`.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from cachetools import TTLCache
+from config.settings import settings
+
+logger = logging.getLogger("webhook_logger")
+
+
+@dataclass(frozen=True)
+class TokenRecord:
+    """Resolved state of an API token needed to authorize a request."""
+
+    token_id: str
+    user_id: str
+    expires_at: Optional[datetime]
+    roles_allowed: bool
+    permissions: dict = field(default_factory=dict)
+
+
+class TokenCache:
+    """LRU cache with TTL of token records keyed by token hash."""
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        ttl: Optional[float] = None,
+        channel: Optional[str] = None,
+    ):
+        """Create a new cache.
+
+        Args:
+            maxsize: Maximum cached tokens. Defaults to
+                ``settings.TOKEN_CACHE_SIZE``.
+            ttl: Seconds a record may be served before it is reloaded.
+                Defaults to ``settings.TOKEN_CACHE_TTL``.
+            channel: Redis channel used for invalidation messages. Defaults
+                to ``settings.TOKEN_CACHE_CHANNEL``.
+        """
+        maxsize = settings.TOKEN_CACHE_SIZE if maxsize is None else maxsize
+        ttl = settings.TOKEN_CACHE_TTL if ttl is None else ttl
+        self.channel = channel or settings.TOKEN_CACHE_CHANNEL
+        self._records: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._hash_by_id: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Records are read from the auth thread pool and the event loop
+        self._lock = threading.Lock()
+        # Bumped by every eviction, so a record loaded before a revocation
+        # committed is not cached after it
+        self._generation = 0
+        self._redis = None
+        self._listener = None
+        self._handlers: Dict[str, Callable[[str], None]] = {
+            "token": self._evict_token,
+            "user": self._evict_user,
+        }
+
+    def get(self, token_hash: str) -> Optional[TokenRecord]:
+        """Return the cached record for ``token_hash`` if present."""
+        with self._lock:
+            return self._records.get(token_hash)
+
+    def generation(self) -> int:
+        """Return the eviction counter; read it before loading a record to ``put``."""
+        with self._lock:
+            return self._generation
+
+    def put(self, token_hash: str, record: TokenRecord, generation: Optional[int] = None) -> None:
+        """Cache ``record`` under ``token_hash``.
+
+        Args:
+            token_hash: Hash of the token.
+            record: Record loaded from the database.
+            generation: ``generation()`` read before the record was loaded.
+                The record is dropped if anything was evicted since, as it
+                may predate a revocation.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._records[token_hash] = record
+            self._hash_by_id[record.token_id] = token_hash
+
+    def clear(self) -> None:
+        """Drop every cached record on this worker."""
+        with self._lock:
+            self._generation += 1
+            self._records.clear()
+            self._hash_by_id.clear()
+
+    def _evict_token(self, token_id: str) -> None:
+        with self._lock:
+            self._generation += 1
+            token_hash = self._hash_by_id.pop(token_id, None)
+            if token_hash is not None:
+                self._records.pop(token_hash, None)
+
+    def _evict_user(self, user_id: str) -> None:
+        with self._lock:
+            self._generation += 1
+            for token_hash, record in list(self._records.items()):
+                if record.user_id == user_id:
+                    del self._records[token_hash]
+                    self._hash_by_id.pop(record.token_id, None)
+
+    def register(self, kind: str, handler: Callable[[str], None]) -> None:
+        """Call ``handler`` with the key of every ``kind`` message.
+
+        Args:
+            kind: Message prefix, e.g. ``"permissions"``.
+            handler: Callback that drops the key from another cache.
+        """
+        self._handlers[kind] = handler
+
+    def _apply(self, message: str) -> None:
+        kind, _, key = message.partition(":")
+        handler = self._handlers.get(kind)
+        if handler is None:
+            logger.warning(f"Ignoring unknown token cache message '{message}'")
+            return
+        handler(key)
+
+    def _publish(self, message: str) -> None:
+        self._apply(message)
+        if self._redis is None:
+            return
+        try:
+            self._redis.publish(self.channel, message)
+        except Exception as e:
+            # Other workers fall back to the TTL bound
+            logger.warning(f"Failed to publish token cache invalidation: {e}")
+
+    def invalidate_token(self, token_id: str) -> None:
+        """Evict ``token_id`` here and on every subscribed worker."""
+        self._publish(f"token:{token_id}")
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Evict every token owned by ``user_id`` on every subscribed worker."""
+        self._publish(f"user:{user_id}")
+
+    def broadcast(self, kind: str, key: str) -> None:
+        """Apply a ``kind`` message here and on every subscribed worker."""
+        self._publish(f"{kind}:{key}")
+
+    def _handle_message(self, message: dict) -> None:
+        data = message.get("data")
+        if isinstance(data, bytes):
+            data = data.decode()
+        if isinstance(data, str):
+            self._apply(data)
+
+    def start_listener(self, client=None) -> None:
+        """Subscribe to invalidations published by other workers.
+
+        Args:
+            client: Synchronous ``redis.Redis`` compatible client. Created
+                from ``settings.REDIS_URL`` when omitted.
+
+        Raises:
+            RuntimeError: If no client is given and ``redis`` is missing.
+        """
+        if self._listener is not None:
+            return
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("Token cache pub/sub requires the 'redis' package") from e
+            client = redis.Redis.from_url(settings.REDIS_URL)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: self._handle_message})
+        self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+        self._redis = client
+
+    def stop_listener(self) -> None:
+        """Stop listening for invalidations from other workers."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        self._redis = None
+
+
+# Global cache instance
+token_cache = TokenCache()
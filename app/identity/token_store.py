@@ -1,89 +1,355 @@
-"""SQLite-backed storage for authentication tokens and replay nonces."""
+"""Pluggable storage for authentication tokens and replay nonces.
 
+Three backends are available, selected with ``settings.TOKEN_STORE_BACKEND``:
+
+- ``sqlite``: a single pooled WAL-mode connection to ``TOKEN_DB_PATH``.
+- ``memory``: per-process dictionaries with a heap-based expiry index.
+- ``redis``: keys with native expiry, nonces claimed atomically with
+  ``SET NX EX`` so replay protection holds across workers and nodes.
+
+Request handlers only perform point lookups; expired rows are removed in
+batches by ``run_sweeper``.
+"""
+
+import asyncio
+import atexit
+import heapq
+import logging
 import sqlite3
+import threading
 import time
 import secrets
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from config.settings import settings
 
 DB_PATH = Path(settings.TOKEN_DB_PATH)
 
+logger = logging.getLogger("webhook_logger")
+
+
+class TokenBackend(ABC):
+    """Interface shared by the token and nonce storage backends."""
+
+    @abstractmethod
+    def issue(self, token: str, ttl: int) -> None:
+        """Store ``token`` so it stays valid for ``ttl`` seconds."""
+
+    @abstractmethod
+    def revoke(self, token: str) -> None:
+        """Remove ``token`` from the store."""
+
+    @abstractmethod
+    def is_valid(self, token: str) -> bool:
+        """Return True if ``token`` exists and has not expired."""
+
+    @abstractmethod
+    def register_nonce(self, nonce: str, ttl: int) -> bool:
+        """Claim ``nonce`` for ``ttl`` seconds; False if it is already in use."""
+
+    @abstractmethod
+    def cleanup(self, batch_size: int = 500) -> int:
+        """Delete expired tokens and nonces, returning how many were removed.
+
+        Args:
+            batch_size: Maximum rows deleted while holding the store lock.
+        """
+
+
+class SQLiteTokenBackend(TokenBackend):
+    """Store tokens in SQLite through one reused WAL-mode connection."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens (token TEXT PRIMARY KEY, expires_at INTEGER)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS nonces (nonce TEXT PRIMARY KEY, expires_at INTEGER)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tokens_expires_at ON tokens (expires_at)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_nonces_expires_at ON nonces (expires_at)"
+        )
+        return conn
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Return the pooled connection, opening it on first use.
+
+        Must be called with ``self._lock`` held.
+        """
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def close(self) -> None:
+        """Close the pooled connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def issue(self, token: str, ttl: int) -> None:
+        expires_at = int(time.time()) + ttl
+        with self._lock:
+            self._get_conn().execute(
+                "REPLACE INTO tokens (token, expires_at) VALUES (?, ?)",
+                (token, expires_at),
+            )
+
+    def revoke(self, token: str) -> None:
+        with self._lock:
+            self._get_conn().execute("DELETE FROM tokens WHERE token = ?", (token,))
+
+    def is_valid(self, token: str) -> bool:
+        now = int(time.time())
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT expires_at FROM tokens WHERE token = ?", (token,)
+            ).fetchone()
+        return bool(row) and row[0] >= now
+
+    def register_nonce(self, nonce: str, ttl: int) -> bool:
+        now = int(time.time())
+        with self._lock:
+            conn = self._get_conn()
+            # Insert, or take over a nonce whose previous use has expired
+            cursor = conn.execute(
+                "INSERT INTO nonces (nonce, expires_at) VALUES (?, ?) "
+                "ON CONFLICT(nonce) DO UPDATE SET expires_at = excluded.expires_at "
+                "WHERE nonces.expires_at <= ?",
+                (nonce, now + ttl, now),
+            )
+            return cursor.rowcount == 1
+
+    def _delete_batch(self, table: str, condition: str, now: int, batch_size: int) -> int:
+        with self._lock:
+            return self._get_conn().execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} WHERE {condition} LIMIT ?)",
+                (now, batch_size),
+            ).rowcount
+
+    def cleanup(self, batch_size: int = 500) -> int:
+        now = int(time.time())
+        removed = 0
+        for table, condition in (
+            ("tokens", "expires_at < ?"),
+            ("nonces", "expires_at <= ?"),
+        ):
+            # Release the lock between batches so lookups are not starved
+            while True:
+                deleted = self._delete_batch(table, condition, now, batch_size)
+                removed += deleted
+                if deleted < batch_size:
+                    break
+        return removed
+
+
+class MemoryTokenBackend(TokenBackend):
+    """Keep tokens and nonces in process memory with a heap of expiry times.
+
+    Suitable for a single worker; use the Redis backend when several
+    processes must share replay protection.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[str, float] = {}
+        self._nonces: Dict[str, float] = {}
+        self._expiry: List[Tuple[float, str, str]] = []
+        self._lock = threading.Lock()
+
+    def _index(self, expires_at: float, kind: str, key: str) -> None:
+        heapq.heappush(self._expiry, (expires_at, kind, key))
 
-def _get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        "CREATE TABLE IF NOT EXISTS tokens (token TEXT PRIMARY KEY, expires_at INTEGER)"
-    )
-    conn.execute(
-        "CREATE TABLE IF NOT EXISTS nonces (nonce TEXT PRIMARY KEY, expires_at INTEGER)"
-    )
-    return conn
+    def issue(self, token: str, ttl: int) -> None:
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._tokens[token] = expires_at
+            self._index(expires_at, "token", token)
+
+    def revoke(self, token: str) -> None:
+        with self._lock:
+            self._tokens.pop(token, None)
+
+    def is_valid(self, token: str) -> bool:
+        expires_at = self._tokens.get(token)
+        return expires_at is not None and expires_at >= time.time()
+
+    def register_nonce(self, nonce: str, ttl: int) -> bool:
+        now = time.time()
+        with self._lock:
+            expires_at = self._nonces.get(nonce)
+            if expires_at is not None and expires_at > now:
+                return False
+            self._nonces[nonce] = now + ttl
+            self._index(now + ttl, "nonce", nonce)
+            return True
+
+    def cleanup(self, batch_size: int = 500) -> int:
+        now = time.time()
+        removed = 0
+        while True:
+            with self._lock:
+                popped = 0
+                while popped < batch_size and self._expiry and self._expiry[0][0] <= now:
+                    expires_at, kind, key = heapq.heappop(self._expiry)
+                    popped += 1
+                    store = self._tokens if kind == "token" else self._nonces
+                    # Skip index entries superseded by a later issue or claim
+                    if store.get(key) == expires_at:
+                        del store[key]
+                        removed += 1
+            if popped < batch_size:
+                return removed
+
+
+class RedisTokenBackend(TokenBackend):
+    """Store tokens and nonces in Redis using native key expiry."""
+
+    def __init__(self, client, prefix: str = "webhook:"):
+        """Create a Redis backend.
+
+        Args:
+            client: Synchronous ``redis.Redis`` compatible client.
+            prefix: Namespace prepended to every key.
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def _token_key(self, token: str) -> str:
+        return f"{self.prefix}token:{token}"
+
+    def _nonce_key(self, nonce: str) -> str:
+        return f"{self.prefix}nonce:{nonce}"
+
+    def issue(self, token: str, ttl: int) -> None:
+        if ttl <= 0:
+            # Already expired: make sure no older copy stays valid
+            self.client.delete(self._token_key(token))
+            return
+        self.client.set(self._token_key(token), 1, ex=ttl)
+
+    def revoke(self, token: str) -> None:
+        self.client.delete(self._token_key(token))
+
+    def is_valid(self, token: str) -> bool:
+        return bool(self.client.exists(self._token_key(token)))
+
+    def register_nonce(self, nonce: str, ttl: int) -> bool:
+        return bool(self.client.set(self._nonce_key(nonce), 1, nx=True, ex=max(ttl, 1)))
+
+    def cleanup(self, batch_size: int = 500) -> int:
+        return 0
+
+
+def create_backend(name: str) -> TokenBackend:
+    """Build the token backend called ``name``.
+
+    Raises:
+        ValueError: If ``name`` is not a known backend.
+        RuntimeError: If the Redis backend is requested without ``redis``.
+    """
+    if name == "sqlite":
+        backend = SQLiteTokenBackend(DB_PATH)
+        # Closing checkpoints the WAL and removes the -wal/-shm files
+        atexit.register(backend.close)
+        return backend
+    if name == "memory":
+        return MemoryTokenBackend()
+    if name == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("The redis token backend requires the 'redis' package") from e
+        return RedisTokenBackend(redis.Redis.from_url(settings.REDIS_URL))
+    raise ValueError(f"Unknown token store backend '{name}'")
+
+
+_backend: Optional[TokenBackend] = None
+
+
+def get_backend() -> TokenBackend:
+    """Return the configured backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(settings.TOKEN_STORE_BACKEND)
+    return _backend
+
+
+def set_backend(backend: Optional[TokenBackend]) -> None:
+    """Replace the active backend; ``None`` restores the configured one."""
+    global _backend
+    _backend = backend
 
 
 def issue_token(ttl: Optional[int] = None) -> str:
     """Generate and store a token with an expiry."""
     token = secrets.token_hex(32)
-    expires_at = int(time.time()) + int(ttl or settings.TOKEN_TTL)
-    with _get_conn() as conn:
-        conn.execute(
-            "REPLACE INTO tokens (token, expires_at) VALUES (?, ?)",
-            (token, expires_at),
-        )
-        conn.commit()
+    get_backend().issue(token, int(ttl or settings.TOKEN_TTL))
     return token
 
 
 def revoke_token(token: str) -> None:
     """Remove a token from the store."""
-    with _get_conn() as conn:
-        conn.execute("DELETE FROM tokens WHERE token = ?", (token,))
-        conn.commit()
+    get_backend().revoke(token)
 
 
 def is_token_valid(token: str) -> bool:
     """Check if a token exists and has not expired."""
-    now = int(time.time())
-    with _get_conn() as conn:
-        row = conn.execute(
-            "SELECT expires_at FROM tokens WHERE token = ?", (token,)
-        ).fetchone()
-        if not row:
-            return False
-        expires_at = row[0]
-        if expires_at < now:
-            conn.execute("DELETE FROM tokens WHERE token = ?", (token,))
-            conn.commit()
-            return False
-        return True
-
-
-def _cleanup_nonces(conn: sqlite3.Connection, now: int) -> None:
-    conn.execute("DELETE FROM nonces WHERE expires_at <= ?", (now,))
-    conn.commit()
+    return get_backend().is_valid(token)
 
 
 def register_nonce(nonce: str, ttl: Optional[int] = None) -> bool:
     """Record a nonce if unused. Returns False if nonce already seen."""
-    now = int(time.time())
-    expires_at = now + int(ttl or settings.NONCE_TTL)
-    with _get_conn() as conn:
-        _cleanup_nonces(conn, now)
-        row = conn.execute("SELECT nonce FROM nonces WHERE nonce = ?", (nonce,)).fetchone()
-        if row:
-            return False
-        conn.execute(
-            "INSERT INTO nonces (nonce, expires_at) VALUES (?, ?)",
-            (nonce, expires_at),
-        )
-        conn.commit()
-    return True
+    return get_backend().register_nonce(nonce, int(ttl or settings.NONCE_TTL))
 
 
 def cleanup_expired_nonces() -> None:
-    """Remove all expired nonces from the store."""
-    now = int(time.time())
-    with _get_conn() as conn:
-        _cleanup_nonces(conn, now)
+    """Remove all expired tokens and nonces from the store."""
+    sweep_expired()
     return None
+
+
+def sweep_expired(batch_size: Optional[int] = None) -> int:
+    """Delete expired tokens and nonces in batches.
+
+    Args:
+        batch_size: Rows deleted per batch. Defaults to
+            ``settings.TOKEN_SWEEP_BATCH_SIZE``.
+
+    Returns:
+        int: Number of expired entries removed.
+    """
+    return get_backend().cleanup(batch_size or settings.TOKEN_SWEEP_BATCH_SIZE)
+
+
+async def run_sweeper(interval: Optional[float] = None) -> None:
+    """Periodically sweep expired entries off the event loop.
+
+    Intended to run as a background task for the application's lifetime.
+
+    Args:
+        interval: Seconds between sweeps. Defaults to
+            ``settings.TOKEN_SWEEP_INTERVAL``.
+    """
+    interval = interval or settings.TOKEN_SWEEP_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await asyncio.to_thread(sweep_expired)
+            if removed:
+                logger.info(f"Token store sweep removed {removed} expired entries")
+        except Exception:
+            logger.exception("Token store sweep failed")
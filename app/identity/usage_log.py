@@ -0,0 +1,113 @@
+"""Buffered writer for ``TokenUsageLog`` rows and ``last_used_at`` updates.
+
+``verify_token`` records usage in memory; a background task bulk inserts the
+rows every ``TOKEN_USAGE_FLUSH_INTERVAL`` seconds, or early once
+``TOKEN_USAGE_BATCH_SIZE`` rows are waiting, with a single ``last_used_at``
+update per token and one commit per flush. Overflow and spill handling is
+inherited from ``SpillingBatchWriter``.
+"""
+
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, insert, update
+from app.db import SessionLocal
+from app.db_buffer import SpillingBatchWriter
+from config.settings import settings
+
+from .models import ApiToken, TokenUsageLog
+
+
+class TokenUsageWriter(SpillingBatchWriter):
+    """Collect token usage in memory and write it to the database in batches."""
+
+    label = "token usage rows"
+    timestamp_fields = ("used_at",)
+
+    def __init__(
+        self,
+        max_buffer: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        overflow_policy: Optional[str] = None,
+        spill_path: Optional[str] = None,
+    ):
+        """Create a new writer.
+
+        Args:
+            max_buffer: Maximum buffered rows. Defaults to
+                ``settings.TOKEN_USAGE_BUFFER_SIZE``.
+            batch_size: Buffered rows that wake the flusher early.
+                Defaults to ``settings.TOKEN_USAGE_BATCH_SIZE``.
+            flush_interval: Seconds between periodic flushes. Defaults to
+                ``settings.TOKEN_USAGE_FLUSH_INTERVAL``.
+            overflow_policy: What to do with a row when the buffer is full:
+                ``spill`` it to the file, ``drop_oldest`` or ``drop_newest``.
+                Defaults to ``settings.TOKEN_USAGE_OVERFLOW_POLICY``.
+            spill_path: Append-only file for rows that could not reach the
+                database. Defaults to ``settings.TOKEN_USAGE_SPILL_PATH``.
+
+        Raises:
+            ValueError: If ``overflow_policy`` is not supported.
+        """
+        super().__init__(
+            max_buffer=settings.TOKEN_USAGE_BUFFER_SIZE if max_buffer is None else max_buffer,
+            batch_size=settings.TOKEN_USAGE_BATCH_SIZE if batch_size is None else batch_size,
+            flush_interval=(
+                settings.TOKEN_USAGE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+            ),
+            spill_path=spill_path or settings.TOKEN_USAGE_SPILL_PATH,
+            overflow_policy=overflow_policy or settings.TOKEN_USAGE_OVERFLOW_POLICY,
+        )
+
+    def record(
+        self,
+        token_id: str,
+        user_id: str,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+    ) -> None:
+        """Buffer one usage of ``token_id``, waking the flusher if the batch is full."""
+        self._append(
+            [
+                {
+                    "token_id": token_id,
+                    "user_id": user_id,
+                    "ip_address": ip_address,
+                    "user_agent": user_agent,
+                    "used_at": datetime.utcnow(),
+                }
+            ]
+        )
+
+    def discard_user(self, user_id: str) -> int:
+        """Drop buffered usage of ``user_id``, whose tokens are being deleted.
+
+        Returns:
+            int: Number of usage rows dropped.
+        """
+        with self._lock:
+            kept = deque(row for row in self._rows if row["user_id"] != user_id)
+            overflow = [row for row in self._overflow if row["user_id"] != user_id]
+            count = len(self._rows) + len(self._overflow) - len(kept) - len(overflow)
+            self._rows, self._overflow = kept, overflow
+        return count
+
+    def _insert(self, rows: List[dict]) -> None:
+        # Rows are in recording order, so the last one per token wins
+        last_used: Dict[str, datetime] = {row["token_id"]: row["used_at"] for row in rows}
+        with SessionLocal() as db:
+            db.execute(insert(TokenUsageLog), rows)
+            # Core executemany skips tokens deleted since their usage was recorded
+            db.execute(
+                update(ApiToken.__table__)
+                .where(ApiToken.__table__.c.id == bindparam("token"))
+                .values(last_used_at=bindparam("used")),
+                [{"token": token_id, "used": used_at} for token_id, used_at in last_used.items()],
+            )
+            db.commit()
+
+
+# Global writer instance
+usage_writer = TokenUsageWriter()
@@ -0,0 +1,169 @@
+"""Vectorized trade statistics over the columnar ledger export.
+
+Every function takes the Arrow table returned by
+``app.ledger.export.load_trades`` and aggregates it with ``pyarrow.compute``
+kernels and hash group-bys, so the cost does not depend on Python per-row
+work however many fills a report covers.
+"""
+
+from typing import List
+
+from .export import _pyarrow
+
+
+def _compute():
+    _pyarrow()
+    import pyarrow.compute as pc
+
+    return pc
+
+
+def _direction(table):
+    """Return +1 for buys and -1 for sells."""
+    pc = _compute()
+    return pc.if_else(pc.equal(table["side"], "buy"), 1.0, -1.0)
+
+
+def _fills(table):
+    pc = _compute()
+    return table.filter(pc.and_kleene(pc.equal(table["kind"], "fill"), pc.greater(table["filled"], 0)))
+
+
+def _aggregate(table, keys, aggregations, use_threads=True):
+    """Group ``table`` by ``keys`` and name each ``(column, function, name)`` result."""
+    grouped = table.group_by(keys, use_threads=use_threads).aggregate(
+        [(column, function) for column, function, _ in aggregations]
+    )
+    columns = keys + [f"{column}_{function}" for column, function, _ in aggregations]
+    return grouped.select(columns).rename_columns(keys + [name for _, _, name in aggregations])
+
+
+def _rows(table, sort_keys) -> List[dict]:
+    return table.sort_by([(key, "ascending") for key in sort_keys]).to_pylist()
+
+
+def fill_stats(table) -> List[dict]:
+    """Summarize order outcomes per account and symbol.
+
+    Returns:
+        list: One dict per ``(account, symbol)`` with request, error and fill
+        counts, ``fill_rate``, filled quantity, notional and fees.
+    """
+    pc = _compute()
+    orders = table.filter(pc.is_in(table["kind"], _pyarrow().array(["order_request", "order_error", "fill"])))
+    kind = orders["kind"]
+    is_fill = pc.equal(kind, "fill")
+
+    def flag(mask):
+        return pc.cast(mask, "int64")
+
+    def when_filled(column):
+        return pc.if_else(is_fill, pc.fill_null(orders[column], 0.0), 0.0)
+
+    counts = (
+        orders.select(["account", "symbol"])
+        .append_column("requests", flag(pc.equal(kind, "order_request")))
+        .append_column("errors", flag(pc.equal(kind, "order_error")))
+        .append_column("fills", flag(is_fill))
+        .append_column("filled", when_filled("filled"))
+        .append_column("notional", when_filled("cost"))
+        .append_column("fees", when_filled("fee"))
+    )
+    stats = _aggregate(
+        counts,
+        ["account", "symbol"],
+        [(name, "sum", name) for name in ("requests", "errors", "fills", "filled", "notional", "fees")],
+    )
+    stats = stats.append_column(
+        "fill_rate",
+        pc.divide(pc.cast(stats["fills"], "float64"), pc.if_else(pc.equal(stats["requests"], 0), None, stats["requests"])),
+    )
+    return _rows(stats, ["account", "symbol"])
+
+
+def slippage(table) -> List[dict]:
+    """Measure execution price against the signal price per exchange and symbol.
+
+    Slippage is ``(average - price) / price`` in basis points, signed so that
+    a positive value is always adverse: paying more on a buy or receiving
+    less on a sell. Fills without a signal price are skipped.
+
+    Returns:
+        list: One dict per ``(exchange, symbol)`` with the fill count and the
+        mean, notional-weighted mean, median, minimum and maximum slippage.
+    """
+    pc = _compute()
+    fills = _fills(table)
+    fills = fills.filter(pc.and_kleene(pc.greater(fills["price"], 0), pc.greater(fills["average"], 0)))
+    bps = pc.multiply(
+        pc.divide(pc.subtract(fills["average"], fills["price"]), fills["price"]),
+        pc.multiply(_direction(fills), 10000.0),
+    )
+    notional = pc.fill_null(fills["cost"], 0.0)
+    stats = _aggregate(
+        fills.select(["exchange", "symbol"])
+        .append_column("bps", bps)
+        .append_column("weighted", pc.multiply(bps, notional))
+        .append_column("notional", notional),
+        ["exchange", "symbol"],
+        [
+            ("bps", "count", "fills"),
+            ("bps", "mean", "mean_bps"),
+            ("bps", "approximate_median", "median_bps"),
+            ("bps", "min", "min_bps"),
+            ("bps", "max", "max_bps"),
+            ("weighted", "sum", "weighted"),
+            ("notional", "sum", "notional"),
+        ],
+    )
+    weighted = pc.divide(stats["weighted"], pc.if_else(pc.equal(stats["notional"], 0), None, stats["notional"]))
+    stats = stats.drop_columns(["weighted", "notional"]).append_column("weighted_bps", weighted)
+    return _rows(stats, ["exchange", "symbol"])
+
+
+def pnl(table) -> List[dict]:
+    """Compute trading PnL per account and symbol from fills.
+
+    Buys and sells are netted as quote-currency cash flows. The open
+    position is marked at the last fill price in the range, and fees are
+    deducted when charged in the quote currency. ``pnl`` therefore equals
+    realized PnL once the position is flat.
+
+    Returns:
+        list: One dict per ``(account, symbol)`` with bought and sold
+        quantity, ``position``, ``cash_flow``, ``fees``, ``mark_price`` and
+        ``pnl``.
+    """
+    pc = _compute()
+    fills = _fills(table).sort_by([("created_at", "ascending"), ("id", "ascending")])
+    direction = _direction(fills)
+    quantity = fills["filled"]
+    price = pc.fill_null(fills["average"], fills["price"])
+    cost = pc.fill_null(fills["cost"], pc.multiply(quantity, price))
+    # "BTC/USDT:USDT" settles in USDT just like "BTC/USDT"
+    quote = pc.list_element(pc.split_pattern(pc.list_element(pc.split_pattern(fills["symbol"], ":"), 0), "/"), 1)
+    fees = pc.if_else(pc.equal(fills["fee_currency"], quote), pc.fill_null(fills["fee"], 0.0), 0.0)
+    is_buy = pc.greater(direction, 0)
+
+    stats = _aggregate(
+        fills.select(["account", "symbol"])
+        .append_column("bought", pc.if_else(is_buy, quantity, 0.0))
+        .append_column("sold", pc.if_else(is_buy, 0.0, quantity))
+        .append_column("cash_flow", pc.multiply(cost, pc.negate(direction)))
+        .append_column("fees", pc.fill_null(fees, 0.0))
+        .append_column("mark_price", price),
+        ["account", "symbol"],
+        [
+            ("bought", "sum", "bought"),
+            ("sold", "sum", "sold"),
+            ("cash_flow", "sum", "cash_flow"),
+            ("fees", "sum", "fees"),
+            ("mark_price", "last", "mark_price"),
+        ],
+        # Ordered aggregations such as "last" need a single-threaded group-by
+        use_threads=False,
+    )
+    position = pc.subtract(stats["bought"], stats["sold"])
+    value = pc.add(pc.subtract(stats["cash_flow"], stats["fees"]), pc.multiply(position, stats["mark_price"]))
+    stats = stats.append_column("position", position).append_column("pnl", value)
+    return _rows(stats, ["account", "symbol"])
@@ -0,0 +1,244 @@
+"""Columnar export of the trade ledger for analytics.
+
+Ledger rows are copied into a Parquet dataset under ``LEDGER_EXPORT_DIR``,
+hive-partitioned by UTC day and account::
+
+    ledger_export/day=2024-05-01/account=binance%3A1f2e.../part-0.parquet
+
+A day is always exported whole and replaces its previous partitions, so
+re-exporting is idempotent and rows that reached the database late are
+picked up by the next run. Reports then scan only the partitions they need
+instead of aggregating ORM rows.
+
+Usage::
+
+    python -m app.ledger.export 2024-05-01 2024-05-02
+
+The ``export_ledger`` Celery beat task re-exports yesterday and today every
+``LEDGER_EXPORT_INTERVAL`` seconds.
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from sqlalchemy import select
+from app.db import SessionLocal
+from config.settings import settings
+
+from .models import LedgerEntry
+
+logger = logging.getLogger("webhook_logger")
+
+# Ledger columns copied to the export; ``detail`` stays in the database
+EXPORT_COLUMNS = (
+    "id",
+    "kind",
+    "correlation_id",
+    "order_ref",
+    "source",
+    "master_id",
+    "exchange",
+    "account",
+    "symbol",
+    "side",
+    "amount",
+    "price",
+    "filled",
+    "average",
+    "cost",
+    "fee",
+    "fee_currency",
+    "order_id",
+    "status",
+    "created_at",
+)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError as e:
+        raise RuntimeError("Ledger export requires the 'pyarrow' package") from e
+    return pyarrow
+
+
+def export_schema():
+    """Return the Arrow schema of exported rows, partition columns included."""
+    pa = _pyarrow()
+    types = {
+        "id": pa.int64(),
+        "amount": pa.float64(),
+        "price": pa.float64(),
+        "filled": pa.float64(),
+        "average": pa.float64(),
+        "cost": pa.float64(),
+        "fee": pa.float64(),
+        "created_at": pa.timestamp("us", tz="UTC"),
+    }
+    fields = [pa.field(name, types.get(name, pa.string())) for name in EXPORT_COLUMNS]
+    return pa.schema(fields + [pa.field("day", pa.string())])
+
+
+def _partitioning():
+    pa = _pyarrow()
+    return pa.dataset.partitioning(
+        pa.schema([("day", pa.string()), ("account", pa.string())]), flavor="hive"
+    )
+
+
+def _day_batches(db, day: date, schema, batch_rows: int) -> Iterator:
+    """Stream the ledger rows of ``day`` as Arrow record batches."""
+    pa = _pyarrow()
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    columns = [LedgerEntry.__table__.c[name] for name in EXPORT_COLUMNS]
+    stmt = (
+        select(*columns)
+        .where(LedgerEntry.created_at >= start, LedgerEntry.created_at < start + timedelta(days=1))
+        .order_by(LedgerEntry.created_at, LedgerEntry.id)
+        .execution_options(yield_per=batch_rows)
+    )
+    day_label = day.isoformat()
+    for rows in db.execute(stmt).partitions():
+        values = list(zip(*rows))
+        arrays = [
+            pa.array(column, type=schema.field(name).type)
+            for name, column in zip(EXPORT_COLUMNS, values)
+        ]
+        arrays.append(pa.array([day_label] * len(rows), type=pa.string()))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+@contextmanager
+def _day_lock(root: Path, day_label: str):
+    """Hold an exclusive lock on one day of the dataset across processes."""
+    import fcntl
+
+    root.mkdir(parents=True, exist_ok=True)
+    fd = os.open(root / f".day={day_label}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def export_day(day: date, directory: Optional[str] = None, batch_rows: Optional[int] = None) -> int:
+    """Write every ledger row of ``day`` to the columnar dataset.
+
+    The day is written to a hidden staging directory under the dataset root
+    and then renamed over its previous partitions, so readers never scan a
+    half-written day. Exports of the same day are serialised by a file lock,
+    which keeps the CLI, the API and the beat task from clobbering each other.
+
+    Args:
+        day: UTC day to export.
+        directory: Dataset root. Defaults to ``settings.LEDGER_EXPORT_DIR``.
+        batch_rows: Rows fetched and written per batch. Defaults to
+            ``settings.LEDGER_EXPORT_BATCH_ROWS``.
+
+    Returns:
+        int: Number of rows exported.
+
+    Raises:
+        RuntimeError: If ``pyarrow`` is not installed.
+    """
+    pa = _pyarrow()
+    schema = export_schema()
+    batch_rows = batch_rows or settings.LEDGER_EXPORT_BATCH_ROWS
+    root = Path(directory or settings.LEDGER_EXPORT_DIR)
+    day_label = day.isoformat()
+    partition = f"day={day_label}"
+    exported = 0
+
+    with _day_lock(root, day_label), SessionLocal() as db:
+
+        def counted():
+            nonlocal exported
+            for batch in _day_batches(db, day, schema, batch_rows):
+                exported += batch.num_rows
+                yield batch
+
+        # Dataset discovery skips names starting with ".", so the staging
+        # directory stays invisible to load_trades
+        staging = Path(tempfile.mkdtemp(prefix=f".{partition}.", dir=root))
+        try:
+            pa.dataset.write_dataset(
+                counted(),
+                staging,
+                schema=schema,
+                format="parquet",
+                partitioning=_partitioning(),
+                basename_template="part-{i}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+                max_rows_per_group=batch_rows,
+            )
+            if (root / partition).exists():
+                (root / partition).rename(staging / "previous")
+            if (staging / partition).exists():
+                (staging / partition).rename(root / partition)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    logger.info(f"Exported {exported} ledger rows for {day_label}")
+    return exported
+
+
+def recent_days() -> List[date]:
+    """Return yesterday and today (UTC), the days still receiving rows."""
+    today = datetime.now(timezone.utc).date()
+    return [today - timedelta(days=1), today]
+
+
+def load_trades(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    account: Optional[str] = None,
+    directory: Optional[str] = None,
+):
+    """Read exported ledger rows as one Arrow table.
+
+    Only the partitions of the requested days and account are scanned.
+
+    Args:
+        since: First day, inclusive.
+        until: Last day, inclusive.
+        account: Ledger account, ``<exchange>:<key digest>``.
+        directory: Dataset root. Defaults to ``settings.LEDGER_EXPORT_DIR``.
+
+    Returns:
+        pyarrow.Table: Matching rows with the ``export_schema`` columns.
+
+    Raises:
+        RuntimeError: If ``pyarrow`` is not installed.
+    """
+    pa = _pyarrow()
+    ds = pa.dataset
+    root = Path(directory or settings.LEDGER_EXPORT_DIR)
+    schema = export_schema()
+    if not root.exists():
+        return schema.empty_table()
+    dataset = ds.dataset(root, format="parquet", schema=schema, partitioning=_partitioning())
+    condition = None
+    for clause in (
+        ds.field("day") >= since.isoformat() if since else None,
+        ds.field("day") <= until.isoformat() if until else None,
+        ds.field("account") == account if account else None,
+    ):
+        if clause is not None:
+            condition = clause if condition is None else condition & clause
+    return dataset.to_table(filter=condition)
+
+
+if __name__ == "__main__":
+    days = [date.fromisoformat(arg) for arg in sys.argv[1:]] or [
+        datetime.now(timezone.utc).date() - timedelta(days=1)
+    ]
+    for export_date in days:
+        print(f"{export_date.isoformat()}: {export_day(export_date)} rows")
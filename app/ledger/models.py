@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    JSON,
+    String,
+)
+from app.db import Base
+
+
+def as_utc(value: datetime) -> datetime:
+    """Return ``value`` as an aware UTC datetime.
+
+    Ledger timestamps are UTC. Naive values, as SQLite returns them, are
+    taken to be UTC already.
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class LedgerEntry(Base):
+    """One append-only trade ledger event.
+
+    Rows are only ever inserted. ``kind`` is one of ``signal``,
+    ``order_request``, ``order_response``, ``order_error`` or ``fill``.
+    Events of one incoming signal share ``correlation_id``; the request,
+    response and fill of one order also share ``order_ref``. ``account`` is
+    ``<exchange>:<sha256(apiKey)[:16]>``, so API keys are never stored.
+    """
+
+    __tablename__ = "trade_ledger"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    kind = Column(String(20), nullable=False)
+    correlation_id = Column(String(64), nullable=False)
+    order_ref = Column(String(32))
+    source = Column(String(20), nullable=False)
+    master_id = Column(String(100))
+    exchange = Column(String(50))
+    account = Column(String(80))
+    symbol = Column(String(50))
+    side = Column(String(4))
+    amount = Column(Float)
+    price = Column(Float)
+    filled = Column(Float)
+    average = Column(Float)
+    cost = Column(Float)
+    fee = Column(Float)
+    fee_currency = Column(String(20))
+    order_id = Column(String(100))
+    status = Column(String(20))
+    detail = Column(JSON)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("idx_ledger_account_time", "account", "created_at", "id"),
+        Index("idx_ledger_symbol_time", "symbol", "created_at", "id"),
+        Index("idx_ledger_time", "created_at", "id"),
+        Index("idx_ledger_correlation", "correlation_id"),
+    )
@@ -0,0 +1,101 @@
+"""Keyset-paginated reads of the trade ledger.
+
+Entries are returned newest first, ordered by ``(created_at, id)``. The
+cursor encodes the last entry of a page, so each page is a range scan on
+one of the ``idx_ledger_*`` indexes however deep the client pages.
+"""
+
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from .models import LedgerEntry, as_utc
+
+
+def encode_cursor(entry: LedgerEntry) -> str:
+    """Return the opaque cursor pointing just past ``entry``."""
+    raw = f"{as_utc(entry.created_at).isoformat()}|{entry.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor from ``encode_cursor``.
+
+    Raises:
+        ValueError: If ``cursor`` is malformed.
+    """
+    try:
+        created_at, _, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+        return as_utc(datetime.fromisoformat(created_at)), int(entry_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def query_entries(
+    db: Session,
+    account: Optional[str] = None,
+    symbol: Optional[str] = None,
+    kind: Optional[str] = None,
+    correlation_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> Tuple[List[LedgerEntry], Optional[str]]:
+    """Return one page of ledger entries matching the filters.
+
+    Args:
+        db: Database session.
+        account: Ledger account, ``<exchange>:<key digest>``.
+        symbol: Market symbol such as ``"BTC/USDT"``.
+        kind: Event kind such as ``"fill"``.
+        correlation_id: Events of one incoming signal.
+        since: Earliest ``created_at``, inclusive. Naive values are UTC.
+        until: Latest ``created_at``, exclusive. Naive values are UTC.
+        limit: Maximum entries to return.
+        cursor: ``next_cursor`` of the previous page.
+
+    Returns:
+        tuple: The entries and the cursor of the next page, or ``None`` on
+        the last page.
+
+    Raises:
+        ValueError: If ``cursor`` is malformed.
+    """
+    stmt = select(LedgerEntry)
+    if account:
+        stmt = stmt.where(LedgerEntry.account == account)
+    if symbol:
+        stmt = stmt.where(LedgerEntry.symbol == symbol)
+    if kind:
+        stmt = stmt.where(LedgerEntry.kind == kind)
+    if correlation_id:
+        stmt = stmt.where(LedgerEntry.correlation_id == correlation_id)
+    if since:
+        stmt = stmt.where(LedgerEntry.created_at >= as_utc(since))
+    if until:
+        stmt = stmt.where(LedgerEntry.created_at < as_utc(until))
+    if cursor:
+        created_at, entry_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                LedgerEntry.created_at < created_at,
+                and_(LedgerEntry.created_at == created_at, LedgerEntry.id < entry_id),
+            )
+        )
+    stmt = stmt.order_by(LedgerEntry.created_at.desc(), LedgerEntry.id.desc()).limit(limit + 1)
+    entries = list(db.scalars(stmt))
+    next_cursor = encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return entries[:limit], next_cursor
+
+
+def entry_to_dict(entry: LedgerEntry) -> dict:
+    """Serialize ``entry`` for API responses."""
+    data = {}
+    for column in LedgerEntry.__table__.columns:
+        value = getattr(entry, column.name)
+        data[column.name] = as_utc(value).isoformat() if isinstance(value, datetime) else value
+    return data
@@ -0,0 +1,94 @@
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.db import SessionLocal
+from app.identity.permissions import permission_required
+from config.settings import settings
+
+from .analytics import fill_stats, pnl, slippage
+from .export import export_day, load_trades
+from .query import entry_to_dict, query_entries
+
+router = APIRouter(prefix="/api/v1/ledger", tags=["ledger"])
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@permission_required("ledger", "read")
+@router.get("/entries")
+def list_entries(
+    account: Optional[str] = None,
+    symbol: Optional[str] = None,
+    kind: Optional[str] = None,
+    correlation_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=settings.LEDGER_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Page through ledger entries, newest first.
+
+    Pass the returned ``next_cursor`` as ``cursor`` to fetch the next page;
+    it is ``null`` on the last page.
+    """
+    try:
+        entries, next_cursor = query_entries(
+            db,
+            account=account,
+            symbol=symbol,
+            kind=kind,
+            correlation_id=correlation_id,
+            since=since,
+            until=until,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"entries": [entry_to_dict(e) for e in entries], "next_cursor": next_cursor}
+
+
+@permission_required("ledger", "read")
+@router.get("/report")
+def trade_report(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    account: Optional[str] = None,
+):
+    """Report fill statistics, slippage and PnL between two UTC days.
+
+    Reads the columnar ledger export rather than the database, so days not
+    yet exported are missing from the report.
+    """
+    try:
+        trades = load_trades(since=since, until=until, account=account)
+        return {
+            "since": since,
+            "until": until,
+            "account": account,
+            "rows": trades.num_rows,
+            "fills": fill_stats(trades),
+            "slippage": slippage(trades),
+            "pnl": pnl(trades),
+        }
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@permission_required("ledger", "write")
+@router.post("/export")
+def export_ledger(day: date):
+    """Rewrite the columnar export of one UTC day from the database."""
+    try:
+        return {"day": day, "rows": export_day(day)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
@@ -0,0 +1,228 @@
+"""Append-only, batched writer for the trade ledger.
+
+Order paths call ``record_*`` methods, which only append to an in-memory
+buffer. A background task bulk inserts the buffer every
+``LEDGER_FLUSH_INTERVAL`` seconds, or as soon as ``LEDGER_BATCH_SIZE``
+events are waiting, so order placement never waits on the database. Ledger
+events are never dropped: when the buffer is full or the database cannot be
+written they are appended to a JSON-lines spill file and replayed after the
+next successful flush.
+"""
+
+import hashlib
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, List, Optional
+
+from sqlalchemy import insert
+from app.db import SessionLocal
+from app.db_buffer import SpillingBatchWriter
+from config.settings import settings
+
+from .models import LedgerEntry, as_utc
+
+# Payload fields that must never reach the ledger
+SECRET_FIELDS = frozenset({"apiKey", "secret", "token", "nonce", "password"})
+
+
+# Every column but the primary key, so bulk inserts see uniform rows
+_EMPTY_ROW = {c.name: None for c in LedgerEntry.__table__.columns if not c.primary_key}
+
+
+def account_id(exchange: str, api_key: Optional[str]) -> str:
+    """Return the ledger account of an exchange API key without storing the key."""
+    digest = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    return f"{exchange.lower()}:{digest}"
+
+
+def _number(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+@dataclass(frozen=True)
+class LedgerOrder:
+    """Identity of one order across its ledger events."""
+
+    correlation_id: str
+    order_ref: str
+    source: str
+    exchange: str
+    account: str
+    symbol: str
+    side: str
+    amount: float
+    price: Optional[float] = None
+    master_id: Optional[str] = None
+
+    @classmethod
+    def create(
+        cls,
+        correlation_id: str,
+        source: str,
+        exchange: str,
+        api_key: Optional[str],
+        symbol: str,
+        side: str,
+        amount: float,
+        price: Optional[float] = None,
+        master_id: Optional[str] = None,
+    ) -> "LedgerOrder":
+        """Describe a new order, assigning it a fresh ``order_ref``."""
+        return cls(
+            correlation_id=correlation_id,
+            order_ref=uuid.uuid4().hex,
+            source=source,
+            exchange=exchange.lower(),
+            account=account_id(exchange, api_key),
+            symbol=symbol,
+            side=side,
+            amount=amount,
+            price=price,
+            master_id=master_id,
+        )
+
+    def row(self, kind: str, **values) -> dict:
+        row = {
+            "kind": kind,
+            "correlation_id": self.correlation_id,
+            "order_ref": self.order_ref,
+            "source": self.source,
+            "master_id": self.master_id,
+            "exchange": self.exchange,
+            "account": self.account,
+            "symbol": self.symbol,
+            "side": self.side,
+            "amount": self.amount,
+            "price": self.price,
+            "created_at": datetime.now(timezone.utc),
+        }
+        row.update(values)
+        return row
+
+
+class LedgerWriter(SpillingBatchWriter):
+    """Buffer ledger events and append them to ``trade_ledger`` in bulk."""
+
+    label = "ledger events"
+
+    def __init__(
+        self,
+        max_buffer: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        spill_path: Optional[str] = None,
+    ):
+        """Create a new writer.
+
+        Args:
+            max_buffer: Maximum buffered events before new ones are spilled
+                to disk. Defaults to ``settings.LEDGER_BUFFER_SIZE``.
+            batch_size: Buffered events that wake the flusher early.
+                Defaults to ``settings.LEDGER_BATCH_SIZE``.
+            flush_interval: Seconds between periodic flushes. Defaults to
+                ``settings.LEDGER_FLUSH_INTERVAL``.
+            spill_path: Append-only file for events that could not be
+                buffered or written. Defaults to ``settings.LEDGER_SPILL_PATH``.
+        """
+        super().__init__(
+            max_buffer=settings.LEDGER_BUFFER_SIZE if max_buffer is None else max_buffer,
+            batch_size=settings.LEDGER_BATCH_SIZE if batch_size is None else batch_size,
+            flush_interval=(
+                settings.LEDGER_FLUSH_INTERVAL if flush_interval is None else flush_interval
+            ),
+            spill_path=spill_path or settings.LEDGER_SPILL_PATH,
+        )
+
+    def record_signal(
+        self,
+        correlation_id: str,
+        source: str,
+        signal: dict,
+        master_id: Optional[str] = None,
+    ) -> None:
+        """Record an authenticated incoming signal, minus its credentials."""
+        exchange = signal.get("exchange")
+        self._append(
+            [
+                {
+                    "kind": "signal",
+                    "correlation_id": correlation_id,
+                    "source": source,
+                    "master_id": master_id,
+                    "exchange": exchange.lower() if exchange else None,
+                    "account": account_id(exchange, signal.get("apiKey")) if exchange else None,
+                    "symbol": signal.get("symbol"),
+                    "side": signal.get("side"),
+                    "amount": _number(signal.get("amount")),
+                    "price": _number(signal.get("price")),
+                    "detail": {k: v for k, v in signal.items() if k not in SECRET_FIELDS},
+                    "created_at": datetime.now(timezone.utc),
+                }
+            ]
+        )
+
+    def record_request(self, order: LedgerOrder) -> None:
+        """Record that ``order`` is about to be sent to the exchange."""
+        self._append([order.row("order_request")])
+
+    def record_result(
+        self,
+        order: LedgerOrder,
+        response: Optional[dict] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Record the exchange response to ``order``, and its fill if any."""
+        if error is not None:
+            self._append(
+                [
+                    order.row(
+                        "order_error",
+                        status="error",
+                        detail={"error": type(error).__name__, "message": str(error)},
+                    )
+                ]
+            )
+            return
+        response = response or {}
+        fee = response.get("fee") or {}
+        values = {
+            "order_id": str(response["id"]) if response.get("id") is not None else None,
+            "status": response.get("status"),
+            "filled": _number(response.get("filled")),
+            "average": _number(response.get("average")),
+            "cost": _number(response.get("cost")),
+            "fee": _number(fee.get("cost")) if isinstance(fee, dict) else None,
+            "fee_currency": fee.get("currency") if isinstance(fee, dict) else None,
+        }
+        rows = [order.row("order_response", detail=response, **values)]
+        if values["filled"]:
+            rows.append(order.row("fill", **values))
+        self._append(rows)
+
+    async def track(self, order: LedgerOrder, placement: Awaitable[dict]) -> dict:
+        """Await ``placement`` and record the request and its result.
+
+        Exceptions are recorded and re-raised unchanged.
+        """
+        self.record_request(order)
+        try:
+            response = await placement
+        except Exception as e:
+            self.record_result(order, error=e)
+            raise
+        self.record_result(order, response if isinstance(response, dict) else None)
+        return response
+
+    def _insert(self, rows: List[dict]) -> None:
+        with SessionLocal() as db:
+            db.execute(insert(LedgerEntry), [{**_EMPTY_ROW, **row} for row in rows])
+            db.commit()
+
+    def _decode(self, row: dict) -> dict:
+        row["created_at"] = as_utc(datetime.fromisoformat(row["created_at"]))
+        return row
+
+
+# Global writer instance
+ledger_writer = LedgerWriter()
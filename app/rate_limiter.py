@@ -1,9 +1,307 @@
-"""Centralized rate limiter configuration for the API."""
+"""Centralized token-bucket rate limiting for the API.
 
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+One engine enforces limits for every scope: client IP, API token, user and
+exchange account. Each ``scope:key`` pair owns a bucket holding up to
+``count`` tokens that refills continuously at ``count / period`` tokens per
+second, so a steady client below its rate is never locked out.
 
-# Use the client's IP address to identify unique callers
-limiter = Limiter(key_func=get_remote_address)
+Buckets live in process memory (``local``) or in Redis (``redis``), where a
+Lua script updates them atomically using the server clock so every replica
+sees the same limits. Calls to a Redis backend block on the network, so
+async callers go through ``hit_async``/``check_async``, which run them on a
+worker thread.
+"""
 
-__all__ = ["limiter"]
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import HTTPException, Request
+from config.settings import settings
+
+logger = logging.getLogger("webhook_logger")
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Rate(NamedTuple):
+    """Bucket capacity and the seconds needed to refill it completely."""
+
+    count: int
+    period: float
+
+    @property
+    def per_second(self) -> float:
+        return self.count / self.period
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate: str) -> Rate:
+    """Parse ``"10/minute"`` style limits.
+
+    Raises:
+        ValueError: If ``rate`` is malformed.
+    """
+    count, _, per = rate.partition("/")
+    per = per.strip().rstrip("s")
+    if per not in _PERIODS:
+        raise ValueError(f"Invalid rate limit '{rate}'")
+    return Rate(int(count), _PERIODS[per])
+
+
+class RateLimitExceeded(HTTPException):
+    """Raised when a bucket has no token left for the request."""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(
+            status_code=429,
+            detail=f"Rate limit exceeded for {scope}",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+
+
+class LocalBucketBackend:
+    """Token buckets held in process memory."""
+
+    # Taking a token never waits on I/O, so it can run on the event loop
+    blocking = False
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets: Dict[float, TTLCache] = {}
+        self._lock = threading.Lock()
+
+    def _table(self, rate: Rate) -> TTLCache:
+        # An idle bucket is full again after one period, so dropping it then
+        # loses nothing
+        table = self._buckets.get(rate.period)
+        if table is None:
+            table = TTLCache(maxsize=self.maxsize, ttl=rate.period)
+            self._buckets[rate.period] = table
+        return table
+
+    def take(self, key: str, rate: Rate, cost: float = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            table = self._table(rate)
+            tokens, updated = table.get(key, (rate.count, now))
+            tokens = min(rate.count, tokens + (now - updated) * rate.per_second)
+            if tokens >= cost:
+                table[key] = (tokens - cost, now)
+                return True, 0.0
+            table[key] = (tokens, now)
+            return False, (cost - tokens) / rate.per_second
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local per_second = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * per_second)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / per_second
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / per_second * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBucketBackend:
+    """Token buckets in Redis, updated atomically by a Lua script."""
+
+    blocking = True
+
+    def __init__(self, client, prefix: str = "webhook:rl:"):
+        """Create a Redis backend.
+
+        Args:
+            client: Synchronous ``redis.Redis`` compatible client.
+            prefix: Namespace prepended to every bucket key.
+        """
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(TOKEN_BUCKET_LUA)
+
+    def take(self, key: str, rate: Rate, cost: float = 1) -> Tuple[bool, float]:
+        allowed, retry_after = self._script(
+            keys=[f"{self.prefix}{key}"],
+            args=[rate.count, rate.per_second, cost],
+        )
+        return bool(int(allowed)), float(retry_after)
+
+    def reset(self) -> None:
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+def account_key(exchange: str, api_key: str) -> str:
+    """Return the ``account`` bucket key of an exchange API key."""
+    digest = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return f"{exchange.lower()}:{digest}"
+
+
+def _account_keys(request: Request, params: dict) -> Dict[str, int]:
+    # Batches charge each account once per order it places
+    payload = params.get("payload")
+    orders = getattr(payload, "orders", None) or [payload]
+    return dict(
+        Counter(
+            account_key(order.exchange, order.apiKey)
+            for order in orders
+            if getattr(order, "exchange", None) and getattr(order, "apiKey", None)
+        )
+    )
+
+
+def _ip_keys(request: Request, params: dict) -> Dict[str, int]:
+    return {request.client.host if request.client else "127.0.0.1": 1}
+
+
+# Keys, and the tokens each is charged, for the scopes enforced by ``limit``
+KEY_FUNCS: Dict[str, Callable[[Request, dict], Dict[str, int]]] = {
+    "ip": _ip_keys,
+    "account": _account_keys,
+}
+
+
+class RateLimiter:
+    """Apply token-bucket limits per scope through one storage backend."""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_backend(settings.RATE_LIMIT_BACKEND)
+        return self._backend
+
+    def rate_for(self, scope: str) -> Optional[Rate]:
+        """Return the configured rate for ``scope``, or None if unlimited."""
+        rate = {
+            "ip": settings.RATE_LIMIT,
+            "token": settings.TOKEN_RATE_LIMIT or settings.RATE_LIMIT,
+            "user": settings.USER_RATE_LIMIT,
+            "account": settings.ACCOUNT_RATE_LIMIT,
+        }.get(scope)
+        return parse_rate(rate) if rate else None
+
+    def hit(self, scope: str, key: str, rate: Optional[Rate] = None, cost: float = 1) -> Tuple[bool, float]:
+        """Take ``cost`` tokens from the ``scope`` bucket of ``key``.
+
+        Returns:
+            tuple: Whether the request is allowed and, if not, the seconds
+            until enough tokens are available.
+        """
+        rate = rate or self.rate_for(scope)
+        if rate is None:
+            return True, 0.0
+        try:
+            return self.backend.take(f"{scope}:{key}", rate, cost)
+        except Exception as e:
+            # Fail open: a limiter outage should not stop order flow
+            logger.error(f"Rate limiter backend error for {scope}: {e}")
+            return True, 0.0
+
+    def check(self, scope: str, key: str, cost: float = 1) -> None:
+        """Like ``hit`` but raise ``RateLimitExceeded`` when over the limit."""
+        allowed, retry_after = self.hit(scope, key, cost=cost)
+        if not allowed:
+            logger.warning(f"Rate limit exceeded for {scope} {key}")
+            raise RateLimitExceeded(scope, retry_after)
+
+    def _check_all(self, checks: List[Tuple[str, str, float]]) -> None:
+        for scope, key, cost in checks:
+            self.check(scope, key, cost)
+
+    async def _offload(self, func: Callable, *args):
+        if not getattr(self.backend, "blocking", True):
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def hit_async(self, scope: str, key: str, cost: float = 1) -> Tuple[bool, float]:
+        """``hit`` for coroutines, off the event loop when the backend blocks."""
+        return await self._offload(functools.partial(self.hit, scope, key, cost=cost))
+
+    async def check_async(self, scope: str, key: str, cost: float = 1) -> None:
+        """``check`` for coroutines, off the event loop when the backend blocks."""
+        await self._offload(self._check_all, [(scope, key, cost)])
+
+    def limit(self, *scopes: str) -> Callable:
+        """Decorate an endpoint taking ``request`` to enforce ``scopes``.
+
+        Defaults to the ``ip`` scope. Keys and their costs come from
+        ``KEY_FUNCS``; all of them are checked in one trip off the event
+        loop when the backend blocks.
+        """
+        scopes = scopes or ("ip",)
+
+        def decorator(func: Callable) -> Callable:
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                params = signature.bind_partial(*args, **kwargs).arguments
+                request = params["request"]
+                checks = [
+                    (scope, key, cost)
+                    for scope in scopes
+                    for key, cost in KEY_FUNCS[scope](request, params).items()
+                ]
+                await self._offload(self._check_all, checks)
+                return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def reset(self) -> None:
+        """Refill every bucket."""
+        self.backend.reset()
+
+
+def create_backend(name: str):
+    """Build the rate limit backend called ``name``.
+
+    Raises:
+        ValueError: If ``name`` is not a known backend.
+        RuntimeError: If the Redis backend is requested without ``redis``.
+    """
+    if name == "local":
+        return LocalBucketBackend(settings.TOKEN_RATE_CACHE_SIZE)
+    if name == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("The redis rate limit backend requires the 'redis' package") from e
+        return RedisBucketBackend(redis.Redis.from_url(settings.REDIS_URL))
+    raise ValueError(f"Unknown rate limit backend '{name}'")
+
+
+# Global limiter instance
+limiter = RateLimiter()
+
+__all__ = ["limiter", "RateLimiter", "RateLimitExceeded", "account_key", "parse_rate"]
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Float, Integer, String, Text, UniqueConstraint
+from app.db import Base
+from app.identity.models import TimestampMixin
+
+
+class FollowerSubscription(Base, TimestampMixin):
+    """A follower account copying one master strategy.
+
+    ``credentials`` holds the follower's exchange ``apiKey`` and ``secret``
+    encrypted with ``DOCUMENT_ENCRYPTION_KEY``; they are never stored in
+    clear text.
+    """
+
+    __tablename__ = "follower_subscriptions"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    master_id = Column(String(100), nullable=False)
+    follower_id = Column(String(100), nullable=False)
+    exchange = Column(String(50), nullable=False)
+    credentials = Column(Text, nullable=False)
+    multiplier = Column(Float, nullable=False, default=1.0)
+    max_amount = Column(Float)
+
+    __table_args__ = (
+        UniqueConstraint("master_id", "follower_id", name="uq_follower_subscription"),
+    )
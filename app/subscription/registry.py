@@ -0,0 +1,120 @@
+"""Registry of follower accounts subscribed to master strategies.
+
+Subscriptions are stored in the identity database so every API worker and
+Celery worker resolves the same followers.
+"""
+
+import asyncio
+import json
+from typing import List, Optional
+from pydantic import BaseModel, confloat
+from sqlalchemy import exists
+from app.compliance.storage import decrypt_value, encrypt_value
+from app.db import SessionLocal
+
+from .models import FollowerSubscription
+
+
+class FollowerAccount(BaseModel):
+    """
+    Exchange account that copies a master's signals.
+
+    Fields:
+        follower_id (str): Unique identifier of the follower.
+        exchange (str): Exchange ID used by the follower (e.g., 'binance').
+        apiKey (str): Follower API key.
+        secret (str): Follower API secret.
+        multiplier (float): Factor applied to the master amount (> 0).
+        max_amount (Optional[float]): Upper bound on a replicated order.
+    """
+    follower_id: str
+    exchange: str
+    apiKey: str
+    secret: str
+    multiplier: confloat(gt=0) = 1.0
+    max_amount: Optional[confloat(gt=0)] = None
+
+
+def _to_account(row: FollowerSubscription) -> FollowerAccount:
+    credentials = json.loads(decrypt_value(row.credentials))
+    return FollowerAccount(
+        follower_id=row.follower_id,
+        exchange=row.exchange,
+        apiKey=credentials["apiKey"],
+        secret=credentials["secret"],
+        multiplier=row.multiplier,
+        max_amount=row.max_amount,
+    )
+
+
+class SubscriptionRegistry:
+    """Map master ids to the follower accounts replicating their orders."""
+
+    def __init__(self, session_factory=SessionLocal):
+        """Create a registry backed by ``session_factory`` sessions."""
+        self.session_factory = session_factory
+
+    def subscribe(self, master_id: str, follower: FollowerAccount) -> None:
+        """Add or replace ``follower`` in ``master_id``'s follower list.
+
+        Raises:
+            RuntimeError: If ``DOCUMENT_ENCRYPTION_KEY`` is not configured.
+        """
+        credentials = encrypt_value(json.dumps({"apiKey": follower.apiKey, "secret": follower.secret}))
+        with self.session_factory() as db:
+            row = (
+                db.query(FollowerSubscription)
+                .filter_by(master_id=master_id, follower_id=follower.follower_id)
+                .first()
+            )
+            if row is None:
+                row = FollowerSubscription(master_id=master_id, follower_id=follower.follower_id)
+                db.add(row)
+            row.exchange = follower.exchange
+            row.credentials = credentials
+            row.multiplier = follower.multiplier
+            row.max_amount = follower.max_amount
+            db.commit()
+
+    def unsubscribe(self, master_id: str, follower_id: str) -> bool:
+        """Stop ``follower_id`` from copying ``master_id``.
+
+        Returns:
+            bool: ``True`` if the subscription existed.
+        """
+        with self.session_factory() as db:
+            deleted = (
+                db.query(FollowerSubscription)
+                .filter_by(master_id=master_id, follower_id=follower_id)
+                .delete()
+            )
+            db.commit()
+        return bool(deleted)
+
+    def followers(self, master_id: str) -> List[FollowerAccount]:
+        """Return the followers subscribed to ``master_id`` with their credentials."""
+        with self.session_factory() as db:
+            rows = (
+                db.query(FollowerSubscription)
+                .filter_by(master_id=master_id)
+                .order_by(FollowerSubscription.follower_id)
+                .all()
+            )
+            return [_to_account(row) for row in rows]
+
+    def has_followers(self, master_id: str) -> bool:
+        """Return whether anyone follows ``master_id``, without decrypting credentials."""
+        with self.session_factory() as db:
+            return db.query(exists().where(FollowerSubscription.master_id == master_id)).scalar()
+
+    async def has_followers_async(self, master_id: str) -> bool:
+        """Run :meth:`has_followers` off the event loop."""
+        return await asyncio.to_thread(self.has_followers, master_id)
+
+    async def resolve(self, master_id: str) -> List[FollowerAccount]:
+        """Return the followers currently subscribed to ``master_id``."""
+        return await asyncio.to_thread(self.followers, master_id)
+
+
+# Global registry instance
+subscription_registry = SubscriptionRegistry()
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException
+from app.identity.permissions import permission_required
+
+from .registry import FollowerAccount, subscription_registry
+
+router = APIRouter(prefix="/api/v1/subscriptions", tags=["subscriptions"])
+
+
+@permission_required("subscription", "write")
+@router.put("/{master_id}/followers")
+def subscribe_follower(master_id: str, payload: FollowerAccount):
+    """Subscribe a follower account to ``master_id``, replacing any previous one."""
+    try:
+        subscription_registry.subscribe(master_id, payload)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"master_id": master_id, "follower_id": payload.follower_id}
+
+
+@permission_required("subscription", "read")
+@router.get("/{master_id}/followers")
+def list_followers(master_id: str):
+    """List the followers of ``master_id`` without their credentials."""
+    try:
+        followers = subscription_registry.followers(master_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "master_id": master_id,
+        "followers": [
+            f.model_dump(include={"follower_id", "exchange", "multiplier", "max_amount"})
+            for f in followers
+        ],
+    }
+
+
+@permission_required("subscription", "write")
+@router.delete("/{master_id}/followers/{follower_id}")
+def unsubscribe_follower(master_id: str, follower_id: str):
+    """Stop ``follower_id`` from copying ``master_id``."""
+    if not subscription_registry.unsubscribe(master_id, follower_id):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return {"status": "unsubscribed"}
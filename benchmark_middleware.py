@@ -0,0 +1,189 @@
+"""Benchmark middleware overhead on the ``/webhook`` endpoint.
+
+Builds the webhook app twice, once with the pure ASGI metrics, permission
+and HTTPS middlewares and once with equivalent ``BaseHTTPMiddleware``
+versions, then drives signed requests through an in-process transport with
+a stubbed exchange and reports requests per second for each stack.
+Databases and spill files live in a temporary directory and trade ledger
+events are discarded, so benchmark orders never reach real ledger data.
+
+Usage::
+
+    python benchmark_middleware.py --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+os.environ.setdefault("WEBHOOK_SECRET", "benchmark-secret")
+os.environ.setdefault("DEFAULT_EXCHANGE", "binance")
+os.environ.setdefault("DEFAULT_API_KEY", "key")
+os.environ.setdefault("DEFAULT_API_SECRET", "secret")
+os.environ.setdefault("RATE_LIMIT", "1000000/second")
+
+STATE_DIR = tempfile.mkdtemp(prefix="webhook-bench-")
+atexit.register(shutil.rmtree, STATE_DIR, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(STATE_DIR, 'identity.db')}"
+os.environ["TOKEN_DB_PATH"] = os.path.join(STATE_DIR, "tokens.db")
+os.environ["REPLAY_SHM_PATH"] = os.path.join(STATE_DIR, "replay.bin")
+os.environ["AUDIT_SPILL_PATH"] = os.path.join(STATE_DIR, "permission_audit.spill.jsonl")
+os.environ["TOKEN_USAGE_SPILL_PATH"] = os.path.join(STATE_DIR, "token_usage.spill.jsonl")
+os.environ["LEDGER_SPILL_PATH"] = os.path.join(STATE_DIR, "ledger.spill.jsonl")
+os.environ["LEDGER_EXPORT_DIR"] = os.path.join(STATE_DIR, "ledger_export")
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+import app.api.routes as routes
+from app.dashboard.metrics import REQUEST_LATENCY, MetricsMiddleware, method_label, route_label
+from app.https_middleware import HttpsMiddleware
+from app.identity.permissions import PermissionMiddleware
+from config.settings import settings
+
+
+class StubExchange:
+    """Exchange that fills every market order immediately."""
+
+    id = "binance"
+
+    async def create_market_order(self, symbol, side, amount):
+        return {"id": "1", "symbol": symbol, "side": side, "amount": amount}
+
+
+async def _get_exchange(*args, **kwargs):
+    return StubExchange()
+
+
+async def _release_exchange(exchange):
+    return None
+
+
+async def _load_markets(exchange):
+    return {}
+
+
+class BaseHTTPMetricsMiddleware(BaseHTTPMiddleware):
+    """``BaseHTTPMiddleware`` version of ``MetricsMiddleware``."""
+
+    async def dispatch(self, request, call_next):
+        start_time = time.perf_counter()
+        response = await call_next(request)
+        latency = time.perf_counter() - start_time
+        REQUEST_LATENCY.labels(method_label(request.method), route_label(request.scope)).observe(latency)
+        return response
+
+
+class BaseHTTPPermissionMiddleware(BaseHTTPMiddleware):
+    """``BaseHTTPMiddleware`` version of ``PermissionMiddleware``."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.checker = PermissionMiddleware(app)
+
+    async def dispatch(self, request, call_next):
+        perm = self.checker.index.lookup(request.scope)
+        if perm:
+            response = await self.checker._authorize(request, perm)
+            if response is not None:
+                return response
+        return await call_next(request)
+
+
+class BaseHTTPHttpsMiddleware(BaseHTTPMiddleware):
+    """``BaseHTTPMiddleware`` version of ``HttpsMiddleware``."""
+
+    async def dispatch(self, request, call_next):
+        if settings.REQUIRE_HTTPS and request.url.scheme != "https":
+            return JSONResponse({"detail": "HTTPS required"}, status_code=400)
+        return await call_next(request)
+
+
+def build_app(middlewares: List[type]) -> FastAPI:
+    """Create a webhook app with ``middlewares`` in ``main.py`` order."""
+    bench_app = FastAPI()
+    for middleware in middlewares:
+        bench_app.add_middleware(middleware)
+    bench_app.include_router(routes.router)
+    return bench_app
+
+
+def _signed_request(i: int) -> Dict[str, object]:
+    payload = {
+        "exchange": "binance",
+        "apiKey": "key",
+        "secret": "secret",
+        "symbol": "BTC/USDT",
+        "side": "buy",
+        "amount": 1 + i * 1e-6,  # unique body, so each signature is fresh
+        "price": 100,
+    }
+    body = json.dumps(payload).encode()
+    signature = hmac.new(settings.WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    headers = {
+        "Content-Type": "application/json",
+        "X-Timestamp": str(int(time.time())),
+        "X-Signature": signature,
+    }
+    return {"content": body, "headers": headers}
+
+
+async def run(bench_app: FastAPI, total: int, concurrency: int, offset: int) -> float:
+    """Send ``total`` webhook requests and return requests per second."""
+    requests = [_signed_request(offset + i) for i in range(total)]
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = ASGITransport(app=bench_app)
+    async with AsyncClient(transport=transport, base_url="https://bench") as client:
+
+        async def send(request):
+            async with semaphore:
+                response = await client.post("/webhook", **request)
+                if response.status_code != 200:
+                    raise RuntimeError(f"Unexpected response: {response.status_code} {response.text}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(request) for request in requests))
+        return total / (time.perf_counter() - start)
+
+
+async def main(total: int, concurrency: int, rounds: int) -> None:
+    routes.get_exchange = _get_exchange
+    routes.release_exchange = _release_exchange
+    routes.market_cache.load = _load_markets
+    routes.ledger_writer._append = lambda rows: None
+
+    stacks = {
+        "BaseHTTPMiddleware": build_app(
+            [BaseHTTPMetricsMiddleware, BaseHTTPPermissionMiddleware, BaseHTTPHttpsMiddleware]
+        ),
+        "pure ASGI": build_app([MetricsMiddleware, PermissionMiddleware, HttpsMiddleware]),
+    }
+    results: Dict[str, List[float]] = {name: [] for name in stacks}
+    offset = 0
+    for _ in range(rounds):
+        for name, bench_app in stacks.items():
+            results[name].append(await run(bench_app, total, concurrency, offset))
+            offset += total
+    for name, values in results.items():
+        print(f"{name:>20}: {max(values):8.0f} req/s (best of {rounds})")
+    base, fast = max(results["BaseHTTPMiddleware"]), max(results["pure ASGI"])
+    print(f"{'speedup':>20}: {fast / base:8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.rounds))
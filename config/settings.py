@@ -17,15 +17,130 @@ class Settings(BaseSettings):
         RATE_LIMIT (str): Requests allowed per time window (e.g., "10/minute").
         SIGNATURE_CACHE_TTL (int): Seconds to remember request signatures for
             replay protection.
-        SIGNATURE_CACHE_SIZE (int): Maximum number of entries in the signature
-            replay cache.
+        SIGNATURE_CACHE_SIZE (int): Deprecated and ignored; the replay store
+            is sized by ``REPLAY_STORE_SIZE``.
+        REPLAY_STORE_SIZE (int): Signatures the ``memory`` and ``shared``
+            replay stores can hold. Expired entries are reused first; once
+            every entry is live, new signed requests are rejected (fail
+            closed), so keep it well above the signed request rate times
+            ``SIGNATURE_CACHE_TTL``. The ``shared`` store preallocates 24
+            bytes per entry.
+        REPLAY_STORE_BACKEND (str): Signature replay store: ``memory``,
+            ``shared`` (all workers on a host) or ``redis`` (all nodes).
+        REPLAY_SHM_PATH (str): File mapped by the ``shared`` replay store.
         TOKEN_TTL (int): Seconds before issued tokens expire.
-        TOKEN_RATE_CACHE_SIZE (int): Maximum number of tracked tokens for rate
-            limiting.
+        TOKEN_RATE_CACHE_SIZE (int): Maximum number of rate limit buckets
+            kept in memory by the ``local`` backend.
+        RATE_LIMIT_BACKEND (str): Token bucket storage: ``local`` or ``redis``
+            (shared across replicas).
+        TOKEN_RATE_LIMIT (str): Limit per API token; defaults to ``RATE_LIMIT``
+            when empty.
+        USER_RATE_LIMIT (str): Limit per user across their tokens; empty
+            disables it.
+        ACCOUNT_RATE_LIMIT (str): Limit per exchange account, charged once
+            per order on ``/webhook`` and ``/webhook/batch`` and once per
+            follower order on copy fan-out; empty disables it.
         REQUIRE_HTTPS (bool): Reject non-HTTPS requests when True.
+        TOKEN_STORE_BACKEND (str): Token and nonce storage: ``sqlite``,
+            ``memory`` or ``redis``.
+        REDIS_URL (str): Redis connection URL for Redis-backed stores.
+        TOKEN_SWEEP_INTERVAL (int): Seconds between background sweeps of
+            expired tokens and nonces.
+        TOKEN_SWEEP_BATCH_SIZE (int): Rows deleted per sweep batch.
+        AUTH_EXECUTOR_WORKERS (int): Threads used to verify tokens off the
+            event loop.
+        TOKEN_CACHE_SIZE (int): Maximum resolved API tokens kept in memory.
+        TOKEN_CACHE_TTL (int): Seconds a cached API token is trusted before
+            it is reloaded from the database.
+        TOKEN_CACHE_PUBSUB (bool): Broadcast token and permission cache
+            invalidations to other workers over Redis.
+        TOKEN_CACHE_CHANNEL (str): Redis channel for token cache invalidations.
+        TOKEN_USAGE_BUFFER_SIZE (int): Maximum token usage rows held in
+            memory before the overflow policy applies.
+        TOKEN_USAGE_BATCH_SIZE (int): Buffered token usage rows that wake
+            the background flusher early.
+        TOKEN_USAGE_FLUSH_INTERVAL (float): Seconds between token usage
+            flushes.
+        TOKEN_USAGE_SPILL_PATH (str): Append-only file for token usage rows
+            that could not be written to the database.
+        TOKEN_USAGE_OVERFLOW_POLICY (str): Handling of usage rows when the
+            buffer is full: ``spill``, ``drop_oldest`` or ``drop_newest``.
+        PERMISSION_CACHE_SIZE (int): Maximum users whose permission sets are
+            cached.
+        PERMISSION_CACHE_TTL (int): Seconds a cached permission set is
+            trusted before it is recomputed. Without ``TOKEN_CACHE_PUBSUB``
+            this bounds how long other workers see a stale role change.
+        AUDIT_BUFFER_SIZE (int): Maximum permission audit events held in
+            memory.
+        AUDIT_BATCH_SIZE (int): Buffered audit events that trigger an early
+            bulk insert.
+        AUDIT_FLUSH_INTERVAL (float): Seconds between audit log flushes.
+        AUDIT_OVERFLOW_POLICY (str): Handling of events when the buffer is
+            full: ``spill``, ``drop_oldest`` or ``drop_newest``.
+        AUDIT_SPILL_PATH (str): Append-only file for audit events that could
+            not be written to the database.
+        LEDGER_BUFFER_SIZE (int): Ledger events held in memory before new
+            ones are spilled to disk.
+        LEDGER_BATCH_SIZE (int): Buffered ledger events that trigger an early
+            bulk insert.
+        LEDGER_FLUSH_INTERVAL (float): Seconds between ledger flushes.
+        LEDGER_SPILL_PATH (str): Append-only file for ledger events that could
+            not be buffered or written to the database.
+        LEDGER_MAX_PAGE_SIZE (int): Largest page served by the ledger query API.
+        LEDGER_EXPORT_DIR (str): Root of the Parquet export read by ledger
+            reports.
+        LEDGER_EXPORT_BATCH_ROWS (int): Ledger rows fetched and written per
+            export batch.
+        LEDGER_EXPORT_INTERVAL (float): Seconds between exports of yesterday
+            and today scheduled by Celery beat. ``0`` disables the schedule.
         QUEUE_ORDERS (bool): Enqueue orders to Celery when True.
+        BATCH_MAX_ORDERS (int): Maximum orders accepted by ``/webhook/batch``.
+        BATCH_CONCURRENCY (int): Orders of one batch placed concurrently.
+        FANOUT_EXCHANGE_CONCURRENCY (int): Follower orders in flight per
+            exchange when replicating a master signal.
+        CELERY_PERSISTENT_LOOP (bool): Keep one event loop and warm exchange
+            pool per Celery worker process instead of one loop per task.
+        CELERY_METRICS_PORT (int): Port on which the Celery worker serves
+            Prometheus task metrics; 0 disables the server.
         STATIC_API_KEY (str): API key required in header when enabled.
         REQUIRE_API_KEY (bool): Enforce API key verification when True.
+        DOCUMENT_ENCRYPTION_KEY (str): Fernet key encrypting KYC documents
+            and follower exchange credentials. Follower subscriptions can
+            only be stored when it is set, and every worker must share it.
+        MARKET_CACHE_TTL (int): Seconds before cached exchange markets are
+            refreshed in the background.
+        EXCHANGE_POOL_SIZE (int): Idle exchange clients kept per credential set.
+        EXCHANGE_POOL_MAX_TOTAL (int): Maximum open exchange clients across
+            all credential sets.
+        EXCHANGE_POOL_IDLE_TIMEOUT (int): Seconds before an idle pooled client
+            is closed.
+        EXCHANGE_POOL_MAX_LIFETIME (int): Seconds before a pooled client is
+            recycled.
+        EXCHANGE_POOL_MAX_PER_KEY (int): Maximum open exchange clients for a
+            single credential set; extra requests wait for a release.
+        EXCHANGE_POOL_ACQUIRE_TIMEOUT (float): Seconds to wait for a pooled
+            client before failing the order.
+        EXCHANGE_HTTP_LIMIT (int): Maximum simultaneous HTTP connections per
+            exchange, shared by all of its clients.
+        EXCHANGE_HTTP_LIMIT_PER_HOST (int): Maximum simultaneous connections
+            to a single exchange host.
+        EXCHANGE_DNS_CACHE_TTL (int): Seconds to cache exchange DNS lookups.
+        EXCHANGE_POOL_WARMUP (list[str]): Exchanges to pre-connect at startup
+            using the default credentials.
+        EXCHANGE_POOL_WARMUP_SIZE (int): Clients opened per warmed exchange.
+        EXCHANGE_RATE_LIMITS (dict[str, str]): Call rate per exchange shared by
+            all accounts, e.g. ``{"binance": "1200/minute"}``.
+        EXCHANGE_ACCOUNT_RATE_LIMITS (dict[str, str]): Call rate per API key
+            by exchange; unlisted exchanges use CCXT's ``rateLimit``.
+        EXCHANGE_RATE_BURST (int): Calls sent back to back before pacing.
+        EXCHANGE_RATE_MAX_WAIT (float): Seconds a call may queue for its rate
+            budget before failing with HTTP 503.
+        EXCHANGE_RATE_PENALTY (float): Seconds all calls to an exchange are
+            held after it answers with a rate limit error.
+        EXCHANGE_RATE_BACKEND (str): Rate budget storage: ``local`` (per
+            process) or ``redis`` (shared by every process).
+        EXCHANGE_RATE_CACHE_SIZE (int): Busy rate budgets kept by the local
+            backend.
     """
     WEBHOOK_SECRET: str
     DEFAULT_EXCHANGE: str
@@ -35,16 +150,76 @@ class Settings(BaseSettings):
     RATE_LIMIT: str = "10/minute"
     SIGNATURE_CACHE_TTL: int = 300
     SIGNATURE_CACHE_SIZE: int = 1000
+    REPLAY_STORE_SIZE: int = 1000000
+    REPLAY_STORE_BACKEND: str = "memory"
+    REPLAY_SHM_PATH: str = "/dev/shm/webhook-replay.bin"
     NONCE_TTL: int = 300
     TOKEN_TTL: int = 86400
     TOKEN_RATE_CACHE_SIZE: int = 1000
+    RATE_LIMIT_BACKEND: str = "local"
+    TOKEN_RATE_LIMIT: str = ""
+    USER_RATE_LIMIT: str = ""
+    ACCOUNT_RATE_LIMIT: str = ""
     REQUIRE_HTTPS: bool = False
     QUEUE_ORDERS: bool = False
+    CELERY_PERSISTENT_LOOP: bool = True
+    CELERY_METRICS_PORT: int = 0
+    BATCH_MAX_ORDERS: int = 100
+    BATCH_CONCURRENCY: int = 10
+    FANOUT_EXCHANGE_CONCURRENCY: int = 20
     STATIC_API_KEY: str = ""
     REQUIRE_API_KEY: bool = False
     TOKEN_DB_PATH: str = "tokens.db"
+    TOKEN_STORE_BACKEND: str = "sqlite"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    TOKEN_SWEEP_INTERVAL: int = 60
+    TOKEN_SWEEP_BATCH_SIZE: int = 500
+    AUTH_EXECUTOR_WORKERS: int = 8
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL: int = 300
+    TOKEN_CACHE_PUBSUB: bool = False
+    TOKEN_CACHE_CHANNEL: str = "webhook:token-cache"
+    TOKEN_USAGE_BUFFER_SIZE: int = 100000
+    TOKEN_USAGE_BATCH_SIZE: int = 500
+    TOKEN_USAGE_FLUSH_INTERVAL: float = 5.0
+    TOKEN_USAGE_SPILL_PATH: str = "token_usage.spill.jsonl"
+    TOKEN_USAGE_OVERFLOW_POLICY: str = "spill"
+    PERMISSION_CACHE_SIZE: int = 10000
+    PERMISSION_CACHE_TTL: int = 60
+    AUDIT_BUFFER_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL: float = 2.0
+    AUDIT_OVERFLOW_POLICY: str = "spill"
+    AUDIT_SPILL_PATH: str = "permission_audit.spill.jsonl"
+    LEDGER_BUFFER_SIZE: int = 100000
+    LEDGER_BATCH_SIZE: int = 1000
+    LEDGER_FLUSH_INTERVAL: float = 1.0
+    LEDGER_SPILL_PATH: str = "ledger.spill.jsonl"
+    LEDGER_MAX_PAGE_SIZE: int = 500
+    LEDGER_EXPORT_DIR: str = "ledger_export"
+    LEDGER_EXPORT_BATCH_ROWS: int = 50000
+    LEDGER_EXPORT_INTERVAL: float = 0.0
     DATABASE_URL: str = "sqlite:///identity.db"
     DOCUMENT_ENCRYPTION_KEY: str | None = None
+    MARKET_CACHE_TTL: int = 3600
+    EXCHANGE_POOL_SIZE: int = 5
+    EXCHANGE_POOL_MAX_TOTAL: int = 100
+    EXCHANGE_POOL_IDLE_TIMEOUT: int = 300
+    EXCHANGE_POOL_MAX_LIFETIME: int = 3600
+    EXCHANGE_POOL_MAX_PER_KEY: int = 5
+    EXCHANGE_POOL_ACQUIRE_TIMEOUT: float = 10.0
+    EXCHANGE_HTTP_LIMIT: int = 100
+    EXCHANGE_HTTP_LIMIT_PER_HOST: int = 20
+    EXCHANGE_DNS_CACHE_TTL: int = 300
+    EXCHANGE_POOL_WARMUP: list[str] = []
+    EXCHANGE_POOL_WARMUP_SIZE: int = 1
+    EXCHANGE_RATE_LIMITS: dict[str, str] = {}
+    EXCHANGE_ACCOUNT_RATE_LIMITS: dict[str, str] = {}
+    EXCHANGE_RATE_BURST: int = 5
+    EXCHANGE_RATE_MAX_WAIT: float = 30.0
+    EXCHANGE_RATE_PENALTY: float = 10.0
+    EXCHANGE_RATE_BACKEND: str = "local"
+    EXCHANGE_RATE_CACHE_SIZE: int = 10000
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -5,27 +5,63 @@ rate limiting and metrics middleware, and registers the API routes used by the
 webhook service.
 """
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from app.api.routes import router as webhook_router
 from app.identity.routes import router as identity_router
+from app.ledger.routes import router as ledger_router
+from app.subscription.routes import router as subscription_router
 import logging
 from app.utils import setup_logger
-from app.rate_limiter import limiter
 from app.https_middleware import HttpsMiddleware
-from slowapi import _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
-from app.dashboard.metrics import MetricsMiddleware, metrics
+from app.dashboard.metrics import MetricsMiddleware, mark_process_dead, metrics
 from app.identity.permissions import PermissionMiddleware
+from app.execution.exchange_factory import warmup_exchanges, close_exchanges
+from app.identity.auth import shutdown_auth_executor
+from app.identity.token_cache import token_cache
+from app.identity.usage_log import usage_writer
+from app.identity.audit_log import audit_writer
+from app.ledger.writer import ledger_writer
+from config.settings import settings
+from app.identity.token_store import run_sweeper
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services on startup and stop them on shutdown.
+
+    Warms the exchange pool, sweeps expired tokens and nonces, flushes
+    token usage, permission audit and trade ledger events, and listens for
+    token cache invalidations from other workers. On shutdown the worker's live gauges
+    are released in Prometheus multiprocess mode.
+    """
+    await warmup_exchanges()
+    if settings.TOKEN_CACHE_PUBSUB:
+        token_cache.start_listener()
+    sweeper = asyncio.create_task(run_sweeper())
+    usage_flusher = asyncio.create_task(usage_writer.run())
+    audit_flusher = asyncio.create_task(audit_writer.run())
+    ledger_flusher = asyncio.create_task(ledger_writer.run())
+    yield
+    sweeper.cancel()
+    usage_flusher.cancel()
+    audit_flusher.cancel()
+    ledger_flusher.cancel()
+    await usage_writer.close()
+    await audit_writer.close()
+    await ledger_writer.close()
+    token_cache.stop_listener()
+    await close_exchanges()
+    shutdown_auth_executor()
+    mark_process_dead()
+
 
 # Initialize application and configure logging
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 setup_logger()
 
-# Register rate limiter and error handling middleware
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
+# Register middleware
 app.add_middleware(MetricsMiddleware)
 app.add_middleware(PermissionMiddleware)
 app.add_middleware(HttpsMiddleware)
@@ -33,6 +69,8 @@ app.add_middleware(HttpsMiddleware)
 # Mount application routes
 app.include_router(webhook_router)
 app.include_router(identity_router)
+app.include_router(ledger_router)
+app.include_router(subscription_router)
 
 @app.get("/")
 async def health_check() -> dict:
@@ -45,10 +83,11 @@ async def health_check() -> dict:
 
 
 @app.get("/metrics")
-async def metrics_endpoint():
+async def metrics_endpoint(request: Request):
     """Expose Prometheus metrics collected by the ``MetricsMiddleware``.
 
     Returns:
-        Any: Text metrics in Prometheus format.
+        Any: Text metrics in Prometheus or, when the scraper asks for it,
+        OpenMetrics format with exemplars.
     """
-    return metrics()
+    return metrics(request.headers.get("accept"))
@@ -1,7 +1,7 @@
 """Command-line interface for issuing and revoking webhook tokens."""
 
 import argparse
-from app.identity.token_store import issue_token, revoke_token
+from app.identity.token_store import issue_token, revoke_token, sweep_expired
 
 parser = argparse.ArgumentParser(description="Manage webhook tokens")
 subparsers = parser.add_subparsers(dest="command")
@@ -12,6 +12,8 @@ issue_parser.add_argument("--ttl", type=int, help="Token TTL in seconds", defaul
 revoke_parser = subparsers.add_parser("revoke", help="Revoke an existing token")
 revoke_parser.add_argument("token", help="Token to revoke")
 
+subparsers.add_parser("sweep", help="Delete expired tokens and nonces")
+
 if __name__ == "__main__":
     args = parser.parse_args()
 
@@ -21,5 +23,7 @@ if __name__ == "__main__":
     elif args.command == "revoke":
         revoke_token(args.token)
         print("revoked")
+    elif args.command == "sweep":
+        print(f"removed {sweep_expired()}")
     else:
         parser.print_help()
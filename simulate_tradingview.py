@@ -1,15 +1,44 @@
-"""Utility script that sends a test webhook request.
+"""Simulate TradingView alerts and load test the ``/webhook`` endpoint.
 
-This module can be run directly to simulate how TradingView would call the
-``/webhook`` endpoint. The payload is intentionally simple and uses dummy API
-credentials.
+Run without ``--url`` to drive the full application in process through an
+ASGI transport. Exchange clients are replaced by ``StubExchange``, so no
+network is needed and results depend only on this host. API rate limits are
+lifted so they do not cap the measurement. Databases and spill files live in
+a temporary directory and trade ledger events are discarded, so a run never
+leaves fake orders behind. With ``--url`` the same load is
+sent over HTTP to a running server, which talks to whatever exchange it is
+configured for.
+
+Requests are authenticated with an HMAC signature (``--mode hmac``) or with
+a token and a fresh nonce in the body (``--mode token``). ``--rate`` sets an
+open-loop arrival rate; latency is then measured from each request's
+scheduled send time, so time spent queued behind ``--concurrency`` counts.
+Without ``--rate`` latency is measured from when the request is sent. Set
+``LOG_LEVEL=WARNING`` to keep per-order log lines out of the report.
+
+Usage::
+
+    python simulate_tradingview.py --once
+    python simulate_tradingview.py --requests 5000 --rate 500 --concurrency 100
+    python simulate_tradingview.py --mode token --url http://127.0.0.1:8000 --token <token>
 """
 
+import argparse
+import asyncio
+import bisect
+import hashlib
+import hmac
+import itertools
 import json
+import os
+import random
+import tempfile
 import time
-from typing import Dict
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
-import requests
+import httpx
 
 from app.utils import setup_logger
 
@@ -33,19 +62,22 @@ PAYLOAD: Dict[str, object] = {
 # Static headers for JSON payloads
 HEADERS = {"Content-Type": "application/json"}
 
+# Upper bounds, in seconds, of the latency histogram buckets
+HISTOGRAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
 
-def send_test_webhook(url: str = URL) -> requests.Response:
+def send_test_webhook(url: str = URL) -> httpx.Response:
     """Send ``PAYLOAD`` to ``url`` and return the response.
 
     Args:
         url (str): Address of the webhook endpoint.
 
     Returns:
-        requests.Response: HTTP response from the server.
+        httpx.Response: HTTP response from the server.
     """
 
     start = time.monotonic()
-    response = requests.post(url, data=json.dumps(PAYLOAD), headers=HEADERS)
+    response = httpx.post(url, content=json.dumps(PAYLOAD), headers=HEADERS)
     end = time.monotonic()
 
     logger.info("Status Code: %s", response.status_code)
@@ -55,5 +87,302 @@ def send_test_webhook(url: str = URL) -> requests.Response:
     return response
 
 
+class StubExchange:
+    """CCXT stand-in that fills market orders after a simulated delay."""
+
+    _order_ids = itertools.count(1)
+
+    def __init__(self, exchange_id: str = "binance", latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        """Create a stub exchange.
+
+        Args:
+            exchange_id: Value reported as the CCXT ``id``.
+            latency: Mean seconds each order takes to fill.
+            jitter: Maximum seconds added to or removed from ``latency``.
+            seed: Seed for the jitter so runs are repeatable.
+        """
+        self.id = exchange_id
+        self.latency = latency
+        self.jitter = jitter
+        self.markets = {}
+        self._random = random.Random(seed)
+
+    async def load_markets(self, reload: bool = False) -> dict:
+        return self.markets
+
+    async def create_market_order(self, symbol, side, amount, price=None, params=None):
+        delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        return {"id": str(next(self._order_ids)), "symbol": symbol, "side": side, "amount": amount, "status": "closed"}
+
+    async def close(self) -> None:
+        return None
+
+
+def build_request(
+    index: int,
+    mode: str,
+    run_id: str,
+    secret: Optional[str] = None,
+    token: Optional[str] = None,
+) -> Dict[str, object]:
+    """Build the body and headers of the ``index``-th webhook request.
+
+    Every body carries a nonce unique to the run, so no two requests share a
+    signature and token nonces are never replayed.
+
+    Args:
+        index: Position of the request in the run.
+        mode: ``hmac`` to sign the body with ``secret``, ``token`` to send
+            ``token`` and the nonce in the body.
+        run_id: Identifier shared by all requests of one run.
+        secret: Shared webhook secret used in ``hmac`` mode.
+        token: API token used in ``token`` mode.
+
+    Returns:
+        dict: ``content`` and ``headers`` keyword arguments for ``httpx``.
+
+    Raises:
+        ValueError: If ``mode`` is unknown or its credential is missing.
+    """
+    payload = dict(PAYLOAD, nonce=f"{run_id}-{index}")
+    headers = dict(HEADERS)
+    if mode == "token":
+        if not token:
+            raise ValueError("Token mode requires a token")
+        payload["token"] = token
+        return {"content": json.dumps(payload).encode(), "headers": headers}
+    if mode != "hmac":
+        raise ValueError(f"Unknown authentication mode '{mode}'")
+    if not secret:
+        raise ValueError("HMAC mode requires the webhook secret")
+    payload.pop("token")
+    body = json.dumps(payload).encode()
+    headers["X-Timestamp"] = str(int(time.time()))
+    headers["X-Signature"] = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return {"content": body, "headers": headers}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Return the nearest-rank ``pct`` percentile of ascending values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(len(sorted_values) * pct / 100 + 0.999999))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+@dataclass
+class LoadResult:
+    """Latencies and outcomes of one load test run."""
+
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def succeeded(self) -> int:
+        return self.statuses.get("200", 0)
+
+    @property
+    def throughput(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Return throughput and latency percentiles in seconds."""
+        values = sorted(self.latencies)
+        return {
+            "requests": self.total,
+            "succeeded": self.succeeded,
+            "throughput": self.throughput,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1] if values else 0.0,
+        }
+
+    def histogram(self) -> List[tuple]:
+        """Return ``(upper bound, count)`` pairs; the last bound is ``inf``."""
+        bounds = list(HISTOGRAM_BUCKETS) + [float("inf")]
+        counts = [0] * len(bounds)
+        for value in self.latencies:
+            counts[bisect.bisect_left(bounds, value)] += 1
+        return list(zip(bounds, counts))
+
+    def report(self) -> str:
+        """Format the summary and histogram for the terminal."""
+        s = self.summary()
+        lines = [
+            f"requests: {s['requests']}  succeeded: {s['succeeded']}  "
+            f"throughput: {s['throughput']:.1f} req/s",
+            f"latency p50: {s['p50'] * 1000:.2f} ms  p95: {s['p95'] * 1000:.2f} ms  "
+            f"p99: {s['p99'] * 1000:.2f} ms  max: {s['max'] * 1000:.2f} ms",
+            "status: " + ", ".join(f"{k}={v}" for k, v in sorted(self.statuses.items())),
+        ]
+        buckets = self.histogram()
+        widest = max((count for _, count in buckets), default=0) or 1
+        for bound, count in buckets:
+            label = "+Inf" if bound == float("inf") else f"{bound * 1000:g} ms"
+            lines.append(f"{'<= ' + label:>12} {count:7d} {'#' * round(40 * count / widest)}")
+        return "\n".join(lines)
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    total: int,
+    concurrency: int,
+    rate: Optional[float] = None,
+    mode: str = "hmac",
+    secret: Optional[str] = None,
+    token: Optional[str] = None,
+    path: str = "/webhook",
+) -> LoadResult:
+    """Send ``total`` webhook requests through ``client``.
+
+    Args:
+        client: Client whose ``base_url`` points at the service.
+        total: Number of requests to send.
+        concurrency: Maximum requests in flight.
+        rate: Requests per second to schedule; ``None`` sends as fast as
+            ``concurrency`` allows.
+        mode: ``hmac`` or ``token``; see ``build_request``.
+        secret: Shared webhook secret for ``hmac`` mode.
+        token: API token for ``token`` mode.
+        path: Endpoint to call.
+
+    Returns:
+        LoadResult: Per-request latencies and response status counts.
+    """
+    run_id = uuid.uuid4().hex[:12]
+    semaphore = asyncio.Semaphore(concurrency)
+    result = LoadResult()
+
+    async def send(index: int, start: float) -> None:
+        delay = start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with semaphore:
+            if not rate:
+                start = time.perf_counter()
+            request = build_request(index, mode, run_id, secret, token)
+            try:
+                response = await client.post(path, **request)
+                outcome = str(response.status_code)
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+        result.latencies.append(time.perf_counter() - start)
+        result.statuses[outcome] = result.statuses.get(outcome, 0) + 1
+
+    began = time.perf_counter()
+    interval = 1 / rate if rate else 0.0
+    await asyncio.gather(*(send(i, began + i * interval) for i in range(total)))
+    result.elapsed = time.perf_counter() - began
+    return result
+
+
+def stub_exchanges(latency: float = 0.0, jitter: float = 0.0, seed: int = 0) -> None:
+    """Route the in-process app's exchange calls to ``StubExchange``."""
+    import app.api.routes as routes
+    import main
+
+    async def get_exchange(exchange_id, api_key, secret):
+        return StubExchange(exchange_id, latency, jitter, seed)
+
+    async def release_exchange(exchange):
+        return None
+
+    async def load_markets(exchange):
+        return await exchange.load_markets()
+
+    async def warmup_exchanges():
+        return 0
+
+    routes.get_exchange = get_exchange
+    routes.release_exchange = release_exchange
+    routes.market_cache.load = load_markets
+    main.warmup_exchanges = warmup_exchanges
+
+
+def isolate_state(directory: str) -> None:
+    """Point the in-process app's databases and spill files at ``directory``.
+
+    Must run before the app is imported so its engines use the new paths.
+    Ledger events are dropped: load test orders are not trades and must not
+    reach ledger reports.
+    """
+    from pathlib import Path
+    from config.settings import settings
+
+    settings.DATABASE_URL = f"sqlite:///{os.path.join(directory, 'identity.db')}"
+    settings.TOKEN_DB_PATH = os.path.join(directory, "tokens.db")
+    settings.REPLAY_SHM_PATH = os.path.join(directory, "replay.bin")
+    settings.AUDIT_SPILL_PATH = os.path.join(directory, "permission_audit.spill.jsonl")
+    settings.TOKEN_USAGE_SPILL_PATH = os.path.join(directory, "token_usage.spill.jsonl")
+    settings.LEDGER_SPILL_PATH = os.path.join(directory, "ledger.spill.jsonl")
+    settings.LEDGER_EXPORT_DIR = os.path.join(directory, "ledger_export")
+
+    import main  # noqa: F401  registers every model
+    from app.db import Base, engine
+    from app.identity import token_store
+    from app.ledger.writer import ledger_writer
+
+    Base.metadata.create_all(engine)
+    token_store.set_backend(token_store.SQLiteTokenBackend(Path(settings.TOKEN_DB_PATH)))
+    ledger_writer.spill_path = Path(settings.LEDGER_SPILL_PATH)
+    ledger_writer._append = lambda rows: None
+
+
+async def main(args: argparse.Namespace) -> LoadResult:
+    from config.settings import settings
+
+    secret = args.secret or settings.WEBHOOK_SECRET
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            return await run_load(
+                client, args.requests, args.concurrency, args.rate, args.mode, secret, args.token
+            )
+
+    with tempfile.TemporaryDirectory(prefix="webhook-load-") as state_dir:
+        isolate_state(state_dir)
+        from app.identity.token_store import issue_token
+        from main import app
+
+        stub_exchanges(args.exchange_latency, args.exchange_jitter, args.seed)
+        settings.RATE_LIMIT = ""
+        settings.REQUIRE_HTTPS = False
+        token = args.token
+        if args.mode == "token" and not token:
+            token = issue_token()
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://loadtest", timeout=args.timeout
+            ) as client:
+                return await run_load(
+                    client, args.requests, args.concurrency, args.rate, args.mode, secret, token
+                )
+
+
 if __name__ == "__main__":
-    send_test_webhook()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--once", action="store_true", help=f"send one alert to {URL} and exit")
+    parser.add_argument("--url", help="base URL of a running server; default runs in process")
+    parser.add_argument("--mode", choices=("hmac", "token"), default="hmac")
+    parser.add_argument("--secret", help="webhook secret for hmac mode; default from settings")
+    parser.add_argument("--token", help="API token for token mode; issued automatically in process")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rate", type=float, help="requests per second; default unpaced")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--exchange-latency", type=float, default=0.0, help="stub order latency in seconds")
+    parser.add_argument("--exchange-jitter", type=float, default=0.0, help="stub latency jitter in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.once:
+        send_test_webhook()
+    else:
+        print(asyncio.run(main(args)).report())
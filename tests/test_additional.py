@@ -16,14 +16,24 @@ os.environ.setdefault("WEBHOOK_SECRET", "testsecret")
 os.environ.setdefault("DEFAULT_EXCHANGE", "binance")
 os.environ.setdefault("DEFAULT_API_KEY", "key")
 os.environ.setdefault("DEFAULT_API_SECRET", "secret")
-os.environ.setdefault("TOKEN_DB_PATH", "test_tokens.db")
 
+from app.identity import token_store
 from app.identity.auth import verify_signature
 from app.execution.session_pool import ExchangeSessionPool
 from app.execution.tasks import _execute_order, place_order_task
 import app.execution.exchange_factory as exchange_factory
 from ccxt.base.errors import NetworkError
 
+@pytest.fixture(autouse=True)
+def token_backend(tmp_path):
+    # Nonces and HMAC tokens go to a per-test file, not the working tree
+    backend = token_store.SQLiteTokenBackend(tmp_path / "tokens.db")
+    token_store.set_backend(backend)
+    yield backend
+    token_store.set_backend(None)
+    backend.close()
+
+
 class DummyRequest:
     def __init__(self, headers, body=b''):
         self.headers = headers
@@ -125,7 +135,12 @@ async def test_execute_order_network_error(monkeypatch):
         await _execute_order({'exchange':'binance','apiKey':'k','secret':'s','symbol':'BTC/USDT','side':'buy','amount':1})
 
 
-def test_place_order_task(monkeypatch):
+def test_place_order_task(monkeypatch, tmp_path):
+    from config.settings import settings
+    from app.ledger.writer import ledger_writer
+    monkeypatch.setattr(settings, 'CELERY_PERSISTENT_LOOP', False)
+    # The task flushes the ledger; keep events buffered by other tests out of the tree
+    monkeypatch.setattr(ledger_writer, 'spill_path', tmp_path / 'ledger.jsonl')
     run_mock = MagicMock(return_value='res')
     monkeypatch.setattr(asyncio, 'run', run_mock)
     out = place_order_task({'a':1})
@@ -155,7 +170,7 @@ async def test_api_key_invalid(monkeypatch):
     monkeypatch.setattr(routes, 'get_exchange', mock_get)
     monkeypatch.setattr(exchange_factory, 'get_exchange', mock_get)
 
-    token = __import__('app.identity.token_store', fromlist=['issue_token']).issue_token(ttl=5)
+    token = token_store.issue_token(ttl=5)
     payload = {
         'token': token,
         'nonce': 'badkey',
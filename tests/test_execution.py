@@ -0,0 +1,710 @@
+import asyncio
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+# Ensure default configuration for tests
+os.environ.setdefault("WEBHOOK_SECRET", "testsecret")
+os.environ.setdefault("DEFAULT_EXCHANGE", "binance")
+os.environ.setdefault("DEFAULT_API_KEY", "key")
+os.environ.setdefault("DEFAULT_API_SECRET", "secret")
+
+from app.execution.market_cache import MarketCache, market_cache
+from app.execution.session_pool import ExchangeSessionPool
+from config.settings import settings
+
+
+class FakeExchange:
+    """Minimal CCXT stand-in that counts market loads."""
+
+    loads = 0
+
+    def __init__(self, exchange_id="binance", markets=None):
+        self.id = exchange_id
+        self.markets = None
+        self.closed = False
+        self._markets = markets or {"BTC/USDT": {"id": "BTCUSDT"}}
+
+    async def load_markets(self, reload=False):
+        FakeExchange.loads += 1
+        await asyncio.sleep(0)
+        self.markets = self._markets
+        self.symbols = list(self._markets)
+        return self._markets
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def reset_loads():
+    FakeExchange.loads = 0
+    yield
+
+
+@pytest.mark.asyncio
+async def test_market_cache_single_flight():
+    cache = MarketCache(ttl=60)
+    clients = [FakeExchange() for _ in range(200)]
+    results = await asyncio.gather(*(cache.load(c) for c in clients))
+    assert FakeExchange.loads == 1
+    assert all(r is results[0] for r in results)
+    assert all(c.markets is results[0] for c in clients)
+    assert all(c.symbols == ["BTC/USDT"] for c in clients)
+
+
+@pytest.mark.asyncio
+async def test_market_cache_refreshes_stale_entry_in_background():
+    refreshed = {"ETH/USDT": {"id": "ETHUSDT"}}
+    refresher = FakeExchange(markets=refreshed)
+    cache = MarketCache(ttl=0, client_factory=lambda exchange_id: refresher)
+
+    first = await cache.load(FakeExchange())
+    # Stale entries are served immediately while a refresh runs
+    second = await cache.load(FakeExchange())
+    assert second is first
+    await asyncio.sleep(0.01)
+    assert refresher.closed is True
+
+    client = FakeExchange()
+    assert await cache.load(client) is refreshed
+    assert client.markets is refreshed
+
+
+@pytest.mark.asyncio
+async def test_market_cache_failed_load_is_retried():
+    class FailingExchange(FakeExchange):
+        async def load_markets(self, reload=False):
+            raise RuntimeError("down")
+
+    cache = MarketCache(ttl=60)
+    with pytest.raises(RuntimeError):
+        await cache.load(FailingExchange())
+    markets = await cache.load(FakeExchange())
+    assert "BTC/USDT" in markets
+
+
+@pytest.mark.asyncio
+async def test_market_cache_without_exchange_id():
+    class Anonymous:
+        async def load_markets(self):
+            return {"SOL/USDT": {}}
+
+    cache = MarketCache(ttl=60)
+    assert await cache.load(Anonymous()) == {"SOL/USDT": {}}
+
+
+def make_pool(monkeypatch, **kwargs):
+    """Build a pool whose clients are ``FakeExchange`` instances."""
+    pool = ExchangeSessionPool(**kwargs)
+
+    async def fake_create(exchange_id, api_key, secret):
+        exchange = FakeExchange(exchange_id)
+        exchange._pool_key = (exchange_id, api_key, secret)
+        return exchange
+
+    monkeypatch.setattr(pool, "_create_exchange", fake_create)
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_session_pool_evicts_idle_clients(monkeypatch):
+    pool = make_pool(monkeypatch, idle_timeout=0)
+    exchange = await pool.acquire("binance", "k", "s")
+    await pool.release(exchange)
+    assert exchange.closed is False
+    assert await pool.evict_idle() == 1
+    assert exchange.closed is True
+    assert pool._total == 0
+
+
+@pytest.mark.asyncio
+async def test_session_pool_recycles_after_max_lifetime(monkeypatch):
+    pool = make_pool(monkeypatch, max_lifetime=0)
+    exchange = await pool.acquire("binance", "k", "s")
+    await pool.release(exchange)
+    assert exchange.closed is True
+    assert await pool.acquire("binance", "k", "s") is not exchange
+
+
+@pytest.mark.asyncio
+async def test_session_pool_global_cap_evicts_least_recent(monkeypatch):
+    pool = make_pool(monkeypatch, max_total=2)
+    first = await pool.acquire("binance", "a", "s")
+    second = await pool.acquire("binance", "b", "s")
+    await pool.release(first)
+    await pool.release(second)
+
+    third = await pool.acquire("binance", "c", "s")
+    assert first.closed is True
+    assert second.closed is False
+    assert pool._total == 2
+    await pool.release(third)
+
+
+@pytest.mark.asyncio
+async def test_session_pool_global_cap_waits_for_release(monkeypatch):
+    pool = make_pool(monkeypatch, max_total=1)
+    busy = await pool.acquire("binance", "a", "s")
+    waiter = asyncio.ensure_future(pool.acquire("binance", "b", "s"))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    await pool.release(busy)
+    other = await asyncio.wait_for(waiter, 1)
+    assert busy.closed is True
+    assert other._pool_key == ("binance", "b", "s")
+
+
+@pytest.mark.asyncio
+async def test_session_pool_warmup_and_close(monkeypatch):
+    pool = make_pool(monkeypatch, maxsize=3)
+    try:
+        warmed = await pool.warmup([("warmtest", "k", "s")], size=2)
+        assert warmed == 2
+        assert FakeExchange.loads == 1
+        idle = list(pool._pools[("warmtest", "k", "s")])
+        assert len(idle) == 2
+        assert all(c.markets is not None for c in idle)
+
+        await pool.close()
+        assert all(c.closed for c in idle)
+        assert pool._total == 0
+    finally:
+        market_cache.invalidate("warmtest")
+
+
+@pytest.mark.asyncio
+async def test_session_pool_warmup_respects_per_key_limit(monkeypatch):
+    pool = make_pool(monkeypatch, maxsize=3, max_per_key=1, acquire_timeout=1)
+    try:
+        warmed = await asyncio.wait_for(pool.warmup([("warmtest", "k", "s")], size=3), 2)
+        assert warmed == 1
+        assert len(pool._pools[("warmtest", "k", "s")]) == 1
+    finally:
+        await pool.close()
+        market_cache.invalidate("warmtest")
+
+
+@pytest.mark.asyncio
+async def test_session_pool_per_key_limit_queues_waiters(monkeypatch):
+    pool = make_pool(monkeypatch, max_per_key=1)
+    first = await pool.acquire("binance", "k", "s")
+    waiter = asyncio.ensure_future(pool.acquire("binance", "k", "s"))
+    await asyncio.sleep(0)
+    assert pool.stats()["binance"]["waiters"] == 1
+    assert pool.stats()["binance"]["in_use"] == 1
+
+    await pool.release(first)
+    assert await asyncio.wait_for(waiter, 1) is first
+    stats = pool.stats()["binance"]
+    assert stats == {"in_use": 1, "idle": 0, "waiters": 0, "created": 1, "destroyed": 0}
+
+
+@pytest.mark.asyncio
+async def test_session_pool_acquire_timeout(monkeypatch):
+    from app.execution.session_pool import PoolTimeoutError
+
+    pool = make_pool(monkeypatch, max_per_key=1, acquire_timeout=0.01)
+    await pool.acquire("binance", "k", "s")
+    with pytest.raises(PoolTimeoutError):
+        await pool.acquire("binance", "k", "s")
+    assert pool.stats()["binance"]["waiters"] == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_exported_as_metrics(monkeypatch):
+    from prometheus_client import REGISTRY
+
+    def sample(name):
+        return REGISTRY.get_sample_value(name, {"exchange": "kucoin"}) or 0.0
+
+    names = (
+        "exchange_pool_in_use",
+        "exchange_pool_idle",
+        "exchange_pool_clients_created_total",
+        "exchange_pool_clients_destroyed_total",
+    )
+    before = {name: sample(name) for name in names}
+    pool = make_pool(monkeypatch, maxsize=1)
+    first = await pool.acquire("kucoin", "k", "s")
+    second = await pool.acquire("kucoin", "k", "s")
+    assert sample("exchange_pool_in_use") - before["exchange_pool_in_use"] == 2
+    await pool.release(first)
+    await pool.release(second)
+
+    # The gauges follow the pool as clients move, not just at scrape time
+    delta = {name: sample(name) - before[name] for name in names}
+    assert delta == {
+        "exchange_pool_in_use": 0,
+        "exchange_pool_idle": 1,
+        "exchange_pool_clients_created_total": 2,
+        "exchange_pool_clients_destroyed_total": 1,
+    }
+    assert pool.stats()["kucoin"]["idle"] == 1
+    await pool.close()
+    assert sample("exchange_pool_idle") == before["exchange_pool_idle"]
+
+
+@pytest.mark.asyncio
+async def test_shared_session_per_exchange():
+    from app.execution.http_session import SharedSessionRegistry
+
+    registry = SharedSessionRegistry(limit=10, limit_per_host=3, dns_cache_ttl=60)
+    try:
+        session = registry.get("binance")
+        assert registry.get("binance") is session
+        assert registry.get("kraken") is not session
+        assert session.connector.limit_per_host == 3
+        assert session.connector.limit == 10
+    finally:
+        await registry.close()
+    assert session.closed
+    assert registry.get("binance") is not session
+    await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_pooled_clients_share_http_session():
+    from app.execution.http_session import shared_sessions
+
+    pool = ExchangeSessionPool(maxsize=1)
+    first = await pool.acquire("binance", "a", "s")
+    second = await pool.acquire("binance", "b", "s")
+    try:
+        assert first.session is second.session
+        assert first.session is shared_sessions.get("binance")
+        assert first.own_session is False
+        shared = first.session
+        await pool.release(first)
+        await pool.release(second)  # pool full -> client closed
+        assert not shared.closed
+    finally:
+        await pool.close()
+        await shared_sessions.close()
+
+
+def test_celery_worker_reuses_event_loop(monkeypatch):
+    import app.execution.tasks as tasks
+
+    calls = []
+
+    async def fake_warmup():
+        calls.append("warmup")
+        return 0
+
+    async def fake_close():
+        calls.append("close")
+
+    async def fake_execute(payload, correlation_id=None):
+        return id(asyncio.get_running_loop())
+
+    monkeypatch.setattr(tasks, "warmup_exchanges", fake_warmup)
+    monkeypatch.setattr(tasks, "close_exchanges", fake_close)
+    monkeypatch.setattr(tasks, "_execute_order", fake_execute)
+
+    tasks.start_worker_loop()
+    try:
+        first = tasks.place_order_task({})
+        second = tasks.place_order_task({})
+        assert first == second == id(tasks._worker_loop)
+    finally:
+        tasks.stop_worker_loop()
+    assert calls == ["warmup", "close"]
+    assert tasks._worker_loop is None
+
+
+def test_celery_task_loop_lifecycle_without_process_init(monkeypatch):
+    import app.execution.tasks as tasks
+
+    calls = []
+
+    async def fake_warmup():
+        calls.append("warmup")
+        return 0
+
+    async def fake_close():
+        calls.append("close")
+
+    async def fake_execute(payload, correlation_id=None):
+        return id(asyncio.get_running_loop())
+
+    monkeypatch.setattr(tasks, "warmup_exchanges", fake_warmup)
+    monkeypatch.setattr(tasks, "close_exchanges", fake_close)
+    monkeypatch.setattr(tasks, "_execute_order", fake_execute)
+
+    # Solo pools never fire worker_process_init: the loop starts on first use
+    try:
+        assert tasks.place_order_task({}) == tasks.place_order_task({}) == id(tasks._worker_loop)
+    finally:
+        tasks.stop_worker_loop()
+    assert calls == ["warmup", "close"]
+
+    # Per-task loops close their pooled clients before the loop goes away
+    calls.clear()
+    monkeypatch.setattr(settings, "CELERY_PERSISTENT_LOOP", False)
+    tasks.place_order_task({})
+    assert calls == ["close"]
+    assert tasks._worker_loop is None
+
+
+def test_celery_threads_share_the_worker_loop(monkeypatch):
+    import threading
+    import app.execution.tasks as tasks
+
+    async def fake_warmup():
+        return 0
+
+    async def fake_close():
+        pass
+
+    async def fake_execute(payload, correlation_id=None):
+        await asyncio.sleep(0.05)
+        return id(asyncio.get_running_loop())
+
+    monkeypatch.setattr(tasks, "warmup_exchanges", fake_warmup)
+    monkeypatch.setattr(tasks, "close_exchanges", fake_close)
+    monkeypatch.setattr(tasks, "_execute_order", fake_execute)
+
+    # A threads pool runs tasks at once; each submits to the one loop thread
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(tasks.place_order_task({}))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert results == [id(tasks._worker_loop)] * 4
+    finally:
+        tasks.stop_worker_loop()
+
+
+def test_pool_and_fanout_serve_successive_event_loops(monkeypatch):
+    from app.execution.fanout import FanoutEngine
+
+    pool = make_pool(monkeypatch, max_per_key=1)
+    engine = FanoutEngine(resolver=lambda master_id: [], per_exchange_limit=1)
+
+    async def contend():
+        first = await pool.acquire("binance", "k", "s")
+        waiter = asyncio.ensure_future(pool.acquire("binance", "k", "s"))
+        await asyncio.sleep(0)
+        await pool.release(first)
+        await pool.release(await asyncio.wait_for(waiter, 1))
+        await pool.close()
+
+        semaphore = engine._semaphore("binance")
+        async with semaphore:
+            blocked = asyncio.ensure_future(semaphore.acquire())
+            await asyncio.sleep(0)
+        await asyncio.wait_for(blocked, 1)
+        semaphore.release()
+
+    # Per-task loops, as with CELERY_PERSISTENT_LOOP disabled
+    asyncio.run(contend())
+    asyncio.run(contend())
+
+
+@pytest.mark.asyncio
+async def test_fanout_scales_and_tracks_followers(monkeypatch):
+    import app.execution.fanout as fanout
+    from app.subscription.registry import FollowerAccount
+
+    followers = {
+        "m1": [
+            FollowerAccount(follower_id="a", exchange="binance", apiKey="ka", secret="s", multiplier=2),
+            FollowerAccount(follower_id="b", exchange="binance", apiKey="kb", secret="s", max_amount=0.5),
+            FollowerAccount(follower_id="c", exchange="kraken", apiKey="kc", secret="s"),
+        ]
+    }
+
+    async def resolve(master_id):
+        return followers.get(master_id, [])
+
+    in_flight = {"binance": 0}
+    peak = {"binance": 0}
+
+    class Client(FakeExchange):
+        def __init__(self, exchange_id, api_key):
+            super().__init__("fanouttest")
+            self.exchange_id = exchange_id
+            self.api_key = api_key
+
+        async def create_market_order(self, symbol, side, amount):
+            if self.api_key == "kc":
+                raise RuntimeError("rejected")
+            in_flight[self.exchange_id] += 1
+            peak[self.exchange_id] = max(peak[self.exchange_id], in_flight[self.exchange_id])
+            await asyncio.sleep(0.01)
+            in_flight[self.exchange_id] -= 1
+            return {"symbol": symbol, "amount": amount}
+
+    async def fake_get(exchange_id, api_key, secret):
+        return Client(exchange_id, api_key)
+
+    async def fake_release(exchange):
+        pass
+
+    monkeypatch.setattr(fanout, "get_exchange", fake_get)
+    monkeypatch.setattr(fanout, "release_exchange", fake_release)
+
+    engine = fanout.FanoutEngine(resolver=resolve, per_exchange_limit=1)
+    try:
+        summary = await engine.replicate("m1", {"symbol": "BTC/USDT", "side": "buy", "amount": 1.0})
+    finally:
+        market_cache.invalidate("fanouttest")
+
+    assert summary["status"] == "partial"
+    assert (summary["followers"], summary["succeeded"], summary["failed"]) == (3, 2, 1)
+    by_id = {r["follower_id"]: r for r in summary["results"]}
+    assert by_id["a"]["order"]["amount"] == 2.0
+    assert by_id["b"]["order"]["amount"] == 0.5
+    assert by_id["c"]["status"] == "error"
+    assert "rejected" in by_id["c"]["detail"]
+    assert peak["binance"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fanout_without_followers():
+    from app.execution.fanout import FanoutEngine
+
+    async def no_followers(master_id):
+        return []
+
+    summary = await FanoutEngine(resolver=no_followers).replicate("m2", {"symbol": "BTC/USDT", "side": "buy", "amount": 1})
+    assert summary["followers"] == 0
+    assert summary["status"] == "no_followers"
+
+
+class PacedClient:
+    """Exchange stub that records when orders are sent."""
+
+    id = "binance"
+    apiKey = "key"
+    rateLimit = 50
+
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    async def create_market_order(self, symbol, side, amount):
+        self.sent.append(amount)
+        if self.error:
+            raise self.error
+        return {"symbol": symbol, "amount": amount}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_paces_calls_after_burst(monkeypatch):
+    from app.execution import scheduler as sched
+
+    clock = {"now": 1000.0}
+    delays = []
+
+    async def fake_sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(sched.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(sched.asyncio, "sleep", fake_sleep)
+
+    scheduler = sched.ExchangeRateScheduler({"binance": "10/second"}, {}, burst=2, max_wait=1)
+    client = PacedClient()
+    waited = [await scheduler.acquire(client) for _ in range(4)]
+
+    # Two calls pass, then each waits one more interval of the exchange
+    # budget (100ms), which is tighter than the account's 50ms rateLimit
+    assert waited[:2] == [0.0, 0.0]
+    assert waited[2] == pytest.approx(0.1)
+    assert waited[3] == pytest.approx(0.2)
+    assert delays == waited[2:]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_rejects_when_queue_exceeds_max_wait(monkeypatch):
+    from fastapi import HTTPException
+    from app.execution import scheduler as sched
+
+    async def fake_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(sched.time, "monotonic", lambda: 1000.0)
+    monkeypatch.setattr(sched.asyncio, "sleep", fake_sleep)
+    scheduler = sched.ExchangeRateScheduler({"binance": "1/second"}, {}, burst=1, max_wait=1.5)
+    client = PacedClient()
+    assert await scheduler.acquire(client) == 0.0
+    assert await scheduler.acquire(client) == pytest.approx(1.0)
+    with pytest.raises(HTTPException) as exc:
+        await scheduler.acquire(client)
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "3"
+
+
+@pytest.mark.asyncio
+async def test_scheduler_pauses_budget_on_exchange_rate_limit(monkeypatch):
+    from ccxt.base.errors import RateLimitExceeded
+    from fastapi import HTTPException
+    from app.execution import scheduler as sched
+
+    monkeypatch.setattr(sched.time, "monotonic", lambda: 1000.0)
+    scheduler = sched.ExchangeRateScheduler({}, {"binance": "100/second"}, burst=5, max_wait=5)
+    failing = PacedClient(error=RateLimitExceeded("429"))
+    with pytest.raises(RateLimitExceeded):
+        await scheduler.submit(failing, "create_market_order", symbol="BTC/USDT", side="buy", amount=1)
+
+    # The penalty applies to every caller sharing the account
+    with pytest.raises(HTTPException) as exc:
+        await scheduler.submit(PacedClient(), "create_market_order", symbol="BTC/USDT", side="buy", amount=1)
+    assert exc.value.status_code == 503
+    assert failing.sent == [1]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_budgets_are_shared_through_backend_and_evicted(monkeypatch):
+    from app.execution import scheduler as sched
+
+    clock = {"now": 1000.0}
+
+    async def fake_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(sched.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(sched.asyncio, "sleep", fake_sleep)
+    backend = sched.LocalBudgetBackend(maxsize=2)
+    # Two workers pointed at one backend pace against a single budget
+    first, second = (
+        sched.ExchangeRateScheduler({"binance": "10/second"}, {}, burst=1, max_wait=1, backend=backend)
+        for _ in range(2)
+    )
+    assert await first.acquire(PacedClient()) == 0.0
+    assert await second.acquire(PacedClient()) == pytest.approx(0.1)
+    assert len(backend) == 2
+
+    # Budgets are dropped once idle, and never exceed maxsize
+    clock["now"] += 1
+    assert len(backend) == 0
+    per_key = sched.ExchangeRateScheduler({}, {}, burst=1, max_wait=1, backend=backend)
+    for key in range(5):
+        client = PacedClient()
+        client.apiKey = f"key-{key}"
+        assert await per_key.acquire(client) == 0.0
+    assert len(backend) == 2
+
+
+def test_celery_task_metrics():
+    import time
+    from types import SimpleNamespace
+    from celery.signals import task_postrun, task_prerun
+    from prometheus_client import REGISTRY
+    from app.execution import tasks
+
+    def sample(name, **labels):
+        labels = {"task": "place_order", "exchange": "kraken", **labels}
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def run(task_id, state, headers):
+        task = SimpleNamespace(name="place_order", request=SimpleNamespace(**headers))
+        args = ({"exchange": "Kraken", "symbol": "BTC/USDT"},)
+        task_prerun.send(sender=task.name, task_id=task_id, task=task, args=args, kwargs={})
+        task_postrun.send(sender=task.name, task_id=task_id, task=task, args=args, kwargs={}, state=state)
+
+    before = (
+        sample("celery_tasks_total", outcome="success"),
+        sample("celery_tasks_total", outcome="failure"),
+        sample("celery_task_duration_seconds_count"),
+        sample("celery_task_queue_wait_seconds_sum"),
+    )
+    run("t1", "SUCCESS", {tasks.ENQUEUED_AT_HEADER: time.time() - 2})
+    run("t2", "FAILURE", {"headers": {tasks.ENQUEUED_AT_HEADER: str(time.time())}})
+
+    assert sample("celery_tasks_total", outcome="success") == before[0] + 1
+    assert sample("celery_tasks_total", outcome="failure") == before[1] + 1
+    assert sample("celery_task_duration_seconds_count") == before[2] + 2
+    assert sample("celery_task_queue_wait_seconds_sum") - before[3] >= 2
+    assert tasks._task_started == {}
+
+
+def test_publish_stamps_enqueue_time():
+    from app.execution.tasks import ENQUEUED_AT_HEADER, stamp_enqueue_time
+
+    headers = {}
+    stamp_enqueue_time(headers=headers)
+    assert isinstance(headers[ENQUEUED_AT_HEADER], float)
+
+
+def test_multiprocess_metrics_aggregate_workers(tmp_path):
+    import subprocess
+
+    root = os.path.dirname(os.path.dirname(__file__))
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), PYTHONPATH=root)
+    observe = (
+        "from app.dashboard.metrics import REQUESTS_TOTAL;"
+        "REQUESTS_TOTAL.labels('POST', '/webhook', '200').inc()"
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", observe], env=env, cwd=root, check=True)
+    scrape = (
+        "from app.dashboard.metrics import scrape_registry;"
+        "print(scrape_registry().get_sample_value("
+        "'http_requests_total', {'method': 'POST', 'path': '/webhook', 'status': '200'}))"
+    )
+    out = subprocess.run([sys.executable, "-c", scrape], env=env, cwd=root, check=True, capture_output=True, text=True)
+    assert out.stdout.strip().splitlines()[-1] == "2.0"
+
+
+def test_multiprocess_metrics_include_pool_gauges(tmp_path):
+    import subprocess
+
+    root = os.path.dirname(os.path.dirname(__file__))
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), PYTHONPATH=root)
+    worker = (
+        "import asyncio, os\n"
+        "from app.execution.session_pool import ExchangeSessionPool\n"
+        "class Client:\n"
+        "    async def close(self): pass\n"
+        "async def create(exchange_id, api_key, secret):\n"
+        "    client = Client()\n"
+        "    client._pool_key = (exchange_id, api_key, secret)\n"
+        "    return client\n"
+        "async def main():\n"
+        "    pool = ExchangeSessionPool(maxsize=1)\n"
+        "    pool._create_exchange = create\n"
+        "    first = await pool.acquire('binance', 'k', 's')\n"
+        "    await pool.acquire('binance', 'k', 's')\n"
+        "    await pool.release(first)\n"
+        "asyncio.run(main())\n"
+        "print(os.getpid())\n"
+    )
+    pids = [
+        subprocess.run(
+            [sys.executable, "-c", worker], env=env, cwd=root, check=True, capture_output=True, text=True
+        ).stdout.split()[-1]
+        for _ in range(2)
+    ]
+    scrape = (
+        "import sys\n"
+        "from app.dashboard.metrics import mark_process_dead, scrape_registry\n"
+        "for pid in sys.argv[1:]: mark_process_dead(int(pid))\n"
+        "registry = scrape_registry()\n"
+        "for name in ('exchange_pool_in_use', 'exchange_pool_idle', 'exchange_pool_clients_created_total'):\n"
+        "    print(registry.get_sample_value(name, {'exchange': 'binance'}))\n"
+    )
+
+    def values(*dead):
+        out = subprocess.run(
+            [sys.executable, "-c", scrape, *dead], env=env, cwd=root, check=True, capture_output=True, text=True
+        )
+        return out.stdout.split()[-3:]
+
+    # Every worker's share is summed; a dead worker's live gauges are dropped
+    assert values() == ["2.0", "2.0", "4.0"]
+    assert values(pids[0]) == ["1.0", "1.0", "4.0"]
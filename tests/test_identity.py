@@ -1,9 +1,8 @@
+import asyncio
 import os
 import sys
 import pytest
 from httpx import AsyncClient, ASGITransport
-os.environ.setdefault("TOKEN_DB_PATH", "test_tokens.db")
-from app.identity.auth import verify_token
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
@@ -16,6 +15,8 @@ os.environ["DATABASE_URL"] = "sqlite:///test_identity.db"
 
 from main import app
 from app.db import Base, engine, SessionLocal
+from app.identity import token_store
+from app.identity.auth import verify_token
 from app.identity.models import (
     Permission,
     Role,
@@ -23,7 +24,10 @@ from app.identity.models import (
     UserRole,
     KycVerification,
     PermissionAuditLog,
+    ApiToken,
+    TokenUsageLog,
 )
+from app.identity.usage_log import TokenUsageWriter, usage_writer
 
 if os.path.exists("test_identity.db"):
     os.remove("test_identity.db")
@@ -38,6 +42,16 @@ def clean_db():
     Base.metadata.drop_all(engine)
 
 
+@pytest.fixture(autouse=True)
+def token_backend(tmp_path):
+    # Nonces and HMAC tokens go to a per-test file, not the working tree
+    backend = token_store.SQLiteTokenBackend(tmp_path / "tokens.db")
+    token_store.set_backend(backend)
+    yield backend
+    token_store.set_backend(None)
+    backend.close()
+
+
 transport = ASGITransport(app=app)
 
 
@@ -113,12 +127,24 @@ async def test_profile_crud_and_delete(tmp_path):
         assert resp.status_code == 200
         assert "profile_picture_url" in resp.json()
 
+        # an API token that is already cached by verify_token
+        resp = await client.post(
+            "/api/v1/identity/tokens",
+            json={"token_name": "t1", "token_type": "personal"},
+            headers=headers,
+        )
+        api_token = resp.json()["token"]
+        assert verify_token(api_token, "del1") is True
+
         # delete account
         resp = await client.delete("/api/v1/identity/account", headers=headers)
         assert resp.status_code == 200
         # access after deletion should fail
         resp = await client.get("/api/v1/identity/profile", headers=headers)
         assert resp.status_code == 401
+        assert verify_token(api_token, "del2") is False
+        # Buffered usage of the deleted token is dropped, not left to fail a flush
+        assert usage_writer.pending() == 0
 
 
 @pytest.mark.asyncio
@@ -145,6 +171,14 @@ async def test_token_endpoints(tmp_path):
         token_id = resp.json()["id"]
 
         assert verify_token(api_token, "n1") is True
+        # Usage is buffered until the writer flushes
+        with SessionLocal() as db:
+            assert db.query(TokenUsageLog).count() == 0
+        assert verify_token(api_token, "n1b") is True
+        assert usage_writer.flush() == 2
+        with SessionLocal() as db:
+            assert db.query(TokenUsageLog).filter_by(token_id=token_id).count() == 2
+            assert db.get(ApiToken, token_id).last_used_at is not None
 
         resp = await client.get("/api/v1/identity/tokens", headers=headers)
         assert resp.status_code == 200
@@ -164,6 +198,94 @@ async def test_token_endpoints(tmp_path):
 
         resp = await client.get("/api/v1/identity/tokens", headers=headers)
         assert resp.json()[0]["is_revoked"] is True
+        # Revocation evicts the cached record
+        assert verify_token(api_token, "n2") is False
+
+
+@pytest.mark.asyncio
+async def test_revocation_during_token_load_is_not_cached(monkeypatch):
+    import app.identity.auth as auth
+    from app.identity.token_cache import token_cache
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.post("/api/v1/identity/register", json={"email": "r@example.com", "password": "pass"})
+        login = await client.post("/api/v1/identity/login", json={"email": "r@example.com", "password": "pass"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        resp = await client.post(
+            "/api/v1/identity/tokens", json={"token_name": "t1", "token_type": "personal"}, headers=headers
+        )
+        api_token, token_id = resp.json()["token"], resp.json()["id"]
+
+    load = auth._load_token_record
+
+    def load_then_revoke(token_hash):
+        # The revocation commits and evicts after this worker read the row
+        record = load(token_hash)
+        with SessionLocal() as db:
+            db.get(ApiToken, token_id).is_revoked = True
+            db.commit()
+        token_cache.invalidate_token(token_id)
+        return record
+
+    token_cache.clear()
+    monkeypatch.setattr(auth, "_load_token_record", load_then_revoke)
+    assert verify_token(api_token, "race1") is True
+    monkeypatch.setattr(auth, "_load_token_record", load)
+    assert token_cache.get(auth.hash_token(api_token)) is None
+    assert verify_token(api_token, "race2") is False
+
+
+@pytest.mark.asyncio
+async def test_usage_writer_wakes_flusher_and_spills(tmp_path, monkeypatch):
+    spill = tmp_path / "usage.jsonl"
+    writer = TokenUsageWriter(batch_size=2, flush_interval=60, spill_path=str(spill))
+    flusher = asyncio.create_task(writer.run())
+    try:
+        await asyncio.sleep(0)
+        # A full batch recorded on the auth pool wakes the flusher instead of flushing inline
+        await asyncio.to_thread(writer.record, "t1", "u1")
+        await asyncio.to_thread(writer.record, "t1", "u1")
+        for _ in range(100):
+            if writer.pending() == 0:
+                break
+            await asyncio.sleep(0.01)
+        with SessionLocal() as db:
+            assert db.query(TokenUsageLog).count() == 2
+    finally:
+        flusher.cancel()
+
+    def unavailable(rows):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(writer, "_insert", unavailable)
+    writer.record("t1", "u1")
+    assert writer.flush() == 0
+    assert len(spill.read_text().splitlines()) == 1
+
+    monkeypatch.undo()
+    writer.record("t1", "u1")
+    assert writer.flush() == 2
+    assert not spill.exists()
+    with SessionLocal() as db:
+        assert db.query(TokenUsageLog).count() == 4
+
+
+def test_usage_writer_bounds_its_buffer(tmp_path):
+    spill = tmp_path / "usage.jsonl"
+    writer = TokenUsageWriter(max_buffer=2, overflow_policy="spill", spill_path=str(spill))
+    for _ in range(3):
+        writer.record("t1", "u1")
+    assert writer.pending() == 2
+    assert len(spill.read_text().splitlines()) == 1
+    assert writer.flush() == 3
+    assert not spill.exists()
+
+    newest = TokenUsageWriter(max_buffer=2, overflow_policy="drop_newest", spill_path=str(spill))
+    for user_agent in ("a", "b", "c"):
+        newest.record("t1", "u1", user_agent=user_agent)
+    assert newest.dropped == 1 and [row["user_agent"] for row in newest._rows] == ["a", "b"]
+    with pytest.raises(ValueError):
+        TokenUsageWriter(overflow_policy="block")
 
 
 @pytest.mark.asyncio
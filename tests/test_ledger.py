@@ -0,0 +1,298 @@
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+os.environ.setdefault("WEBHOOK_SECRET", "testsecret")
+os.environ.setdefault("DEFAULT_EXCHANGE", "binance")
+os.environ.setdefault("DEFAULT_API_KEY", "key")
+os.environ.setdefault("DEFAULT_API_SECRET", "secret")
+os.environ["DATABASE_URL"] = "sqlite:///test_ledger.db"
+
+from main import app
+from config.settings import settings
+from ccxt.base.errors import ExchangeError
+from app.db import Base, engine, SessionLocal
+from app.identity.models import Permission, Role, RolePermission, UserRole
+from app.identity.permissions import permission_cache
+from app.ledger.analytics import fill_stats, pnl, slippage
+from app.ledger.export import export_day, load_trades
+from app.ledger.models import LedgerEntry
+from app.ledger.query import entry_to_dict, query_entries
+from app.ledger.writer import LedgerOrder, LedgerWriter, account_id
+
+transport = ASGITransport(app=app)
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def writer(tmp_path):
+    return LedgerWriter(spill_path=str(tmp_path / "ledger.jsonl"))
+
+
+def _order(correlation_id="c1", symbol="BTC/USDT", api_key="key-1"):
+    return LedgerOrder.create(correlation_id, "webhook", "Binance", api_key, symbol, "buy", 0.5, 30000)
+
+
+@pytest.mark.asyncio
+async def test_ledger_records_signal_order_response_and_fill(writer):
+    writer.record_signal(
+        "c1", "webhook", {"exchange": "binance", "apiKey": "key-1", "secret": "s", "token": "t", "symbol": "BTC/USDT", "side": "buy", "amount": 0.5}
+    )
+
+    async def filled():
+        return {"id": 42, "status": "closed", "filled": 0.5, "average": 30010.0, "cost": 15005.0, "fee": {"cost": 15.0, "currency": "USDT"}}
+
+    async def rejected():
+        raise ExchangeError("insufficient balance")
+
+    assert (await writer.track(_order(), filled()))["id"] == 42
+    with pytest.raises(ExchangeError):
+        await writer.track(_order(), rejected())
+
+    # Nothing reaches the database until the writer flushes
+    with SessionLocal() as db:
+        assert db.query(LedgerEntry).count() == 0
+    assert writer.pending() == 6
+    assert writer.flush() == 6
+
+    with SessionLocal() as db:
+        entries = db.query(LedgerEntry).order_by(LedgerEntry.id).all()
+    assert [e.kind for e in entries] == ["signal", "order_request", "order_response", "fill", "order_request", "order_error"]
+    assert {e.account for e in entries} == {account_id("binance", "key-1")}
+    signal, _, response, fill, _, error = entries
+    assert signal.detail == {"exchange": "binance", "symbol": "BTC/USDT", "side": "buy", "amount": 0.5}
+    assert response.order_ref == fill.order_ref
+    assert (fill.order_id, fill.filled, fill.average, fill.fee, fill.fee_currency) == ("42", 0.5, 30010.0, 15.0, "USDT")
+    assert error.detail["error"] == "ExchangeError"
+    assert "key-1" not in str([e.detail for e in entries])
+
+
+@pytest.mark.asyncio
+async def test_queued_order_shares_the_signal_correlation_id(writer, monkeypatch):
+    import hashlib
+    import hmac
+    import json
+    import time
+    from unittest.mock import MagicMock
+    import app.api.routes as routes
+    import app.execution.tasks as tasks
+
+    class DummyExchange:
+        async def load_markets(self):
+            return {}
+
+        async def create_market_order(self, symbol, side, amount):
+            return {"id": "q1", "status": "open"}
+
+    async def get_exchange(*args):
+        return DummyExchange()
+
+    async def release_exchange(exchange):
+        pass
+
+    task = MagicMock()
+    monkeypatch.setattr(settings, "QUEUE_ORDERS", True)
+    monkeypatch.setattr(routes, "place_order_task", task)
+    monkeypatch.setattr(routes, "ledger_writer", writer)
+    monkeypatch.setattr(tasks, "ledger_writer", writer)
+    monkeypatch.setattr(tasks, "get_exchange", get_exchange)
+    monkeypatch.setattr(tasks, "release_exchange", release_exchange)
+
+    body = json.dumps(
+        {"exchange": "binance", "apiKey": "key-1", "secret": "s", "symbol": "BTC/USDT", "side": "buy", "amount": 0.5, "price": 30000}
+    ).encode()
+    headers = {
+        "X-Signature": hmac.new(settings.WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest(),
+        "X-Timestamp": str(int(time.time())),
+        "Content-Type": "application/json",
+    }
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.post("/webhook", content=body, headers=headers)).json() == {"status": "queued"}
+
+    # The worker runs the enqueued call
+    await tasks._execute_order(*task.delay.call_args.args)
+    writer.flush()
+    with SessionLocal() as db:
+        entries = db.query(LedgerEntry).order_by(LedgerEntry.id).all()
+    assert [e.kind for e in entries] == ["signal", "order_request", "order_response"]
+    assert len({e.correlation_id for e in entries}) == 1
+
+
+def test_ledger_spills_when_buffer_full_and_replays(tmp_path):
+    writer = LedgerWriter(max_buffer=2, spill_path=str(tmp_path / "ledger.jsonl"))
+    for _ in range(3):
+        writer.record_request(_order())
+    assert writer.pending() == 2
+    assert writer.spill_path.exists()
+
+    assert writer.flush() == 3
+    assert not writer.spill_path.exists()
+    with SessionLocal() as db:
+        assert db.query(LedgerEntry).count() == 3
+
+
+def test_ledger_query_pages_by_cursor(writer):
+    base = datetime(2024, 1, 1)
+    rows = []
+    for i in range(25):
+        order = _order(f"c{i}", symbol="ETH/USDT" if i % 5 == 0 else "BTC/USDT")
+        # Pairs of entries share a timestamp so the id breaks ties
+        rows.append(order.row("order_request", created_at=base + timedelta(seconds=i // 2)))
+    writer._insert(rows)
+
+    with SessionLocal() as db:
+        seen, cursor = [], None
+        while True:
+            page, cursor = query_entries(db, account=account_id("binance", "key-1"), limit=10, cursor=cursor)
+            seen.extend((e.created_at, e.id) for e in page)
+            if cursor is None:
+                break
+        assert len(seen) == 25 == len(set(seen))
+        assert seen == sorted(seen, reverse=True)
+
+        eth, _ = query_entries(db, symbol="ETH/USDT", since=base + timedelta(seconds=3))
+        assert [e.correlation_id for e in eth] == ["c20", "c15", "c10"]
+        # Aware bounds in any zone compare against the stored UTC timestamps
+        plus_two = timezone(timedelta(hours=2))
+        since = (base + timedelta(seconds=3)).replace(tzinfo=timezone.utc).astimezone(plus_two)
+        assert query_entries(db, symbol="ETH/USDT", since=since)[0] == eth
+        assert entry_to_dict(eth[0])["created_at"].endswith("+00:00")
+
+        with pytest.raises(ValueError):
+            query_entries(db, cursor="not-a-cursor")
+
+    assert _order().row("signal")["created_at"].tzinfo is timezone.utc
+
+
+def _fill(order, filled, average, created_at, fee=0.0):
+    return order.row(
+        "fill", filled=filled, average=average, cost=filled * average, fee=fee, fee_currency="USDT", created_at=created_at
+    )
+
+
+def test_ledger_export_partitions_and_analytics(writer, tmp_path):
+    day = datetime(2024, 1, 1, 12)
+    buy = LedgerOrder.create("c1", "webhook", "binance", "key-1", "BTC/USDT", "buy", 1.0, 100.0)
+    sell = LedgerOrder.create("c2", "webhook", "binance", "key-1", "BTC/USDT", "sell", 1.0, 110.0)
+    short = LedgerOrder.create("c3", "webhook", "bybit", "key-2", "ETH/USDT:USDT", "sell", 2.0, 50.0)
+    rejected = LedgerOrder.create("c4", "webhook", "bybit", "key-2", "ETH/USDT:USDT", "buy", 1.0, 50.0)
+    writer._insert(
+        [
+            buy.row("order_request", created_at=day),
+            _fill(buy, 1.0, 101.0, day, fee=0.1),
+            sell.row("order_request", created_at=day + timedelta(hours=1)),
+            _fill(sell, 1.0, 109.0, day + timedelta(hours=1), fee=0.1),
+            short.row("order_request", created_at=day),
+            _fill(short, 2.0, 50.0, day),
+            rejected.row("order_request", created_at=day + timedelta(days=1)),
+            rejected.row("order_error", status="error", created_at=day + timedelta(days=1)),
+        ]
+    )
+
+    directory = str(tmp_path / "export")
+    assert export_day(date(2024, 1, 1), directory) == 6
+    # Re-exporting a day replaces its partitions instead of duplicating rows
+    assert export_day(date(2024, 1, 1), directory) == 6
+    assert export_day(date(2024, 1, 2), directory) == 2
+    assert {p.parent.name for p in (tmp_path / "export").glob("day=*/account=*/*.parquet")} == {
+        "account=binance%3A" + account_id("binance", "key-1").split(":")[1],
+        "account=bybit%3A" + account_id("bybit", "key-2").split(":")[1],
+    }
+
+    trades = load_trades(directory=directory)
+    assert trades.num_rows == 8
+    assert load_trades(since=date(2024, 1, 2), directory=directory).num_rows == 2
+    assert load_trades(account=account_id("binance", "key-1"), directory=directory).num_rows == 4
+
+    stats = {row["symbol"]: row for row in fill_stats(trades)}
+    assert (stats["BTC/USDT"]["requests"], stats["BTC/USDT"]["fills"], stats["BTC/USDT"]["fill_rate"]) == (2, 2, 1.0)
+    assert (stats["ETH/USDT:USDT"]["requests"], stats["ETH/USDT:USDT"]["errors"]) == (2, 1)
+    assert stats["ETH/USDT:USDT"]["fill_rate"] == 0.5
+
+    slip = {row["symbol"]: row for row in slippage(trades)}
+    # Paid 1% over on the buy and received ~0.9% under on the sell
+    assert slip["BTC/USDT"]["fills"] == 2
+    assert slip["BTC/USDT"]["max_bps"] == pytest.approx(100.0)
+    assert slip["BTC/USDT"]["min_bps"] == pytest.approx(10000 / 110)
+    assert slip["ETH/USDT:USDT"]["mean_bps"] == 0.0
+
+    pnls = {row["symbol"]: row for row in pnl(trades)}
+    assert pnls["BTC/USDT"]["position"] == 0.0
+    assert pnls["BTC/USDT"]["pnl"] == pytest.approx(109.0 - 101.0 - 0.2)
+    assert pnls["ETH/USDT:USDT"]["position"] == -2.0
+    assert pnls["ETH/USDT:USDT"]["pnl"] == pytest.approx(0.0)
+
+
+def test_concurrent_exports_of_a_day_do_not_clobber(writer, tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from app.execution import tasks
+
+    day = datetime(2024, 1, 1, 12)
+    writer._insert([_order(f"c{i}").row("order_request", created_at=day) for i in range(5)])
+    directory = str(tmp_path / "export")
+    with ThreadPoolExecutor(4) as pool:
+        counts = list(pool.map(lambda _: export_day(date(2024, 1, 1), directory, batch_rows=2), range(8)))
+    assert counts == [5] * 8
+    assert load_trades(directory=directory).num_rows == 5
+    # Staging directories are renamed into place or removed
+    assert sorted(p.name for p in (tmp_path / "export").iterdir() if p.is_dir()) == ["day=2024-01-01"]
+
+    monkeypatch.setattr(settings, "LEDGER_EXPORT_DIR", directory)
+    monkeypatch.setattr(tasks, "recent_days", lambda: [date(2024, 1, 1), date(2024, 1, 2)])
+    assert tasks.export_ledger_task() == {"2024-01-01": 5, "2024-01-02": 0}
+    assert load_trades(directory=directory).num_rows == 5
+
+
+@pytest.mark.asyncio
+async def test_ledger_entries_endpoint(writer, tmp_path, monkeypatch):
+    writer._insert([_order(f"c{i}").row("order_request") for i in range(3)])
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post("/api/v1/identity/register", json={"email": "l@example.com", "password": "pw"})
+        user_id = resp.json()["user_id"]
+        await client.post("/api/v1/identity/verify-email", json={"token": resp.json()["email_verification_token"]})
+        resp = await client.post("/api/v1/identity/login", json={"email": "l@example.com", "password": "pw"})
+        headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+        assert (await client.get("/api/v1/ledger/entries", headers=headers)).status_code == 403
+
+        with SessionLocal() as db:
+            perm = Permission(name="ledger_read", display_name="Ledger Read", category="ledger", resource="ledger", action="read")
+            role = Role(name="auditor", display_name="Auditor")
+            db.add_all([perm, role])
+            db.flush()
+            db.add_all([RolePermission(role_id=role.id, permission_id=perm.id), UserRole(user_id=user_id, role_id=role.id)])
+            db.commit()
+        permission_cache.invalidate(user_id)
+
+        resp = await client.get("/api/v1/ledger/entries", params={"limit": 2}, headers=headers)
+        assert resp.status_code == 200
+        body = resp.json()
+        assert [e["correlation_id"] for e in body["entries"]] == ["c2", "c1"]
+        resp = await client.get(
+            "/api/v1/ledger/entries", params={"limit": 2, "cursor": body["next_cursor"]}, headers=headers
+        )
+        assert [e["correlation_id"] for e in resp.json()["entries"]] == ["c0"]
+        assert resp.json()["next_cursor"] is None
+
+        resp = await client.get("/api/v1/ledger/entries", params={"cursor": "bogus"}, headers=headers)
+        assert resp.status_code == 400
+
+        monkeypatch.setattr(settings, "LEDGER_EXPORT_DIR", str(tmp_path / "export"))
+        export_day(datetime.utcnow().date())
+        resp = await client.get("/api/v1/ledger/report", headers=headers)
+        assert resp.status_code == 200
+        assert resp.json()["rows"] == 3
+        assert [(r["requests"], r["fills"]) for r in resp.json()["fills"]] == [(3, 0)]
+        assert (await client.post("/api/v1/ledger/export", params={"day": "2024-01-01"}, headers=headers)).status_code == 403
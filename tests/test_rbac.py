@@ -15,6 +15,9 @@ from main import app
 from sqlalchemy import text
 from app.db import Base, engine, SessionLocal
 from app.identity.models import Permission, Role, RolePermission, UserRole
+from app.identity.permissions import permission_cache
+import app.identity.permissions as permissions
+from app.identity.audit_log import PermissionAuditWriter
 
 if os.path.exists('test_rbac.db'):
     os.remove('test_rbac.db')
@@ -29,6 +32,14 @@ def clean_db():
     yield
     Base.metadata.drop_all(engine)
 
+
+@pytest.fixture(autouse=True)
+def audit_writer(tmp_path, monkeypatch):
+    """Isolate audit events from those buffered by other test modules."""
+    writer = PermissionAuditWriter(spill_path=str(tmp_path / "audit.jsonl"))
+    monkeypatch.setattr(permissions, "audit_writer", writer)
+    return writer
+
 async def register_and_login(client):
     resp = await client.post("/api/v1/identity/register", json={"email": "u@example.com", "password": "pw"})
     token = resp.json()["email_verification_token"]
@@ -38,7 +49,7 @@ async def register_and_login(client):
     return user_id, resp.json()["access_token"]
 
 @pytest.mark.asyncio
-async def test_permission_middleware():
+async def test_permission_middleware(audit_writer):
     async with AsyncClient(transport=transport, base_url="http://test") as client:
         user_id, token = await register_and_login(client)
 
@@ -73,9 +84,156 @@ async def test_permission_middleware():
             db.add(ur)
             db.commit()
 
+        # Direct DB edits bypass the identity routes, so drop the cached denial
+        permission_cache.invalidate(user_id)
         resp = await client.get("/api/v1/identity/roles", headers={"Authorization": f"Bearer {token}"})
         assert resp.status_code == 200
-        # Check audit log entries
+        # Check audit log entries once the buffered events are written
+        assert audit_writer.flush() == 2
         with SessionLocal() as db:
             count = db.execute(text("select count(*) from permission_audit_log")).fetchone()[0]
             assert count == 2
+
+
+@pytest.mark.asyncio
+async def test_role_hierarchy_and_route_invalidation():
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        user_id, token = await register_and_login(client)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        # Permissions are granted to a parent role; the user holds the child
+        with SessionLocal() as db:
+            perms = [
+                Permission(name=f"role_{action}", display_name=action, category="role", resource="role_management", action=action)
+                for action in ("read", "write")
+            ]
+            db.add_all(perms)
+            parent = Role(name="admin", display_name="Admin")
+            db.add(parent)
+            db.commit()
+            child = Role(name="operator", display_name="Operator", parent_role_id=parent.id)
+            db.add(child)
+            db.flush()
+            db.add_all([RolePermission(role_id=parent.id, permission_id=p.id) for p in perms])
+            db.add(UserRole(user_id=user_id, role_id=child.id))
+            db.commit()
+            child_id = child.id
+
+        resp = await client.get("/api/v1/identity/roles", headers=headers)
+        assert resp.status_code == 200
+        assert permission_cache.get(user_id).allows("role_management", "read")
+
+        # Assigning a role through the API evicts the cached permission set
+        resp = await client.post(
+            f"/api/v1/identity/users/{user_id}/roles", json={"role_id": child_id}, headers=headers
+        )
+        assert resp.status_code == 200
+        assert permission_cache._entries.get(user_id) is None
+
+
+def test_audit_writer_spills_and_replays(tmp_path, monkeypatch):
+    spill = tmp_path / "audit.jsonl"
+    writer = PermissionAuditWriter(max_buffer=1, overflow_policy="spill", spill_path=str(spill))
+    event = dict(user_id="u1", action="read", resource="kyc_management", access_granted=True)
+    writer.submit(**event)
+    writer.submit(**event)  # buffer full: goes straight to the spill file
+    assert writer.pending() == 1
+    assert len(spill.read_text().splitlines()) == 1
+
+    def unavailable(events):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(writer, "_insert", unavailable)
+    assert writer.flush() == 0
+    assert len(spill.read_text().splitlines()) == 2
+
+    monkeypatch.undo()
+    writer.submit(**event)
+    assert writer.flush() == 3
+    assert not spill.exists()
+    with SessionLocal() as db:
+        count = db.execute(text("select count(*) from permission_audit_log")).fetchone()[0]
+        assert count == 3
+
+
+@pytest.mark.asyncio
+async def test_audit_writer_spills_off_loop_and_rejects_bad_rows(tmp_path, monkeypatch):
+    import asyncio
+    import json
+    import threading
+
+    spill = tmp_path / "audit.jsonl"
+    writer = PermissionAuditWriter(max_buffer=1, overflow_policy="spill", spill_path=str(spill))
+    event = dict(user_id="u1", action="read", resource="r", access_granted=True)
+    spilled_on = []
+    real_spill = writer._spill
+
+    def spill_events(events):
+        spilled_on.append(threading.current_thread())
+        real_spill(events)
+
+    monkeypatch.setattr(writer, "_spill", spill_events)
+    writer.submit(**event)
+    writer.submit(**event)
+    for _ in range(100):
+        if spill.exists():
+            break
+        await asyncio.sleep(0.01)
+    assert spilled_on and threading.main_thread() not in spilled_on
+
+    # Rows the database refuses on their own do not hold back the others
+    with open(spill, "a", encoding="utf-8") as f:
+        f.write("not json\n")
+        f.write(json.dumps({**event, "user_id": None, "created_at": "2024-01-01T00:00:00"}) + "\n")
+    assert writer.flush() == 2
+    assert not spill.exists()
+    assert len(writer.rejected_path.read_text().splitlines()) == 2
+    with SessionLocal() as db:
+        assert db.execute(text("select count(*) from permission_audit_log")).fetchone()[0] == 2
+
+
+def test_audit_writer_drop_policies(tmp_path):
+    event = dict(user_id="u1", action="read", resource="r", access_granted=False)
+    newest = PermissionAuditWriter(max_buffer=1, overflow_policy="drop_newest", spill_path=str(tmp_path / "a"))
+    newest.submit(user_agent="first", **event)
+    newest.submit(user_agent="second", **event)
+    assert newest.dropped == 1 and newest._rows[0]["user_agent"] == "first"
+    oldest = PermissionAuditWriter(max_buffer=1, overflow_policy="drop_oldest", spill_path=str(tmp_path / "b"))
+    oldest.submit(user_agent="first", **event)
+    oldest.submit(user_agent="second", **event)
+    assert oldest.dropped == 1 and oldest._rows[0]["user_agent"] == "second"
+
+
+def test_route_permission_index():
+    mw = app.middleware_stack
+    while not isinstance(mw, permissions.PermissionMiddleware):
+        mw = mw.app
+    index = mw.index
+
+    def lookup(method, path):
+        return index.lookup({"type": "http", "method": method, "path": path})
+
+    prefix = "/api/v1/identity"
+    assert lookup("GET", f"{prefix}/roles") == ("role_management", "read")
+    assert lookup("POST", f"{prefix}/roles") == ("role_management", "write")
+    assert lookup("GET", f"{prefix}/users/abc/roles") == ("role_management", "read")
+    assert lookup("POST", f"{prefix}/users/abc/roles") == ("role_management", "write")
+    assert lookup("PUT", f"{prefix}/admin/identity/kyc/k1/approve") == ("kyc_management", "write")
+    assert lookup("GET", f"{prefix}/admin/identity/kyc/pending") == ("kyc_management", "read")
+    assert lookup("POST", "/webhook") is None
+    assert lookup("GET", f"{prefix}/users//roles") is None
+    assert lookup("DELETE", f"{prefix}/roles") is None
+    assert not index._fallback
+    assert index.lookup(
+        {"type": "http", "method": "GET", "path": f"/api{prefix}/roles", "root_path": "/api"}
+    ) == ("role_management", "read")
+
+
+@pytest.mark.asyncio
+async def test_permission_middleware_honours_root_path():
+    mounted = ASGITransport(app=app, root_path="/api")
+    async with AsyncClient(transport=mounted, base_url="http://test") as client:
+        resp = await client.get("/api/api/v1/identity/roles")
+        assert resp.status_code in (401, 403)
+        resp = await client.get("/api/api/v1/ledger/entries")
+        assert resp.status_code in (401, 403)
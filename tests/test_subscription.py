@@ -0,0 +1,181 @@
+import os
+import sys
+
+import pytest
+from unittest.mock import MagicMock
+from cryptography.fernet import Fernet
+from httpx import AsyncClient, ASGITransport
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+os.environ.setdefault("WEBHOOK_SECRET", "testsecret")
+os.environ.setdefault("DEFAULT_EXCHANGE", "binance")
+os.environ.setdefault("DEFAULT_API_KEY", "key")
+os.environ.setdefault("DEFAULT_API_SECRET", "secret")
+os.environ["DATABASE_URL"] = "sqlite:///test_subscription.db"
+
+from main import app
+from config.settings import settings
+import app.api.routes as routes
+import app.execution.fanout as fanout
+from app.db import Base, engine, SessionLocal
+from app.identity.models import Permission, Role, RolePermission, UserRole
+from app.identity import token_store
+from app.identity.permissions import permission_cache
+from app.identity.token_store import SQLiteTokenBackend, issue_token
+from app.rate_limiter import limiter
+from app.subscription.models import FollowerSubscription
+from app.subscription.registry import FollowerAccount, SubscriptionRegistry, subscription_registry
+
+transport = ASGITransport(app=app)
+
+
+@pytest.fixture(autouse=True)
+def clean_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "DOCUMENT_ENCRYPTION_KEY", Fernet.generate_key().decode())
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    limiter.reset()
+    backend = SQLiteTokenBackend(tmp_path / "tokens.db")
+    token_store.set_backend(backend)
+    yield
+    token_store.set_backend(None)
+    backend.close()
+    limiter.reset()
+    Base.metadata.drop_all(engine)
+
+
+async def login(client, email):
+    """Register, verify and log in ``email``; return its id and auth headers."""
+    resp = await client.post("/api/v1/identity/register", json={"email": email, "password": "pw"})
+    user_id = resp.json()["user_id"]
+    await client.post("/api/v1/identity/verify-email", json={"token": resp.json()["email_verification_token"]})
+    resp = await client.post("/api/v1/identity/login", json={"email": email, "password": "pw"})
+    return user_id, {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+def grant_subscription_admin(user_id):
+    with SessionLocal() as db:
+        perms = [
+            Permission(name=f"subscription_{action}", display_name=action, category="subscription", resource="subscription", action=action)
+            for action in ("read", "write")
+        ]
+        role = Role(name="copy_admin", display_name="Copy Admin")
+        db.add_all(perms + [role])
+        db.flush()
+        db.add_all([RolePermission(role_id=role.id, permission_id=p.id) for p in perms])
+        db.add(UserRole(user_id=user_id, role_id=role.id))
+        db.commit()
+    permission_cache.invalidate(user_id)
+
+
+@pytest.mark.asyncio
+async def test_registry_persists_encrypted_followers():
+    writer, reader = SubscriptionRegistry(), SubscriptionRegistry()
+    writer.subscribe("m1", FollowerAccount(follower_id="a", exchange="binance", apiKey="ka", secret="sa", multiplier=2))
+    writer.subscribe("m1", FollowerAccount(follower_id="b", exchange="kraken", apiKey="kb", secret="sb"))
+    writer.subscribe("m1", FollowerAccount(follower_id="a", exchange="binance", apiKey="ka2", secret="sa2", max_amount=1))
+
+    # A registry in another worker resolves the same followers
+    followers = await reader.resolve("m1")
+    assert [(f.follower_id, f.apiKey, f.secret, f.max_amount) for f in followers] == [
+        ("a", "ka2", "sa2", 1.0),
+        ("b", "kb", "sb", None),
+    ]
+    with SessionLocal() as db:
+        stored = " ".join(row.credentials for row in db.query(FollowerSubscription))
+    assert "ka2" not in stored and "sa2" not in stored
+
+    assert reader.unsubscribe("m1", "b")
+    assert not reader.unsubscribe("m1", "b")
+    assert [f.follower_id for f in await writer.resolve("m1")] == ["a"]
+    assert await writer.resolve("m2") == []
+
+
+def test_registry_requires_encryption_key(monkeypatch):
+    monkeypatch.setattr(settings, "DOCUMENT_ENCRYPTION_KEY", None)
+    with pytest.raises(RuntimeError):
+        SubscriptionRegistry().subscribe("m1", FollowerAccount(follower_id="a", exchange="binance", apiKey="k", secret="s"))
+
+
+@pytest.mark.asyncio
+async def test_subscription_endpoints():
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        user_id, headers = await login(client, "s@example.com")
+        url = "/api/v1/subscriptions/m1/followers"
+        follower = {"follower_id": "f1", "exchange": "binance", "apiKey": "k1", "secret": "s1", "multiplier": 2}
+
+        assert (await client.put(url, json=follower, headers=headers)).status_code == 403
+
+        grant_subscription_admin(user_id)
+
+        assert (await client.put(url, json=follower, headers=headers)).status_code == 200
+        resp = await client.get(url, headers=headers)
+        assert resp.json()["followers"] == [{"follower_id": "f1", "exchange": "binance", "multiplier": 2.0, "max_amount": None}]
+        assert [f.apiKey for f in await subscription_registry.resolve("m1")] == ["k1"]
+
+        assert (await client.delete(f"{url}/f1", headers=headers)).status_code == 200
+        assert (await client.delete(f"{url}/f1", headers=headers)).status_code == 404
+        assert (await client.get(url, headers=headers)).json()["followers"] == []
+
+
+@pytest.mark.asyncio
+async def test_copy_signal_requires_master_token(monkeypatch):
+    class DummyExchange:
+        async def load_markets(self):
+            return {}
+
+        async def create_market_order(self, symbol, side, amount):
+            return {"symbol": symbol, "amount": amount}
+
+        async def close(self):
+            pass
+
+    async def mock_get_exchange(*args, **kwargs):
+        return DummyExchange()
+
+    monkeypatch.setattr(fanout, "get_exchange", mock_get_exchange)
+    nonces = iter(range(100))
+
+    async def copy(client, master_id, token):
+        payload = {"token": token, "nonce": f"copy{next(nonces)}", "symbol": "BTC/USDT", "side": "buy", "amount": 0.1, "price": 30000}
+        return await client.post(f"/webhook/copy/{master_id}", json=payload)
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        master, master_headers = await login(client, "master@example.com")
+        other, other_headers = await login(client, "other@example.com")
+        tokens = {}
+        for user, headers in ((master, master_headers), (other, other_headers)):
+            resp = await client.post("/api/v1/identity/tokens", json={"token_name": "copy", "token_type": "personal"}, headers=headers)
+            tokens[user] = resp.json()["token"]
+        for follower_id, multiplier in (("f1", 1.0), ("f2", 3.0)):
+            subscription_registry.subscribe(
+                master, FollowerAccount(follower_id=follower_id, exchange="binance", apiKey=follower_id, secret="s", multiplier=multiplier)
+            )
+
+        # Static tokens and other users' tokens cannot trade with the master's followers
+        assert (await copy(client, master, issue_token(ttl=30))).status_code == 403
+        assert (await copy(client, master, tokens[other])).status_code == 403
+
+        resp = await copy(client, master, tokens[master])
+        assert resp.status_code == 200
+        assert sorted(r["order"]["amount"] for r in resp.json()["results"]) == pytest.approx([0.1, 0.3])
+        # Nobody follows the other user, which must not pass for a success
+        assert (await copy(client, other, tokens[other])).status_code == 404
+        assert (await copy(client, other, tokens[master])).status_code == 403
+
+        grant_subscription_admin(other)
+        assert (await copy(client, master, tokens[other])).status_code == 200
+
+        # The queued path checks for followers without decrypting their credentials
+        def no_decrypt(master_id):
+            raise AssertionError("credentials decrypted")
+
+        task = MagicMock()
+        monkeypatch.setattr(settings, "QUEUE_ORDERS", True)
+        monkeypatch.setattr(routes, "replicate_signal_task", task)
+        monkeypatch.setattr(subscription_registry, "followers", no_decrypt)
+        resp = await copy(client, master, tokens[master])
+        assert resp.json() == {"status": "queued"}
+        task.delay.assert_called_once()
+        assert (await copy(client, other, tokens[other])).status_code == 404
@@ -0,0 +1,108 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+os.environ.setdefault("WEBHOOK_SECRET", "testsecret")
+os.environ.setdefault("DEFAULT_EXCHANGE", "binance")
+os.environ.setdefault("DEFAULT_API_KEY", "key")
+os.environ.setdefault("DEFAULT_API_SECRET", "secret")
+
+from app.identity.token_cache import TokenCache, TokenRecord
+
+
+class FakeListener:
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def subscribe(self, **handlers):
+        for channel, handler in handlers.items():
+            self.broker.handlers.setdefault(channel, []).append(handler)
+
+    def run_in_thread(self, sleep_time, daemon):
+        return FakeListener()
+
+
+class FakeBroker:
+    """Deliver published messages synchronously to every subscriber."""
+
+    def __init__(self):
+        self.handlers = {}
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+    def publish(self, channel, message):
+        for handler in self.handlers.get(channel, []):
+            handler({"type": "message", "data": message.encode()})
+
+
+def record(token_id="t1", user_id="u1"):
+    return TokenRecord(token_id=token_id, user_id=user_id, expires_at=None, roles_allowed=True)
+
+
+def test_invalidate_token_and_user():
+    cache = TokenCache(maxsize=10, ttl=60)
+    cache.put("h1", record("t1", "u1"))
+    cache.put("h2", record("t2", "u1"))
+    cache.put("h3", record("t3", "u2"))
+    cache.invalidate_token("t1")
+    assert cache.get("h1") is None
+    cache.invalidate_user("u1")
+    assert cache.get("h2") is None
+    assert cache.get("h3") is not None
+
+
+def test_put_drops_record_loaded_before_an_invalidation():
+    cache = TokenCache(maxsize=10, ttl=60)
+    generation = cache.generation()
+    # A revocation commits and evicts while the record is being loaded
+    cache.invalidate_token("t1")
+    cache.put("h1", record("t1", "u1"), generation)
+    assert cache.get("h1") is None
+
+    cache.put("h1", record("t1", "u1"), cache.generation())
+    assert cache.get("h1") is not None
+
+
+def test_invalidation_reaches_other_workers():
+    broker = FakeBroker()
+    worker_a = TokenCache(maxsize=10, ttl=60)
+    worker_b = TokenCache(maxsize=10, ttl=60)
+    worker_a.start_listener(broker)
+    worker_b.start_listener(broker)
+    worker_a.put("h1", record())
+    worker_b.put("h1", record())
+    worker_a.invalidate_token("t1")
+    assert worker_a.get("h1") is None
+    assert worker_b.get("h1") is None
+    listener = worker_b._listener
+    worker_b.stop_listener()
+    assert listener.stopped
+
+
+def test_permission_invalidation_reaches_other_workers():
+    from app.identity.permissions import PermissionCache, UserPermissions
+
+    broker = FakeBroker()
+    workers = []
+    for _ in range(2):
+        bus = TokenCache(maxsize=10, ttl=60)
+        bus.start_listener(broker)
+        workers.append(PermissionCache(maxsize=10, ttl=60, bus=bus))
+    entry = UserPermissions(("r1",), frozenset())
+    for cache in workers:
+        cache._entries.update({"u1": entry, "u2": entry})
+
+    workers[0].invalidate("u1")
+    assert all("u1" not in cache._entries and "u2" in cache._entries for cache in workers)
+    workers[1].invalidate()
+    assert all(not cache._entries for cache in workers)
@@ -0,0 +1,259 @@
+import os
+import sys
+import time
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+# Ensure default configuration for tests
+os.environ.setdefault("WEBHOOK_SECRET", "testsecret")
+os.environ.setdefault("DEFAULT_EXCHANGE", "binance")
+os.environ.setdefault("DEFAULT_API_KEY", "key")
+os.environ.setdefault("DEFAULT_API_SECRET", "secret")
+
+from app.identity import token_store
+from app.identity.token_store import (
+    MemoryTokenBackend,
+    RedisTokenBackend,
+    SQLiteTokenBackend,
+    TokenBackend,
+)
+from app.identity.replay_store import (
+    MemoryReplayStore,
+    RedisReplayStore,
+    ReplayStore,
+    SharedMemoryReplayStore,
+)
+
+
+class FakeRedis:
+    """In-process stand-in for the subset of redis-py used by the store."""
+
+    def __init__(self):
+        self.data = {}
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and self._live(key) is not None:
+            return None
+        self.data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def exists(self, key):
+        return int(self._live(key) is not None)
+
+    def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+
+@pytest.fixture(params=["sqlite", "memory", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteTokenBackend(tmp_path / "tokens.db")
+        yield store
+        store.close()
+    elif request.param == "memory":
+        yield MemoryTokenBackend()
+    else:
+        yield RedisTokenBackend(FakeRedis())
+
+
+def test_backend_token_lifecycle(backend):
+    backend.issue("t1", 30)
+    backend.issue("t2", -1)
+    assert backend.is_valid("t1") is True
+    assert backend.is_valid("t2") is False
+    backend.revoke("t1")
+    assert backend.is_valid("t1") is False
+
+
+def test_backend_nonce_claimed_once(backend):
+    assert backend.register_nonce("n1", 30) is True
+    assert backend.register_nonce("n1", 30) is False
+    assert backend.register_nonce("n2", 30) is True
+
+
+def test_backend_nonce_reusable_after_expiry(backend, monkeypatch):
+    assert backend.register_nonce("n1", 1) is True
+    later = time.time() + 5
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert backend.register_nonce("n1", 1) is True
+
+
+def test_memory_backend_cleanup_uses_expiry_index(monkeypatch):
+    store = MemoryTokenBackend()
+    store.issue("old", 1)
+    store.issue("new", 60)
+    store.register_nonce("n", 1)
+    later = time.time() + 5
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert store.cleanup() == 2
+    assert store.is_valid("new") is True
+    assert store._expiry[0][2] == "new"
+
+
+def test_sqlite_backend_reuses_connection(tmp_path):
+    store = SQLiteTokenBackend(tmp_path / "tokens.db")
+    store.issue("t", 30)
+    conn = store._conn
+    assert store.is_valid("t") is True
+    assert store._conn is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    store.close()
+
+
+def test_module_functions_use_selected_backend():
+    memory = MemoryTokenBackend()
+    token_store.set_backend(memory)
+    try:
+        token = token_store.issue_token(ttl=30)
+        assert memory.is_valid(token)
+        assert token_store.is_token_valid(token) is True
+        assert token_store.register_nonce("x") is True
+        assert token_store.register_nonce("x") is False
+    finally:
+        token_store.set_backend(None)
+
+
+def test_backend_cleanup_in_batches(backend, monkeypatch):
+    for i in range(5):
+        backend.register_nonce(f"old{i}", 1)
+    backend.issue("expired", 1)
+    backend.register_nonce("fresh", 60)
+    later = time.time() + 5
+    monkeypatch.setattr(time, "time", lambda: later)
+    removed = backend.cleanup(batch_size=2)
+    if isinstance(backend, RedisTokenBackend):
+        assert removed == 0  # Redis expires keys itself
+    else:
+        assert removed == 6
+    assert backend.register_nonce("fresh", 60) is False
+
+
+def test_sqlite_lookups_do_not_delete(tmp_path):
+    store = SQLiteTokenBackend(tmp_path / "tokens.db")
+    store.issue("t", -1)
+    assert store.is_valid("t") is False
+    count = store._conn.execute("SELECT count(*) FROM tokens").fetchone()[0]
+    assert count == 1
+    indexes = {row[1] for row in store._conn.execute("PRAGMA index_list('nonces')")}
+    assert "idx_nonces_expires_at" in indexes
+    assert store.cleanup() == 1
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_run_sweeper_removes_expired(monkeypatch):
+    import asyncio
+
+    memory = MemoryTokenBackend()
+    memory.register_nonce("n", -1)
+    token_store.set_backend(memory)
+    try:
+        task = asyncio.create_task(token_store.run_sweeper(interval=0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+    finally:
+        token_store.set_backend(None)
+    assert memory._nonces == {}
+
+
+@pytest.fixture(params=["memory", "shared", "redis"])
+def replay_store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryReplayStore(maxsize=4)
+    elif request.param == "shared":
+        store = SharedMemoryReplayStore(str(tmp_path / "replay.bin"), slots=4)
+        yield store
+        store.close()
+    else:
+        yield RedisReplayStore(FakeRedis())
+
+
+def test_replay_store_claims_once(replay_store, monkeypatch):
+    assert replay_store.claim("sig-a", 60) is True
+    assert replay_store.claim("sig-a", 60) is False
+    assert replay_store.claim("sig-b", 60) is True
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert replay_store.claim("sig-a", 60) is True
+
+
+def test_replay_store_full_rejects_instead_of_evicting(tmp_path):
+    for store in (
+        MemoryReplayStore(maxsize=2),
+        SharedMemoryReplayStore(str(tmp_path / "full.bin"), slots=2),
+    ):
+        assert store.claim("s1", 60) and store.claim("s2", 60)
+        assert store.claim("s3", 60) is False
+        assert store.claim("s1", 60) is False
+
+
+def test_shared_replay_store_probes_past_live_window(tmp_path, monkeypatch):
+    store = SharedMemoryReplayStore(str(tmp_path / "probe.bin"), slots=8, max_probe=1)
+    try:
+        # Every claim collides with live entries sooner or later; none may be
+        # refused while the table has room
+        assert all(store.claim(f"s{i}", 60) for i in range(8))
+        assert store.probe > 1
+        assert all(store.claim(f"s{i}", 60) is False for i in range(8))
+        assert store.claim("s8", 60) is False
+
+        later = time.time() + 61
+        monkeypatch.setattr(time, "time", lambda: later)
+        assert store.claim("s8", 60) is True
+        # Entries placed beyond the base probe have expired, so it shrinks back
+        assert store.probe == 1
+    finally:
+        store.close()
+
+
+@pytest.mark.asyncio
+async def test_blocking_replay_store_claims_off_event_loop():
+    import threading
+
+    class ThreadRecordingRedis(FakeRedis):
+        def set(self, key, value, nx=False, ex=None):
+            self.thread = threading.get_ident()
+            return super().set(key, value, nx=nx, ex=ex)
+
+    client = ThreadRecordingRedis()
+    store = RedisReplayStore(client)
+    assert await store.claim_async("sig", 60) is True
+    assert await store.claim_async("sig", 60) is False
+    assert client.thread != threading.get_ident()
+    assert await MemoryReplayStore(maxsize=2).claim_async("sig", 60) is True
+
+
+def test_incomplete_stores_cannot_be_built():
+    class IncompleteReplay(ReplayStore):
+        pass
+
+    class IncompleteTokens(TokenBackend):
+        def issue(self, token, ttl):
+            pass
+
+    for incomplete in (IncompleteReplay, IncompleteTokens):
+        with pytest.raises(TypeError):
+            incomplete()
+
+
+def test_shared_replay_store_spans_workers(tmp_path):
+    path = str(tmp_path / "replay.bin")
+    worker_a = SharedMemoryReplayStore(path, slots=64)
+    worker_b = SharedMemoryReplayStore(path, slots=64)
+    try:
+        assert worker_a.claim("sig", 60) is True
+        assert worker_b.claim("sig", 60) is False
+    finally:
+        worker_a.close()
+        worker_b.close()
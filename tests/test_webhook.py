@@ -24,22 +24,24 @@ from config.settings import settings
 from httpx import AsyncClient, ASGITransport
 import app.execution.exchange_factory as exchange_factory
 import app.api.routes as routes
-from app.identity.auth import verify_token
-from app.identity.token_store import issue_token, revoke_token, DB_PATH
+from app.identity.auth import verify_token, verify_token_async
+from app.identity import token_store
+from app.identity.token_store import SQLiteTokenBackend, issue_token, revoke_token
 from app.rate_limiter import limiter
 
 transport = ASGITransport(app=app)
 
 
 @pytest.fixture(autouse=True)
-def reset_rate_limit():
+def reset_rate_limit(tmp_path):
     limiter.reset()
-    if DB_PATH.exists():
-        DB_PATH.unlink()
+    # A fresh token database per test instead of deleting the shared one
+    backend = SQLiteTokenBackend(tmp_path / "tokens.db")
+    token_store.set_backend(backend)
     yield
     limiter.reset()
-    if DB_PATH.exists():
-        DB_PATH.unlink()
+    token_store.set_backend(None)
+    backend.close()
 
 
 def test_verify_token_valid():
@@ -66,6 +68,27 @@ def test_verify_token_missing_fields():
     finally:
         revoke_token(valid_token)
 
+
+@pytest.mark.asyncio
+async def test_verify_token_async_runs_off_loop(monkeypatch):
+    import threading
+    import app.identity.auth as auth
+
+    token = issue_token(ttl=5)
+    seen = {}
+
+    def fake_verify(*args):
+        seen["thread"] = threading.current_thread().name
+        return verify_token(*args)
+
+    monkeypatch.setattr(auth, "verify_token", fake_verify)
+    try:
+        assert await verify_token_async(token, "nE") is True
+        assert await verify_token_async(token, "nE") is False
+        assert seen["thread"].startswith("auth")
+    finally:
+        revoke_token(token)
+
 @pytest.mark.asyncio
 async def test_health_check():
     async with AsyncClient(transport=transport, base_url="http://test") as client:
@@ -534,7 +557,8 @@ async def test_webhook_queue(monkeypatch):
         assert response.status_code == 200
         assert response.json() == {"status": "queued"}
 
-    mock_task.delay.assert_called_once_with(payload)
+    # The worker records the order under the signal's correlation id
+    mock_task.delay.assert_called_once_with(payload, response.headers["X-Trace-Id"])
     revoke_token(token)
     settings.QUEUE_ORDERS = False
 
@@ -548,6 +572,80 @@ async def test_metrics_endpoint():
         assert "request_latency_seconds" in response.text
 
 
+@pytest.mark.asyncio
+async def test_webhook_stage_latency_with_trace_exemplar(monkeypatch):
+    """Each webhook stage is timed per exchange and tagged with the trace id."""
+
+    class DummyExchange:
+        id = "kraken"
+
+        async def load_markets(self):
+            return {}
+
+        async def create_market_order(self, symbol, side, amount):
+            return {"id": "order1"}
+
+        async def close(self):
+            pass
+
+    async def mock_get_exchange(*args, **kwargs):
+        return DummyExchange()
+
+    monkeypatch.setattr(routes, "get_exchange", mock_get_exchange)
+
+    body = json.dumps({
+        "exchange": "kraken", "apiKey": "x", "secret": "y", "symbol": "BTC/USDT",
+        "side": "buy", "amount": 0.02, "price": 30000, "nonce": "stage1",
+    }).encode()
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    headers = {
+        "X-Signature": hmac.new(settings.WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest(),
+        "X-Timestamp": str(int(time.time())),
+        "Content-Type": "application/json",
+        "traceparent": f"00-{trace_id}-00f067aa0ba902b7-01",
+    }
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/webhook", content=body, headers=headers)
+        assert response.status_code == 200
+        assert response.headers["X-Trace-Id"] == trace_id
+
+        response = await client.get("/metrics", headers={"Accept": "application/openmetrics-text"})
+    for stage in ("parse", "auth", "pool_acquire", "load_markets", "create_market_order", "release"):
+        assert f'webhook_stage_latency_seconds_count{{exchange="kraken",stage="{stage}"}}' in response.text
+    assert f'# {{trace_id="{trace_id}"}}' in response.text
+
+
+@pytest.mark.asyncio
+async def test_metrics_label_by_route_template():
+    """IDs and unmatched paths must not create new time series."""
+    from app.dashboard.metrics import REQUESTS_TOTAL, UNMATCHED_PATH
+
+    def count(path, status):
+        return REQUESTS_TOTAL.labels("POST", path, status)._value.get()
+
+    template = "/webhook/copy/{master_id}"
+    before = count(template, "422"), count(UNMATCHED_PATH, "404")
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        for master_id in ("m-1", "m-2", "m-3"):
+            assert (await client.post(f"/webhook/copy/{master_id}")).status_code == 422
+        for path in ("/wp-login.php", "/.env"):
+            assert (await client.post(path)).status_code == 404
+        text = (await client.get("/metrics")).text
+
+    assert (count(template, "422"), count(UNMATCHED_PATH, "404")) == (before[0] + 3, before[1] + 2)
+    assert "m-1" not in text and "wp-login" not in text
+    assert 'http_requests_in_progress{method="GET"} 1.0' in text
+
+
+def test_stage_exchange_label_is_bounded():
+    from app.dashboard.metrics import exchange_label
+
+    assert exchange_label("Binance") == "binance"
+    assert exchange_label("not-an-exchange-123") == "other"
+    assert exchange_label(None) == "other"
+
+
 @pytest.mark.asyncio
 async def test_signature_valid_token_ignored(monkeypatch):
     """A valid HMAC signature should succeed even with an invalid token."""
@@ -750,3 +848,276 @@ async def test_webhook_network_error(monkeypatch):
         assert "Network error" in response.text
     revoke_token(token)
 
+
+
+@pytest.mark.asyncio
+async def test_batch_orders_partial_failure(monkeypatch):
+    """Batch orders run per credential group and report each result."""
+
+    acquired = []
+
+    class DummyExchange:
+        async def load_markets(self):
+            return {}
+
+        async def create_market_order(self, symbol, side, amount):
+            if symbol == "BAD/USDT":
+                raise ExchangeError("rejected")
+            return {"id": symbol, "amount": amount}
+
+        async def close(self):
+            pass
+
+    async def mock_get_exchange(exchange_id, api_key, secret):
+        acquired.append((exchange_id, api_key))
+        return DummyExchange()
+
+    monkeypatch.setattr(routes, "get_exchange", mock_get_exchange)
+
+    token = issue_token(ttl=30)
+    order = {
+        "exchange": "binance",
+        "apiKey": "x",
+        "secret": "y",
+        "side": "buy",
+        "amount": 0.01,
+        "price": 30000,
+    }
+    payload = {
+        "token": token,
+        "nonce": "batch1",
+        "orders": [
+            {**order, "symbol": "BTC/USDT"},
+            {**order, "symbol": "BAD/USDT"},
+            {**order, "symbol": "ETH/USDT", "apiKey": "z"},
+        ],
+    }
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/webhook/batch", json=payload)
+        assert response.status_code == 200
+        body = response.json()
+    revoke_token(token)
+
+    assert body["status"] == "partial"
+    assert [r["index"] for r in body["results"]] == [0, 1, 2]
+    assert body["results"][0]["order"]["id"] == "BTC/USDT"
+    assert body["results"][1]["status_code"] == 400
+    assert body["results"][2]["status"] == "success"
+    assert sorted(acquired) == [("binance", "x"), ("binance", "z")]
+
+
+@pytest.mark.asyncio
+async def test_batch_invalid_signature_rejected():
+    payload = {
+        "orders": [
+            {
+                "exchange": "binance",
+                "apiKey": "x",
+                "secret": "y",
+                "symbol": "BTC/USDT",
+                "side": "buy",
+                "amount": 0.01,
+                "price": 30000,
+            }
+        ]
+    }
+    headers = {
+        "X-Signature": "bad",
+        "X-Timestamp": str(int(time.time())),
+    }
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/webhook/batch", json=payload, headers=headers)
+        assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_batch_queue(monkeypatch):
+    """Each batch order is enqueued when QUEUE_ORDERS is enabled."""
+    settings.QUEUE_ORDERS = True
+    mock_task = MagicMock()
+    monkeypatch.setattr(routes, "place_order_task", mock_task)
+
+    order = {
+        "exchange": "binance",
+        "apiKey": "x",
+        "secret": "y",
+        "symbol": "BTC/USDT",
+        "side": "buy",
+        "amount": 0.01,
+        "price": 30000.0,
+    }
+    payload = {"orders": [order, {**order, "side": "sell"}]}
+    body = json.dumps(payload).encode()
+    signature = hmac.new(settings.WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    headers = {
+        "X-Signature": signature,
+        "X-Timestamp": str(int(time.time())),
+        "Content-Type": "application/json",
+    }
+    try:
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/webhook/batch", content=body, headers=headers)
+            assert response.status_code == 200
+            assert response.json() == {"status": "queued", "count": 2}
+        assert mock_task.delay.call_count == 2
+    finally:
+        settings.QUEUE_ORDERS = False
+
+
+@pytest.mark.asyncio
+async def test_webhook_rate_limited_per_ip(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT", "2/minute")
+    headers = {"X-Signature": "bad", "X-Timestamp": str(int(time.time()))}
+    payload = {
+        "exchange": "binance",
+        "apiKey": "x",
+        "secret": "y",
+        "symbol": "BTC/USDT",
+        "side": "buy",
+        "amount": 0.01,
+        "price": 30000,
+    }
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        for _ in range(2):
+            response = await client.post("/webhook", json=payload, headers=headers)
+            assert response.status_code == 403
+        response = await client.post("/webhook", json=payload, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.asyncio
+async def test_account_limit_charges_batch_orders_and_followers(monkeypatch):
+    import app.execution.fanout as fanout
+    from app.subscription.registry import FollowerAccount
+
+    monkeypatch.setattr(settings, "ACCOUNT_RATE_LIMIT", "2/minute")
+    headers = {"X-Signature": "bad", "X-Timestamp": str(int(time.time()))}
+
+    def order(api_key):
+        return {"exchange": "binance", "apiKey": api_key, "secret": "y", "symbol": "BTC/USDT", "side": "buy", "amount": 0.01, "price": 30000}
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        # Two orders drain account "a"; the bad signature is only checked afterwards
+        response = await client.post("/webhook/batch", json={"orders": [order("a"), order("a"), order("b")]}, headers=headers)
+        assert response.status_code == 403
+        response = await client.post("/webhook/batch", json={"orders": [order("b")]}, headers=headers)
+        assert response.status_code == 403
+        response = await client.post("/webhook/batch", json={"orders": [order("a")]}, headers=headers)
+        assert response.status_code == 429
+
+    class DummyExchange:
+        async def load_markets(self):
+            return {}
+
+        async def create_market_order(self, symbol, side, amount):
+            return {"symbol": symbol, "amount": amount}
+
+    async def mock_get_exchange(*args, **kwargs):
+        return DummyExchange()
+
+    async def mock_release(exchange):
+        pass
+
+    followers = [FollowerAccount(follower_id=f"f{i}", exchange="kraken", apiKey="shared", secret="s") for i in range(3)]
+
+    async def resolve(master_id):
+        return followers
+
+    monkeypatch.setattr(fanout, "get_exchange", mock_get_exchange)
+    monkeypatch.setattr(fanout, "release_exchange", mock_release)
+    summary = await fanout.FanoutEngine(resolver=resolve).replicate("m1", {"symbol": "BTC/USDT", "side": "buy", "amount": 1.0})
+    assert (summary["status"], summary["succeeded"], summary["failed"]) == ("partial", 2, 1)
+    assert [r["detail"] for r in summary["results"] if r["status"] == "error"] == ["Rate limit exceeded for account"]
+
+
+@pytest.mark.asyncio
+async def test_blocking_rate_limit_backend_runs_off_event_loop(monkeypatch):
+    import threading
+    from app.rate_limiter import RateLimiter, RateLimitExceeded
+
+    class SlowBackend:
+        blocking = True
+
+        def __init__(self):
+            self.threads = []
+
+        def take(self, key, rate, cost=1):
+            self.threads.append(threading.get_ident())
+            return key != "account:blocked", 1.0
+
+    monkeypatch.setattr(settings, "ACCOUNT_RATE_LIMIT", "2/minute")
+    backend = SlowBackend()
+    limiter_ = RateLimiter(backend=backend)
+
+    @limiter_.limit("ip")
+    async def endpoint(request):
+        return "ok"
+
+    request = MagicMock()
+    request.client.host = "10.0.0.1"
+    assert await endpoint(request) == "ok"
+    assert await limiter_.hit_async("account", "ok") == (True, 1.0)
+    with pytest.raises(RateLimitExceeded):
+        await limiter_.check_async("account", "blocked")
+    assert len(backend.threads) == 3
+    assert threading.get_ident() not in backend.threads
+
+
+def test_token_bucket_refills(monkeypatch):
+    from app.rate_limiter import LocalBucketBackend, parse_rate
+
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    backend = LocalBucketBackend(maxsize=10)
+    rate = parse_rate("2/minute")
+    assert backend.take("token:t", rate) == (True, 0.0)
+    assert backend.take("token:t", rate) == (True, 0.0)
+    allowed, retry_after = backend.take("token:t", rate)
+    assert not allowed and retry_after == pytest.approx(30)
+    # Steady traffic at the configured rate keeps being admitted
+    for _ in range(5):
+        now[0] += 30
+        assert backend.take("token:t", rate)[0] is True
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["hmac", "token"])
+async def test_load_harness_runs_in_process(monkeypatch, mode):
+    import simulate_tradingview as sim
+
+    async def fake_get_exchange(*args, **kwargs):
+        return sim.StubExchange(latency=0.001, jitter=0.001, seed=1)
+
+    async def fake_release(exchange):
+        return None
+
+    async def fake_load(exchange):
+        return {}
+
+    monkeypatch.setattr(routes, "get_exchange", fake_get_exchange)
+    monkeypatch.setattr(routes, "release_exchange", fake_release)
+    monkeypatch.setattr(routes.market_cache, "load", fake_load)
+    monkeypatch.setattr(settings, "RATE_LIMIT", "")
+    token = issue_token() if mode == "token" else None
+
+    async with AsyncClient(transport=transport, base_url="https://test") as client:
+        result = await sim.run_load(
+            client, total=40, concurrency=8, rate=2000, mode=mode,
+            secret=settings.WEBHOOK_SECRET, token=token,
+        )
+
+    summary = result.summary()
+    assert result.statuses == {"200": 40}
+    assert 0 < summary["p50"] <= summary["p95"] <= summary["p99"] <= summary["max"]
+    assert sum(count for _, count in result.histogram()) == 40
+
+
+def test_load_harness_percentiles():
+    from simulate_tradingview import percentile
+
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.5
+    assert percentile(values, 99) == 0.99
+    assert percentile([], 95) == 0.0